@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+from werkzeug.datastructures import CombinedMultiDict, MultiDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model_api.api_utils import FeatureSchema, get_model_features, process_features_airbnb  # noqa: E402
+
+FEATURES_TO_GET = ['neighbourhood', 'room_type', 'accommodates', 'bathrooms', 'bedrooms']
+#  Like request.values: form values are strings
+EXAMPLE = CombinedMultiDict([MultiDict(), MultiDict({
+    'id': '1001', 'neighbourhood': 'Brooklyn', 'room_type': 'Entire home/apt',
+    'accommodates': '4', 'bathrooms': '2', 'bedrooms': '1'
+})])
+
+
+def run_benchmark(number: int) -> dict:
+    schema = FeatureSchema(FEATURES_TO_GET)
+    paths = {
+        'dict_and_fromiter': lambda values: process_features_airbnb(get_model_features(values, FEATURES_TO_GET)),
+        'feature_schema': schema.parse
+    }
+    inputs = {'request_values': EXAMPLE, 'dict': EXAMPLE.to_dict()}
+    return {
+        f'{name}/{input_name}': round(min(timeit.repeat(
+            lambda: path(values), number=number, repeat=5
+        )) / number * 1e6, 2)
+        for name, path in paths.items()
+        for input_name, values in inputs.items()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-request cost (us) of validating and assembling the features.')
+    parser.add_argument('--number', type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.number), indent=2))
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model_api.api_utils import PREDICT_STAGE_NAMES  # noqa: E402
+from model_api.metrics import Counter, Gauge, Histogram, MetricsRegistry, StageTimer  # noqa: E402
+
+#  The stages timed by the API (its PREDICT_STAGES); importing airbnb_api would load a model
+STAGES = PREDICT_STAGE_NAMES
+
+
+def instrument_request(requests, in_flight, request_seconds, stages):
+    """
+    The metric updates done while serving one /predict/ request: the ones of
+    the request hooks and one timer per stage.
+    """
+    started = time.perf_counter()
+    in_flight.labels('/predict/').inc()
+    timer = StageTimer(stages)
+    for stage in STAGES:
+        timer.lap(stage)
+    requests.labels('/predict/', '200').inc()
+    in_flight.labels('/predict/').dec()
+    request_seconds.labels('/predict/').observe(time.perf_counter() - started)
+
+
+def run_benchmark(number: int) -> dict:
+    registry = MetricsRegistry()
+    requests = registry.register(Counter('requests_total', 'Requests', ('endpoint', 'status')))
+    in_flight = registry.register(Gauge('requests_in_flight', 'In flight', ('endpoint',)))
+    request_seconds = registry.register(Histogram('request_seconds', 'Latency', ('endpoint',)))
+    stage_seconds = registry.register(Histogram('stage_seconds', 'Stage latency', ('stage',)))
+    stages = {stage: stage_seconds.labels(stage) for stage in STAGES}
+    seconds = min(timeit.repeat(
+        lambda: instrument_request(requests, in_flight, request_seconds, stages),
+        number=number, repeat=5
+    ))
+    render_seconds = min(timeit.repeat(registry.render, number=100, repeat=5)) / 100
+    return {
+        'overhead_per_request_us': round(seconds / number * 1e6, 2),
+        'render_ms': round(render_seconds * 1e3, 3)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the cost of the API metrics per request.')
+    parser.add_argument('--number', type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.number), indent=2))
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model_api.model_artifact import save_forest_arrays  # noqa: E402
+
+#  Every loader runs in a fresh interpreter, so the load time and RSS of one
+#  doesn't leak into the others (the files are in the page cache for all)
+LOADERS = {
+    'pickle': 'import pickle; model = pickle.load(open(PATH, "rb"))',
+    'arrays': 'from model_api.model_artifact import load_forest_artifact; model = load_forest_artifact(PATH)',
+    'arrays_mmap_only': 'from model_api.model_artifact import load_forest_arrays; model = load_forest_arrays(PATH)'
+}
+MEASURE = '''
+import os, sys, time
+sys.path.append({root!r})
+import numpy, sklearn.ensemble
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        return next(int(line.split()[1]) for line in status if line.startswith('VmRSS')) / 1024
+
+
+PATH = {path!r}
+rss_before = rss_mb()
+start = time.perf_counter()
+{loader}
+seconds = time.perf_counter() - start
+print(seconds, rss_mb() - rss_before)
+'''
+
+
+def measure_loader(loader: str, path: str) -> dict:
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(root=root, path=path, loader=loader)],
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return {'load_seconds': round(float(output[0]), 4), 'rss_increase_mb': round(float(output[1]), 1)}
+
+
+def run_benchmark(path_to_pickle: str) -> dict:
+    with open(path_to_pickle, 'rb') as file:
+        model = pickle.load(file)
+    with tempfile.TemporaryDirectory() as directory:
+        path_to_arrays = os.path.join(directory, 'model')
+        save_forest_arrays(model, path_to_arrays)
+        paths = {'pickle': path_to_pickle, 'arrays': path_to_arrays, 'arrays_mmap_only': path_to_arrays}
+        for name in LOADERS:
+            measure_loader(LOADERS[name], paths[name])  # warms the page cache
+        return {name: measure_loader(LOADERS[name], paths[name]) for name in LOADERS}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares load time and RSS of the model artifact formats.')
+    parser.add_argument('--model', default='./models/simple_classifier.pkl', help='Pickled forest to compare')
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.model), indent=2))
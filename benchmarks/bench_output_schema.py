@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import pandas as pd
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.extend([ROOT, os.path.join(ROOT, 'refactor')])
+from refactor.pipeline_utils import get_model_columns, source_parquet  # noqa: E402
+from refactor.processing_utils import OUTPUT_SCHEMAS  # noqa: E402
+from main_train_model import MODEL_SPECS  # noqa: E402
+
+PATH_TO_PROC = os.path.join(ROOT, 'data', 'processed', 'processed_diego.parquet')
+
+
+def get_memory_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(index=True, deep=True).sum() / 2 ** 20, 2)
+
+
+def report_schema(processed: pd.DataFrame, schema: str, directory: str, repeat: int) -> dict:
+    """
+    Memory of the processed frame with schema, size of its Parquet file, and
+    seconds to read it back whole and with the columns of the training.
+    """
+    df = processed.astype(OUTPUT_SCHEMAS[schema])
+    path = os.path.join(directory, f'{schema}.parquet')
+    df.to_parquet(path)
+    columns = get_model_columns(MODEL_SPECS)
+    return {
+        'memory_mb': get_memory_mb(df),
+        'file_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+        'read_seconds': round(min(timeit.repeat(lambda: source_parquet(path), number=1, repeat=repeat)), 4),
+        'training_memory_mb': get_memory_mb(source_parquet(path, columns=columns)),
+        'training_read_seconds': round(
+            min(timeit.repeat(lambda: source_parquet(path, columns=columns), number=1, repeat=repeat)), 4
+        )
+    }
+
+
+def run_report(copies: int, repeat: int) -> dict:
+    processed = pd.concat([source_parquet(PATH_TO_PROC)] * copies, ignore_index=True)
+    with tempfile.TemporaryDirectory() as directory:
+        report = {schema: report_schema(processed, schema, directory, repeat) for schema in OUTPUT_SCHEMAS}
+    report['rows'] = len(processed)
+    report['compact_vs_default'] = {
+        metric: round(report['compact'][metric] / report['default'][metric], 3) for metric in report['default']
+    }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the memory and file size of the output schemas.')
+    parser.add_argument('--copies', type=int, default=1, help='Copies of the processed listings to compare')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run_report(args.copies, args.repeat), indent=2))
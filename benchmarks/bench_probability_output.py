@@ -0,0 +1,59 @@
+import argparse
+import json
+import numpy as np
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from model_api.api_utils import AIRBNB_OUTPUT_MAPPING, postprocess_probabilities  # noqa: E402
+
+CLASSES = np.array(sorted(AIRBNB_OUTPUT_MAPPING))
+
+
+def postprocess_per_row(probabilities: np.array, classes: np.array, top_k: int) -> list:
+    """
+    The straightforward alternative: one argsort and one lookup per row.
+    """
+    outputs = list()
+    for row in probabilities:
+        order = np.argsort(-row, kind='stable')
+        outputs.append({
+            'price_category': AIRBNB_OUTPUT_MAPPING[int(classes[order[0]])],
+            'probabilities': {AIRBNB_OUTPUT_MAPPING[int(label)]: float(value) for label, value in zip(classes, row)},
+            'top_k': [
+                {'price_category': AIRBNB_OUTPUT_MAPPING[int(classes[column])], 'probability': float(row[column])}
+                for column in order[:top_k]
+            ]
+        })
+    return outputs
+
+
+def run_benchmark(sizes: list, top_k: int, repeat: int) -> dict:
+    """
+    Milliseconds to postprocess the predict_proba output of every batch
+    size, vectorized and row by row.
+    """
+    report = dict()
+    for size in sizes:
+        probabilities = np.random.default_rng(0).dirichlet(np.ones(len(CLASSES)), size=size)
+        assert postprocess_per_row(probabilities, CLASSES, top_k) == postprocess_probabilities(
+            probabilities, CLASSES, top_k=top_k
+        )
+        number = max(1, 10_000 // size)
+        for name, postprocess in [
+            ('vectorized', lambda: postprocess_probabilities(probabilities, CLASSES, top_k=top_k)),
+            ('per_row', lambda: postprocess_per_row(probabilities, CLASSES, top_k))
+        ]:
+            seconds = min(timeit.repeat(postprocess, number=number, repeat=repeat)) / number
+            report[f'{size}/{name}'] = round(seconds * 1000, 4)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost (ms) of turning probabilities into the API responses.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--top-k', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.sizes, args.top_k, args.repeat), indent=2))
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import pandas as pd
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.extend([ROOT, os.path.join(ROOT, 'refactor')])
+from refactor.pipeline_utils import get_model_columns, source_csv, source_parquet  # noqa: E402
+from refactor.processing_utils import RELEVANT_FEATURES, RELEVANT_FEATURES_DTYPES  # noqa: E402
+from main_train_model import MODEL_SPECS  # noqa: E402
+
+PATH_TO_RAW_SAMPLE = os.path.join(ROOT, 'tests', 'test_data', 'raw_sample.csv')
+PATH_TO_PROC = os.path.join(ROOT, 'data', 'processed', 'processed_diego.parquet')
+READERS = {
+    'csv/pandas_all_columns': lambda path: pd.read_csv(path),
+    'csv/pyarrow_all_columns': lambda path: source_csv(path),
+    'csv/pyarrow_projected': lambda path: source_csv(path, columns=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES),
+    'parquet/all_columns': lambda path: source_parquet(path),
+    'parquet/projected': lambda path: source_parquet(path, columns=get_model_columns(MODEL_SPECS)),
+    'parquet/projected_filtered': lambda path: source_parquet(
+        path, columns=get_model_columns(MODEL_SPECS), filters=[('price', '>=', 100)]
+    )
+}
+
+
+def measure(reader: str, path: str) -> dict:
+    """
+    Reads path once with reader, in this process, and returns the seconds,
+    the rows, the memory of the frame and the peak resident memory.
+    """
+    start = time.perf_counter()
+    df = READERS[reader](path)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': round(seconds, 4),
+        'rows': len(df),
+        'columns': df.shape[1],
+        'frame_mb': round(df.memory_usage(index=True, deep=True).sum() / 2 ** 20, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1)
+    }
+
+
+def run_reader(reader: str, path: str) -> dict:
+    #  A fresh process per reader, so the peak memory is the one of the read
+    output = subprocess.run(
+        [sys.executable, __file__, '--measure', reader, path], capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout)
+
+
+def run_benchmark(copies: int) -> dict:
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'listings.csv')
+        sample = pd.read_csv(PATH_TO_RAW_SAMPLE)
+        pd.concat([sample] * copies, ignore_index=True).to_csv(path, index=False)
+        for reader in READERS:
+            results[reader] = run_reader(reader, path if reader.startswith('csv') else PATH_TO_PROC)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the time and memory of the CSV and Parquet sources.')
+    parser.add_argument('--copies', type=int, default=1000, help='Copies of the raw sample in the CSV read')
+    parser.add_argument('--measure', nargs=2, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure is not None:
+        print(json.dumps(measure(*args.measure)))
+    else:
+        print(json.dumps(run_benchmark(args.copies), indent=2))
@@ -0,0 +1,60 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import time
+from urllib import parse, request
+
+EXAMPLE = {
+    "id": 1001,
+    "accommodates": 4,
+    "room_type": "Entire home/apt",
+    "bathrooms": 2,
+    "bedrooms": 1,
+    "neighbourhood": "Brooklyn"
+}
+
+
+def send_request(url: str, payload: bytes) -> float:
+    start = time.perf_counter()
+    with request.urlopen(request.Request(url, data=payload, method='POST')) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_load_test(url: str, n_requests: int, concurrency: int) -> dict:
+    """
+    Sends n_requests POST requests with EXAMPLE to url from concurrency
+    threads, and returns the throughput and latency percentiles.
+    """
+    payload = parse.urlencode(EXAMPLE).encode()
+    errors = 0
+    latencies = list()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(send_request, url, payload) for _ in range(n_requests)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except OSError:
+                errors += 1
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'url': url,
+        'requests': n_requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 2) if len(latencies) else None
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the /predict/ endpoint.')
+    parser.add_argument('--url', default='http://localhost:8080/predict/')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    print(json.dumps(run_load_test(args.url, n_requests=args.requests, concurrency=args.concurrency), indent=2))
@@ -0,0 +1,249 @@
+import argparse
+import json
+import numpy as np
+import os
+import pandas as pd
+import pickle
+import platform
+import pyarrow as pa
+import sys
+import tempfile
+import time
+import warnings
+from typing import Callable, Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.extend([ROOT, os.path.join(ROOT, 'refactor'), os.path.join(ROOT, 'model_api')])
+from main_processing import CALLABLES_TO_APPLY, get_callables_to_apply  # noqa: E402
+from main_train_model import MODEL_SPECS  # noqa: E402
+from model_utils import fit_model, get_model_features, get_model_target  # noqa: E402
+from pipeline_utils import seq_steps_pipeline  # noqa: E402
+from processing_utils import RELEVANT_FEATURES  # noqa: E402
+from profiling import PipelineProfiler  # noqa: E402
+
+PATH_TO_RAW_SAMPLE = os.path.join(ROOT, 'tests', 'test_data', 'raw_sample.csv')
+PATH_TO_RESULTS = './benchmarks/results/latest.json'
+SIZES = [10_000, 100_000, 1_000_000]
+FIT_N_JOBS = [1, 2, 4, -1]
+NEIGHBOURHOODS = ['Bronx', 'Queens', 'Staten Island', 'Brooklyn', 'Manhattan']
+ROOM_TYPES = ['Shared room', 'Private room', 'Entire home/apt', 'Hotel room']
+
+
+def make_synthetic_listings(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Listings shaped like the raw sample: its rows (only the RELEVANT_FEATURES,
+    the rest are dropped by the first step anyway) are drawn with replacement,
+    and the ids, prices, coordinates and guests are made up, so the rows are
+    not all copies of the 98 sample ones.
+    """
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(PATH_TO_RAW_SAMPLE, usecols=RELEVANT_FEATURES)
+    listings = sample.iloc[rng.integers(0, len(sample), n_rows)].reset_index(drop=True)
+    listings['id'] = np.arange(1, n_rows + 1)
+    prices = np.round(rng.lognormal(mean=4.8, sigma=0.8, size=n_rows), 2)
+    listings['price'] = [f'${price:,.2f}' for price in prices]
+    listings['accommodates'] = rng.integers(1, 17, n_rows)
+    listings['latitude'] += rng.normal(0, 0.01, n_rows)
+    listings['longitude'] += rng.normal(0, 0.01, n_rows)
+    return listings
+
+
+def best_of(callable: Callable, repeat: int) -> float:
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        callable()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_processing(listings: pd.DataFrame, repeat: int) -> Dict[str, float]:
+    """
+    Times every step (with a PipelineProfiler) and the full pipeline, with
+    the pandas and the arrow backends. A step that runs twice is reported
+    with the time of both runs.
+    """
+    n_rows = len(listings)
+    results = dict()
+    for _ in range(repeat):
+        profiler = PipelineProfiler()
+        profiler.run_steps(CALLABLES_TO_APPLY, listings)
+        for name, total in profiler.report()['totals'].items():
+            key = f'processing/{n_rows}/step/{name}'
+            results[key] = min(results.get(key, np.inf), total['wall_seconds'])
+    results[f'processing/{n_rows}/pipeline'] = best_of(
+        lambda: seq_steps_pipeline(CALLABLES_TO_APPLY, listings), repeat
+    )
+    table = pa.Table.from_pandas(listings, preserve_index=False)
+    arrow_callables = get_callables_to_apply(backend='arrow')
+    results[f'processing/{n_rows}/pipeline_arrow'] = best_of(
+        lambda: seq_steps_pipeline(arrow_callables, table), repeat
+    )
+    return results
+
+
+def bench_fit(processed: pd.DataFrame, n_estimators: int, n_jobs_options: List[int], repeat: int) -> Dict[str, float]:
+    features = get_model_features(df=processed, features=MODEL_SPECS['features'])
+    target = get_model_target(df=processed, target=MODEL_SPECS['target'])
+    results = dict()
+    for n_jobs in n_jobs_options:
+        estimator_args = {**MODEL_SPECS['estimator_params'], 'n_estimators': n_estimators, 'n_jobs': n_jobs}
+        results[f'fit/{len(processed)}/n_jobs={n_jobs}'] = best_of(
+            lambda: fit_model(MODEL_SPECS['estimator'], estimator_args, x=features, y=target), repeat
+        )
+    return results
+
+
+def make_api_payloads(n_rows: int, seed: int = 0) -> List[Dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'id': number,
+            'neighbourhood': NEIGHBOURHOODS[rng.integers(len(NEIGHBOURHOODS))],
+            'room_type': ROOM_TYPES[rng.integers(len(ROOM_TYPES))],
+            'accommodates': int(rng.integers(1, 17)),
+            'bathrooms': float(rng.integers(0, 8)) / 2,
+            'bedrooms': int(rng.integers(1, 14))
+        }
+        for number in range(n_rows)
+    ]
+
+
+def bench_serving(model, n_requests: int, batch_size: int, repeat: int) -> Dict[str, float]:
+    """
+    Throughput of /predict/ (one listing per call) and /predict/batch
+    through the Flask test client, with the prediction cache disabled so
+    every call reaches the model.
+    """
+    with tempfile.TemporaryDirectory() as path:
+        os.environ['ARTIFACT_PATH'] = os.path.join(path, 'model.pkl')
+        os.environ['PREDICTION_CACHE_SIZE'] = '0'
+        with open(os.environ['ARTIFACT_PATH'], 'wb') as file:
+            pickle.dump(model, file)
+        import airbnb_api
+    #  The API predicts on arrays with a model fitted on a frame
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    client = airbnb_api.app.test_client()
+    payloads = make_api_payloads(max(n_requests, batch_size))
+    latencies = list()
+    for payload in payloads[:n_requests]:
+        start = time.perf_counter()
+        assert client.post('/predict/', data=payload).status_code == 200
+        latencies.append(time.perf_counter() - start)
+    batch = json.dumps(payloads[:batch_size])
+    batch_seconds = best_of(
+        lambda: client.post('/predict/batch', data=batch, content_type='application/json'), repeat
+    )
+    return {
+        'serve/single/mean_seconds': float(np.mean(latencies)),
+        'serve/single/p99_seconds': float(np.percentile(latencies, 99)),
+        f'serve/batch/{batch_size}/seconds': batch_seconds
+    }
+
+
+def run_benchmarks(
+    sizes: List[int],
+    repeat: int,
+    fit_n_estimators: int,
+    fit_n_jobs: List[int],
+    n_requests: int,
+    batch_size: int
+) -> Dict:
+    results = dict()
+    processed = None
+    for n_rows in sizes:
+        listings = make_synthetic_listings(n_rows)
+        results.update(bench_processing(listings, repeat))
+        if processed is None:
+            processed = seq_steps_pipeline(CALLABLES_TO_APPLY, listings)
+        print(f'processing {n_rows} rows done', file=sys.stderr)
+    results.update(bench_fit(processed, fit_n_estimators, fit_n_jobs, repeat))
+    print('fit done', file=sys.stderr)
+    model = fit_model(
+        MODEL_SPECS['estimator'],
+        {**MODEL_SPECS['estimator_params'], 'n_estimators': fit_n_estimators, 'n_jobs': 1},
+        x=get_model_features(df=processed, features=MODEL_SPECS['features']),
+        y=get_model_target(df=processed, target=MODEL_SPECS['target'])
+    )
+    results.update(bench_serving(model, n_requests, batch_size, repeat))
+    return {
+        'meta': {
+            'created_at': pd.Timestamp.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float, min_seconds: float) -> List[Dict]:
+    """
+    Compares the timings of two runs. A timing is a regression when it is
+    more than threshold (a fraction) slower than in baseline; timings that
+    took less than min_seconds in baseline are too noisy and are skipped.
+    """
+    comparison = list()
+    for name, before in baseline['results'].items():
+        after = current['results'].get(name)
+        if after is None or before < min_seconds:
+            continue
+        comparison.append({
+            'name': name,
+            'baseline': before,
+            'current': after,
+            'ratio': after / before,
+            'regression': after > before * (1 + threshold)
+        })
+    return comparison
+
+
+def print_comparison(comparison: List[Dict]):
+    for row in comparison:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<70} {row['baseline']:>10.4f}s {row['current']:>10.4f}s {row['ratio']:>6.2f}x{flag}")
+
+
+def load_results(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks processing, training and serving, and compares runs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help='Runs the benchmarks and saves the results as JSON')
+    run.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    run.add_argument('--repeat', type=int, default=3)
+    run.add_argument('--fit-n-estimators', type=int, default=100)
+    run.add_argument('--fit-n-jobs', type=int, nargs='+', default=FIT_N_JOBS)
+    run.add_argument('--requests', type=int, default=200)
+    run.add_argument('--batch-size', type=int, default=1000)
+    run.add_argument('--output', default=PATH_TO_RESULTS)
+    run.add_argument('--baseline', default=None, help='Results to compare with; a regression fails the run')
+    compare = subparsers.add_parser('compare', help='Compares two saved runs; a regression fails it')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    for subparser in [run, compare]:
+        subparser.add_argument('--threshold', type=float, default=0.2, help='Slowdown allowed, as a fraction')
+        subparser.add_argument('--min-seconds', type=float, default=0.001, help='Shorter timings are not compared')
+    args = parser.parse_args()
+    if args.command == 'run':
+        current = run_benchmarks(
+            sizes=args.sizes, repeat=args.repeat, fit_n_estimators=args.fit_n_estimators,
+            fit_n_jobs=args.fit_n_jobs, n_requests=args.requests, batch_size=args.batch_size
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+        baseline = load_results(args.baseline) if args.baseline is not None else None
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+    if baseline is None:
+        print(json.dumps(current['results'], indent=2))
+        sys.exit(0)
+    comparison = compare_results(baseline, current, threshold=args.threshold, min_seconds=args.min_seconds)
+    print_comparison(comparison)
+    sys.exit(1 if any(row['regression'] for row in comparison) else 0)
@@ -1,18 +1,157 @@
-from flask import Flask, jsonify, request
+from functools import partial
+import hmac
+import numpy as np
+import os
+import time
+from flask import Flask, Response, g, jsonify, request
+from sklearn.base import BaseEstimator
 from api_utils import (
-    process_features_airbnb, get_model_features,
-    load_model, make_predictions_airbnb
+    load_model, make_predictions_airbnb, make_probabilities_airbnb, parse_response_mode, parse_batch_payload,
+    get_model_features_batch, process_features_airbnb_batch,
+    make_predictions_airbnb_batch, make_probabilities_airbnb_batch, build_batch_response, get_error_type, get_model_version,
+    FeatureError, FeatureSchema,
+    AIRBNB_FEAT_MAPPING, AIRBNB_OUTPUT_MAPPING, PREDICT_STAGE_NAMES
 )
+from lookup_table import compile_lookup_table, get_feature_grid
+from prediction_cache import PredictionCache
+from micro_batcher import MicroBatcher
+from model_artifact import load_forest_artifact
+from flat_forest import compile_forest, load_flat_forest
+from model_registry import ModelRegistry
+from metrics import Counter, Gauge, Histogram, MetricsRegistry, StageTimer, PROMETHEUS_CONTENT_TYPE
 
 app = Flask(__name__)
 
 
-ARTIFACT_PATH = './models/simple_classifier.pkl'
+#  A pickle file, or a directory written by save_forest_arrays
+ARTIFACT_PATH = os.environ.get('ARTIFACT_PATH', './models/simple_classifier.pkl')
+#  sklearn: the estimator as trained; lookup: a table precomputed at load time;
+#  flat: the trees as flat arrays, traversed all at once (memory-mapped if ARTIFACT_PATH is a directory)
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'sklearn')
+#  Threads of every model call; with several workers, more than 1 oversubscribes the cores
+MODEL_N_JOBS = int(os.environ.get('MODEL_N_JOBS', 1))
+#  Size (0 disables the cache) and time to live in seconds of the prediction cache
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+PREDICTION_CACHE_TTL = float(os.environ['PREDICTION_CACHE_TTL']) if 'PREDICTION_CACHE_TTL' in os.environ else None
+#  Dynamic batching of concurrent /predict/ requests (MICRO_BATCHING=1 enables it)
+MICRO_BATCHING = os.environ.get('MICRO_BATCHING', '0') == '1'
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 32))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 2))
+#  Seconds between checks of ARTIFACT_PATH for a new model (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+#  Token expected in the X-Admin-Token header of the admin endpoints (they answer 403 if it is empty)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+#  Header with the version of the model that answered a prediction
+MODEL_VERSION_HEADER = 'X-Model-Version'
 #  Important: this list must follow the order used by the DS in training
 FEATURES_TO_GET = [
     'neighbourhood', 'room_type', 'accommodates', 'bathrooms', 'bedrooms'
 ]
-ESTIMATOR = load_model(path=ARTIFACT_PATH)
+#  Values of FEATURES_TO_GET used by the lookup engine for artifacts trained before
+#  train_model_pipeline saved the observed grid with the model
+LOOKUP_FEATURE_GRID = [
+    sorted(AIRBNB_FEAT_MAPPING['neighbourhood'].values()),
+    sorted(AIRBNB_FEAT_MAPPING['room_type'].values()),
+    range(1, 17),
+    np.arange(0, 8, 0.5),
+    range(1, 14)
+]
+#  Listings every new model must predict a known category for before it is served:
+#  every neighbourhood and room type, with a small and a large listing
+VALIDATION_FEATURES = np.array([
+    [neighbourhood, room_type, *numbers]
+    for neighbourhood in sorted(AIRBNB_FEAT_MAPPING['neighbourhood'].values())
+    for room_type in sorted(AIRBNB_FEAT_MAPPING['room_type'].values())
+    for numbers in [(2, 1, 1), (8, 2.5, 4)]
+], dtype=float)
+
+
+def load_estimator(path: str, engine: str) -> BaseEstimator:
+    if engine == 'flat':
+        return load_flat_forest(path) if os.path.isdir(path) else compile_forest(load_model(path=path))
+    model = load_forest_artifact(path) if os.path.isdir(path) else load_model(path=path)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = MODEL_N_JOBS
+    if engine == 'lookup':
+        table = compile_lookup_table(model, grid=get_feature_grid(model, default=LOOKUP_FEATURE_GRID))
+        table.artifact_version_ = model.artifact_version_
+        return table
+    return model
+
+
+def record_model_reload(outcome: str, previous: BaseEstimator, model: BaseEstimator):
+    MODEL_RELOADS.labels(outcome).inc()
+    if outcome == 'swapped':
+        MODEL_INFO.labels(str(get_model_version(previous))).dec()
+        MODEL_INFO.labels(str(get_model_version(model))).inc()
+
+
+MODEL_REGISTRY = ModelRegistry(
+    path=ARTIFACT_PATH,
+    load=partial(load_estimator, engine=MODEL_ENGINE),
+    validation_features=VALIDATION_FEATURES,
+    labels=AIRBNB_OUTPUT_MAPPING,
+    watch_interval=MODEL_WATCH_INTERVAL or None,
+    on_reload=record_model_reload
+)
+FEATURE_SCHEMA = FeatureSchema(FEATURES_TO_GET)
+PREDICTION_CACHE = PredictionCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL) if PREDICTION_CACHE_SIZE > 0 else None
+MICRO_BATCHER = MicroBatcher(
+    max_batch_size=MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS
+) if MICRO_BATCHING else None
+METRICS = MetricsRegistry()
+REQUESTS = METRICS.register(Counter(
+    'airbnb_api_requests_total', 'Requests served, by endpoint and status code', ('endpoint', 'status')
+))
+REQUEST_ERRORS = METRICS.register(Counter(
+    'airbnb_api_request_errors_total', 'Rejected or failed requests, by endpoint and error type', ('endpoint', 'type')
+))
+REQUESTS_IN_FLIGHT = METRICS.register(Gauge(
+    'airbnb_api_requests_in_flight', 'Requests being served, by endpoint', ('endpoint',)
+))
+REQUEST_SECONDS = METRICS.register(Histogram(
+    'airbnb_api_request_seconds', 'Latency of the requests, by endpoint', ('endpoint',)
+))
+PREDICT_STAGE_SECONDS = METRICS.register(Histogram(
+    'airbnb_api_predict_stage_seconds', 'Latency of every stage of /predict/', ('stage',)
+))
+MODEL_INFO = METRICS.register(Gauge(
+    'airbnb_api_model_info', 'Version of the model being served (1 for the current one)', ('version',)
+))
+MODEL_RELOADS = METRICS.register(Counter(
+    'airbnb_api_model_reloads_total', 'Model reloads, by outcome (swapped or failed)', ('outcome',)
+))
+PREDICT_STAGES = {
+    stage: PREDICT_STAGE_SECONDS.labels(stage)
+    for stage in PREDICT_STAGE_NAMES
+}
+
+MODEL_INFO.labels(str(MODEL_REGISTRY.version)).inc()
+
+
+@app.before_request
+def start_request_metrics():
+    g.endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(g.endpoint).inc()
+
+
+@app.after_request
+def count_request(response):
+    REQUESTS.labels(g.endpoint, str(response.status_code)).inc()
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    REQUESTS_IN_FLIGHT.labels(g.endpoint).dec()
+    REQUEST_SECONDS.labels(g.endpoint).observe(time.perf_counter() - g.started)
+
+
+@app.errorhandler(FeatureError)
+def handle_feature_error(error: FeatureError):
+    return jsonify({'error': error.to_dict()}), 400
 
 
 @app.route('/', methods=['GET'])
@@ -22,19 +161,146 @@ def home():
 
 @app.route('/predict/', methods=['POST', 'GET'])
 def make_predictions():
-    features = get_model_features(
-        request.values,
+    stages = StageTimer(PREDICT_STAGES)
+    try:
+        features_proc = FEATURE_SCHEMA.parse(request.values)
+        with_probabilities, top_k = parse_response_mode(request.values)
+        stages.lap('features')
+        #  The model is read once, so a reload during the request doesn't mix two models.
+        #  The micro-batcher is bound to it, so the batch that predicts this row uses it too
+        model = MODEL_REGISTRY.get()
+        if MICRO_BATCHER is not None:
+            model = MICRO_BATCHER.bind(model)
+        model_version = str(get_model_version(model))
+        if with_probabilities or top_k is not None:
+            prediction = make_probabilities_airbnb(
+                model=model,
+                features=features_proc,
+                with_probabilities=with_probabilities,
+                top_k=top_k,
+                cache=PREDICTION_CACHE
+            )
+        else:
+            prediction = {'price_category': make_predictions_airbnb(
+                model=model,
+                features=features_proc,
+                cache=PREDICTION_CACHE
+            )}
+        stages.lap('prediction')
+        response = jsonify({
+            'id': request.values['id'],
+            **prediction,
+            'model_version': model_version
+        })
+        response.headers[MODEL_VERSION_HEADER] = model_version
+        stages.lap('serialization')
+    except Exception as error:
+        REQUEST_ERRORS.labels(g.endpoint, get_error_type(error)).inc()
+        raise
+    return response
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(PREDICTION_CACHE.stats() if PREDICTION_CACHE is not None else {'enabled': False})
+
+
+@app.route('/batching/stats', methods=['GET'])
+def batching_stats():
+    return jsonify(MICRO_BATCHER.stats() if MICRO_BATCHER is not None else {'enabled': False})
+
+
+@app.route('/predict/batch', methods=['POST'])
+def make_batch_predictions():
+    try:
+        records = parse_batch_payload(
+            request.get_data(as_text=True),
+            content_type=request.content_type
+        )
+    except ValueError as error:
+        REQUEST_ERRORS.labels(g.endpoint, 'invalid_payload').inc()
+        return jsonify({'error': str(error)}), 400
+    try:
+        with_probabilities, top_k = parse_response_mode(request.args)
+    except FeatureError as error:
+        REQUEST_ERRORS.labels(g.endpoint, error.error_type).inc()
+        raise
+    positions, features, errors = get_model_features_batch(
+        records,
         model_features=FEATURES_TO_GET
     )
-    features_proc = process_features_airbnb(features=features)
-    prediction = make_predictions_airbnb(
-        model=ESTIMATOR,
-        features=features_proc
+    features_proc, rows, processing_errors = process_features_airbnb_batch(
+        features=features,
+        model_features=FEATURES_TO_GET,
+        ranges=FEATURE_SCHEMA.ranges
     )
-    return jsonify({
-        'id': request.values['id'],
-        'price_category': prediction
-    })
+    model = MODEL_REGISTRY.get()
+    if with_probabilities or top_k is not None:
+        predictions = make_probabilities_airbnb_batch(
+            model=model,
+            features=features_proc,
+            with_probabilities=with_probabilities,
+            top_k=top_k
+        )
+    else:
+        predictions = make_predictions_airbnb_batch(
+            model=model,
+            features=features_proc
+        )
+    response = jsonify(build_batch_response(
+        records=records,
+        positions=[positions[row] for row in rows],
+        predictions=predictions,
+        errors={**errors, **{positions[row]: error for row, error in processing_errors.items()}}
+    ))
+    response.headers[MODEL_VERSION_HEADER] = str(get_model_version(model))
+    return response
+
+
+def check_admin_request():
+    """
+    Returns the 403 response of a request to the admin endpoints without
+    the ADMIN_TOKEN, or None if it has it. Without an ADMIN_TOKEN, the
+    admin endpoints are disabled.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'The admin endpoints are disabled, ADMIN_TOKEN is not set'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+
+@app.route('/admin/model', methods=['GET'])
+def model_status():
+    error = check_admin_request()
+    if error is not None:
+        return error
+    return jsonify(MODEL_REGISTRY.status())
+
+
+@app.route('/admin/reload', methods=['POST'])
+def reload_model():
+    """
+    Reloads ARTIFACT_PATH in the background and answers 202 right away, or
+    with wait=1, once the new model is served (200) or was rejected (422).
+    Only the worker that gets the request reloads: with several workers,
+    use MODEL_WATCH_INTERVAL instead.
+    """
+    error = check_admin_request()
+    if error is not None:
+        return error
+    wait = request.values.get('wait', '0') == '1'
+    if not MODEL_REGISTRY.reload(wait=wait):
+        return jsonify({'error': 'A reload is already running', **MODEL_REGISTRY.status()}), 409
+    status = MODEL_REGISTRY.status()
+    if not wait:
+        return jsonify(status), 202
+    return jsonify(status), 200 if status['last_error'] is None else 422
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 
 if __name__ == '__main__':
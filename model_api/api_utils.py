@@ -1,8 +1,12 @@
+from functools import partial
+import json
 import numpy as np
+import os
 import pandas as pd
 import pickle
+import threading
 from sklearn.base import BaseEstimator
-from typing import Dict, List, Union
+from typing import Dict, Hashable, List, Optional, Tuple, Union
 
 AIRBNB_FEAT_MAPPING = {
     'room_type': {
@@ -17,10 +21,89 @@ AIRBNB_OUTPUT_MAPPING = {
     2: "high",
     3: "lux"
 }
+AIRBNB_OUTPUT_LABELS = np.array(
+    [AIRBNB_OUTPUT_MAPPING[label] for label in sorted(AIRBNB_OUTPUT_MAPPING)],
+    dtype=object
+)
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+#  Stages of a /predict/ request timed by the API, in order
+PREDICT_STAGE_NAMES = ['features', 'prediction', 'serialization']
+#  Valid values of the numeric features (both ends included)
+AIRBNB_FEAT_RANGES = {
+    'accommodates': (0, 100),
+    'bathrooms': (0, 50),
+    'bedrooms': (0, 50)
+}
+
+
+class FeatureError(Exception):
+    """
+    Error in the features of a listing sent to the API. It keeps the
+    feature that caused it, and its error_type labels the error metrics and
+    the 400 responses.
+    """
+    error_type = 'invalid_value'
+
+    def __init__(self, message: str, feature: str = None):
+        super().__init__(message)
+        self.feature = feature
+
+    def to_dict(self) -> Dict:
+        return {'type': self.error_type, 'feature': self.feature, 'message': self.args[0]}
+
+
+class MissingFeatureError(FeatureError, KeyError):
+    error_type = 'missing_feature'
+
+
+class NullFeatureError(FeatureError, ValueError):
+    error_type = 'null_value'
+
+
+class UnmappedCategoryError(FeatureError, KeyError):
+    error_type = 'unmapped_category'
+
+
+class InvalidFeatureError(FeatureError, ValueError):
+    error_type = 'invalid_value'
+
+
+class OutOfRangeFeatureError(FeatureError, ValueError):
+    error_type = 'out_of_range'
+
+
+def get_error_type(error: Exception) -> str:
+    """
+    Short name of the kind of error raised while serving a prediction, used
+    to label the error metrics.
+    """
+    if hasattr(error, 'error_type'):
+        return error.error_type
+    if isinstance(error, KeyError):
+        return 'missing_feature'
+    if isinstance(error, ValueError):
+        return 'invalid_value'
+    return 'internal'
+
+
+def get_artifact_version(path: str) -> str:
+    """
+    Identifies an artifact by its size and modification time, so a new
+    artifact written at the same path gets a different version.
+    """
+    stat = os.stat(path)
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
 
 
 def load_model(path: str) -> BaseEstimator:
-    return pickle.load(open(path, 'rb'))
+    with open(path, 'rb') as file:
+        model = pickle.load(file)
+    model.artifact_version_ = get_artifact_version(path)
+    return model
+
+
+def get_model_version(model: BaseEstimator) -> Hashable:
+    return getattr(model, 'artifact_version_', id(model))
 
 
 def get_model_features(request: Dict, model_features: List[str]) -> Dict:
@@ -29,9 +112,9 @@ def get_model_features(request: Dict, model_features: List[str]) -> Dict:
         try:
             feature_value = request[feature]
         except:
-            raise KeyError(f'The feature {feature} is not available in the payload sent')
+            raise MissingFeatureError(f'The feature {feature} is not available in the payload sent', feature)
         if pd.isna(feature_value):
-            raise ValueError(f'The feature {feature} has null values')
+            raise NullFeatureError(f'The feature {feature} has null values', feature)
         output[feature] = feature_value
     return output
 
@@ -48,7 +131,7 @@ def map_values(value_to_map: Union[str, int], mapping: Dict):
     if value_to_map in mapping.keys():
         return mapping[value_to_map]
     else:
-        raise KeyError(f'{value_to_map} wasn`t found in the mapping dict')
+        raise UnmappedCategoryError(f'{value_to_map} wasn`t found in the mapping dict')
 
 
 def make_model_prediction(model: BaseEstimator, features: np.array) -> int:
@@ -68,6 +151,302 @@ def process_features_airbnb(features: Dict) -> np.array:
     return np.fromiter(features.values(), dtype=float).reshape(1, -1)
 
 
-def make_predictions_airbnb(model: BaseEstimator, features: np.array) -> str:
-    prediction_int = make_model_prediction(model=model, features=features)
+class FeatureSchema:
+    """
+    Validation and assembly of the features of one listing, compiled once
+    at start-up from the model features, the category mappings and the
+    ranges of the numeric features. parse checks every feature in a single
+    pass (missing, null, unmapped category, not numeric, out of range) and
+    writes it straight into a preallocated row, instead of building a dict,
+    mapping it and copying it into an array. The row belongs to the calling
+    thread and is overwritten by its next call, so it must not be kept
+    after the prediction.
+    """
+
+    def __init__(
+        self,
+        model_features: List[str],
+        mappings: Dict[str, Dict] = AIRBNB_FEAT_MAPPING,
+        ranges: Dict[str, Tuple[float, float]] = AIRBNB_FEAT_RANGES
+    ):
+        self.model_features = list(model_features)
+        self.ranges = {feature: ranges[feature] for feature in self.model_features if feature in ranges}
+        self.parsers = [
+            (position, feature, mappings.get(feature), *ranges.get(feature, (-np.inf, np.inf)))
+            for position, feature in enumerate(self.model_features)
+        ]
+        self.local = threading.local()
+
+    def get_row(self) -> np.array:
+        try:
+            return self.local.row
+        except AttributeError:
+            self.local.row = np.empty((1, len(self.model_features)), dtype=float)
+            return self.local.row
+
+    def parse(self, values: Dict) -> np.array:
+        row = self.get_row()
+        for position, feature, table, low, high in self.parsers:
+            try:
+                value = values[feature]
+            except KeyError:
+                raise MissingFeatureError(
+                    f'The feature {feature} is not available in the payload sent', feature
+                ) from None
+            if value is None:
+                raise NullFeatureError(f'The feature {feature} has null values', feature)
+            if table is not None:
+                try:
+                    code = table.get(value)
+                except TypeError:
+                    code = None
+                if code is None:
+                    raise UnmappedCategoryError(f'{value} wasn`t found in the mapping dict', feature)
+                row[0, position] = code
+                continue
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise InvalidFeatureError(f'The feature {feature} must be numeric, got {value}', feature) from None
+            if number != number:
+                raise NullFeatureError(f'The feature {feature} has null values', feature)
+            if not low <= number <= high:
+                raise OutOfRangeFeatureError(
+                    f'The feature {feature} must be between {low} and {high}, got {value}', feature
+                )
+            row[0, position] = number
+        return row
+
+
+def make_predictions_airbnb(model: BaseEstimator, features: np.array, cache=None) -> str:
+    """
+    Predicts the price category of a single listing. If a PredictionCache
+    is given, the prediction is looked up there first (keyed on the
+    processed features and bound to the version of the model).
+    """
+    if cache is None:
+        prediction_int = make_model_prediction(model=model, features=features)
+    else:
+        prediction_int = cache.get_or_compute(
+            key=tuple(np.ravel(features).tolist()),
+            compute=partial(make_model_prediction, model=model, features=features),
+            version=get_model_version(model)
+        )
     return map_values(value_to_map=prediction_int, mapping=AIRBNB_OUTPUT_MAPPING)
+
+
+def parse_response_mode(values: Dict, n_classes: int = len(AIRBNB_OUTPUT_MAPPING)) -> Tuple[bool, Optional[int]]:
+    """
+    Reads the optional response mode of a prediction request:
+    probabilities=1 adds the probability of every price category, and
+    top_k=k the k most likely ones. Returns (probabilities, top_k), with
+    top_k None if it wasn't asked.
+    """
+    probabilities = values.get('probabilities', '0') in ('1', 'true')
+    top_k = values.get('top_k')
+    if top_k is None:
+        return probabilities, None
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError):
+        raise InvalidFeatureError(f'top_k must be an integer, got {top_k}', 'top_k') from None
+    if not 1 <= top_k <= n_classes:
+        raise OutOfRangeFeatureError(f'top_k must be between 1 and {n_classes}, got {top_k}', 'top_k')
+    return probabilities, top_k
+
+
+def make_model_probabilities(model: BaseEstimator, features: np.array) -> np.array:
+    probabilities = np.asarray(model.predict_proba(features))[0]
+    #  The row can be cached and shared between requests
+    probabilities.setflags(write=False)
+    return probabilities
+
+
+def postprocess_probabilities(
+    probabilities: np.array,
+    classes: np.array,
+    with_probabilities: bool = True,
+    top_k: Optional[int] = None
+) -> List[Dict]:
+    """
+    Turns the output of predict_proba (one row per listing, one column per
+    class of classes) into the responses of those listings: the most likely
+    price_category, and optionally the probability of every category and the
+    top_k most likely ones, from most to least likely. The classes are
+    ranked with one argsort of the whole matrix, and ties go to the first
+    class like in predict.
+    """
+    labels = AIRBNB_OUTPUT_LABELS[np.asarray(classes, dtype=int)]
+    order = np.argsort(-probabilities, axis=1, kind='stable')
+    outputs = [{'price_category': label} for label in labels[order[:, 0]].tolist()]
+    if with_probabilities:
+        names = labels.tolist()
+        for output, row in zip(outputs, probabilities.tolist()):
+            output['probabilities'] = dict(zip(names, row))
+    if top_k is not None:
+        top_labels = labels[order[:, :top_k]].tolist()
+        top_probabilities = np.take_along_axis(probabilities, order[:, :top_k], axis=1).tolist()
+        for output, row_labels, row_probabilities in zip(outputs, top_labels, top_probabilities):
+            output['top_k'] = [
+                {'price_category': label, 'probability': probability}
+                for label, probability in zip(row_labels, row_probabilities)
+            ]
+    return outputs
+
+
+def make_probabilities_airbnb(
+    model: BaseEstimator,
+    features: np.array,
+    with_probabilities: bool = True,
+    top_k: Optional[int] = None,
+    cache=None
+) -> Dict:
+    """
+    Probability version of make_predictions_airbnb: a single predict_proba
+    call gives the price category and its probabilities. With a
+    PredictionCache, the probabilities are cached apart from the labels of
+    make_predictions_airbnb, under a key that starts with 'proba'.
+    """
+    if cache is None:
+        probabilities = make_model_probabilities(model=model, features=features)
+    else:
+        probabilities = cache.get_or_compute(
+            key=('proba', *np.ravel(features).tolist()),
+            compute=partial(make_model_probabilities, model=model, features=features),
+            version=get_model_version(model)
+        )
+    return postprocess_probabilities(
+        probabilities.reshape(1, -1), classes=model.classes_, with_probabilities=with_probabilities, top_k=top_k
+    )[0]
+
+
+def parse_batch_payload(payload: str, content_type: str = 'application/json') -> List[Dict]:
+    """
+    Parses the body of a batch request. It can be a JSON array of listings
+    or, when the content type is one of NDJSON_CONTENT_TYPES, one JSON
+    listing per line (blank lines are ignored).
+    """
+    if content_type is not None and content_type.split(';')[0].strip() in NDJSON_CONTENT_TYPES:
+        return [json.loads(line) for line in payload.splitlines() if line.strip()]
+    records = json.loads(payload)
+    if not isinstance(records, list):
+        raise ValueError('The batch payload must be a JSON array of listings')
+    return records
+
+
+def get_model_features_batch(
+    records: List[Dict],
+    model_features: List[str]
+) -> Tuple[List[int], List[Dict], Dict[int, str]]:
+    """
+    Runs get_model_features over every listing of a batch. Instead of
+    failing the whole batch, the errors are collected by the position of
+    the listing in the batch. Returns the positions of the valid listings,
+    their features and the errors.
+    """
+    positions, features, errors = list(), list(), dict()
+    for position, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[position] = 'Each listing of the batch must be a JSON object'
+            continue
+        try:
+            features.append(get_model_features(record, model_features=model_features))
+        except (KeyError, ValueError) as error:
+            errors[position] = error.args[0]
+            continue
+        positions.append(position)
+    return positions, features, errors
+
+
+def process_features_airbnb_batch(
+    features: List[Dict],
+    model_features: List[str],
+    ranges: Dict[str, Tuple[float, float]] = AIRBNB_FEAT_RANGES
+) -> Tuple[np.array, np.array, Dict[int, str]]:
+    """
+    Batch version of process_features_airbnb. It builds a single feature
+    matrix (one row per listing, columns following model_features) and maps
+    the categorical features column-wise. The numeric features are checked
+    against ranges, like FeatureSchema.parse does. Returns the matrix of the
+    valid rows, the indexes of those rows in features, and the errors of the
+    invalid ones (indexed by their position in features).
+    """
+    frame = pd.DataFrame.from_records(features, columns=model_features)
+    valid = np.ones(len(frame), dtype=bool)
+    errors = dict()
+    for feature in model_features:
+        if feature in AIRBNB_FEAT_MAPPING:
+            column = frame[feature].map(AIRBNB_FEAT_MAPPING[feature])
+            failed = column.isna().to_numpy()
+            message = '{} wasn`t found in the mapping dict'
+        else:
+            column = pd.to_numeric(frame[feature], errors='coerce')
+            failed = column.isna().to_numpy()
+            message = f'The feature {feature} must be numeric, got {{}}'
+            if feature in ranges:
+                low, high = ranges[feature]
+                out_of_range = ~failed & ~column.between(low, high).to_numpy()
+                for row in np.flatnonzero(out_of_range & valid):
+                    errors[int(row)] = f'The feature {feature} must be between {low} and {high}, got {frame[feature].iat[row]}'
+                valid &= ~out_of_range
+        for row in np.flatnonzero(failed & valid):
+            errors[int(row)] = message.format(frame[feature].iat[row])
+        valid &= ~failed
+        frame[feature] = column
+    rows = np.flatnonzero(valid)
+    return frame.to_numpy(dtype=float)[rows], rows, errors
+
+
+def make_predictions_airbnb_batch(model: BaseEstimator, features: np.array) -> List[str]:
+    """
+    Batch version of make_predictions_airbnb: it calls the model once for
+    the whole matrix and maps the predicted labels with a vectorized lookup.
+    """
+    if len(features) == 0:
+        return list()
+    prediction_raw = np.asarray(model.predict(features), dtype=int)
+    return AIRBNB_OUTPUT_LABELS[prediction_raw].tolist()
+
+
+def make_probabilities_airbnb_batch(
+    model: BaseEstimator,
+    features: np.array,
+    with_probabilities: bool = True,
+    top_k: Optional[int] = None
+) -> List[Dict]:
+    """
+    Batch version of make_probabilities_airbnb: one predict_proba call and
+    one postprocessing for the whole matrix.
+    """
+    if len(features) == 0:
+        return list()
+    return postprocess_probabilities(
+        np.asarray(model.predict_proba(features)),
+        classes=model.classes_,
+        with_probabilities=with_probabilities,
+        top_k=top_k
+    )
+
+
+def build_batch_response(
+    records: List[Dict],
+    positions: List[int],
+    predictions: List[Union[str, Dict]],
+    errors: Dict[int, str]
+) -> List[Dict]:
+    """
+    Assembles the batch response following the input order: the listing
+    at positions[i] gets predictions[i] (a price category, or the dict of
+    make_probabilities_airbnb_batch), and every position in errors gets its
+    own error message.
+    """
+    output = [None] * len(records)
+    for position, prediction in zip(positions, predictions):
+        if isinstance(prediction, dict):
+            output[position] = {'id': records[position].get('id'), **prediction}
+        else:
+            output[position] = {'id': records[position].get('id'), 'price_category': prediction}
+    for position, error in errors.items():
+        record_id = records[position].get('id') if isinstance(records[position], dict) else None
+        output[position] = {'id': record_id, 'error': error}
+    return output
@@ -0,0 +1,20 @@
+import gc
+import multiprocessing
+import os
+
+#  Production serving settings, they can be overridden with environment variables
+bind = os.environ.get('API_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('API_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('API_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('API_TIMEOUT', 30))
+#  The app (and so the model) is loaded once in the master process before
+#  forking the workers, so the workers share its memory copy-on-write
+preload_app = True
+accesslog = os.environ.get('API_ACCESS_LOG', None)
+
+
+def pre_fork(server, worker):
+    #  Moves the objects loaded so far (the model) out of the reach of the
+    #  garbage collector, so its passes don't write on (and copy) shared pages
+    gc.freeze()
@@ -0,0 +1,120 @@
+import numpy as np
+from sklearn.base import BaseEstimator
+from typing import List, Optional, Sequence, Tuple
+import warnings
+
+
+class LookupTableModel:
+    """
+    Precomputed version of a classifier over a small feature domain. The
+    domain is the cartesian product of the values in grid (one sorted list of
+    values per feature), and the probabilities and predictions of the
+    estimator for every point of the domain are stored in dense arrays.
+    Rows inside the domain are answered with an array index, and the rest of
+    the rows fall back to the estimator. It can be used anywhere the
+    estimator is used, since it exposes the same predict/predict_proba.
+    Single rows, the usual API input, are located with a dict lookup.
+    """
+
+    def __init__(self, estimator: BaseEstimator, grid: List[np.array], proba: np.array):
+        self.estimator = estimator
+        self.grid = grid
+        self.shape = tuple(len(values) for values in grid)
+        self.classes_ = estimator.classes_
+        self.proba = proba
+        self.labels = estimator.classes_.take(np.argmax(proba, axis=1), axis=0)
+        self.position_of = {
+            point: position for position, point in enumerate(map(tuple, get_grid_points(grid).tolist()))
+        }
+
+    def locate(self, features: np.array) -> Tuple[np.array, np.array]:
+        """
+        Returns the position of every row in the table and a mask with the
+        rows that are inside the domain (the position of the rows outside
+        the domain is meaningless).
+        """
+        features = np.asarray(features, dtype=float).reshape(-1, len(self.grid))
+        in_domain = np.ones(len(features), dtype=bool)
+        positions = list()
+        for column, values in enumerate(self.grid):
+            position = np.searchsorted(values, features[:, column]).clip(max=len(values) - 1)
+            in_domain &= values[position] == features[:, column]
+            positions.append(position)
+        return np.ravel_multi_index(positions, self.shape), in_domain
+
+    def predict_proba(self, features: np.array) -> np.array:
+        features = np.asarray(features, dtype=float).reshape(-1, len(self.grid))
+        if len(features) == 1 and tuple(features[0].tolist()) in self.position_of:
+            return self.proba[[self.position_of[tuple(features[0].tolist())]]]
+        positions, in_domain = self.locate(features)
+        if in_domain.all():
+            return self.proba[positions]
+        output = np.empty((len(features), self.proba.shape[1]))
+        output[in_domain] = self.proba[positions[in_domain]]
+        output[~in_domain] = self.estimator.predict_proba(features[~in_domain])
+        return output
+
+    def predict(self, features: np.array) -> np.array:
+        features = np.asarray(features, dtype=float).reshape(-1, len(self.grid))
+        if len(features) == 1 and tuple(features[0].tolist()) in self.position_of:
+            return self.labels[[self.position_of[tuple(features[0].tolist())]]]
+        positions, in_domain = self.locate(features)
+        if in_domain.all():
+            return self.labels[positions]
+        output = np.empty(len(features), dtype=self.labels.dtype)
+        output[in_domain] = self.labels[positions[in_domain]]
+        output[~in_domain] = self.estimator.predict(features[~in_domain])
+        return output
+
+
+def get_grid_points(grid: List[np.array]) -> np.array:
+    """
+    Returns every point of the grid, one per row, in the order used by the
+    table (the one of np.ravel_multi_index).
+    """
+    return np.stack([axis.ravel() for axis in np.meshgrid(*grid, indexing='ij')], axis=1)
+
+
+def get_observed_feature_grid(features: np.array) -> List[np.array]:
+    """
+    Returns the grid of a feature matrix: the sorted unique values of each
+    column (for example, the training features of the model).
+    """
+    features = np.asarray(features, dtype=float)
+    return [np.unique(features[:, column]) for column in range(features.shape[1])]
+
+
+def set_feature_grid(model: BaseEstimator, features: np.array) -> BaseEstimator:
+    """
+    Stores the observed grid of the training features on the model (as
+    feature_grid_), so it is saved with the artifact and the lookup table
+    covers the domain of the model it is compiled from.
+    """
+    model.feature_grid_ = get_observed_feature_grid(features)
+    return model
+
+
+def get_feature_grid(model: BaseEstimator, default: Optional[List[Sequence[float]]] = None) -> List[Sequence[float]]:
+    """
+    Returns the grid saved with the model by set_feature_grid. Artifacts
+    trained before the grid was saved get default, with a warning.
+    """
+    grid = getattr(model, 'feature_grid_', None)
+    if grid is not None:
+        return grid
+    if default is None:
+        raise ValueError('The model has no feature grid, train it again or give a default grid')
+    warnings.warn('The model has no feature grid, the lookup table is compiled over the default grid')
+    return default
+
+
+def compile_lookup_table(estimator: BaseEstimator, grid: List[Sequence[float]]) -> LookupTableModel:
+    """
+    Enumerates every point of the grid and runs the estimator over all of
+    them at once, to build a LookupTableModel. The size of the table is the
+    product of the number of values of each feature, so the grid must be
+    small (tens of thousands of points).
+    """
+    grid = [np.unique(np.asarray(values, dtype=float)) for values in grid]
+    proba = np.asarray(estimator.predict_proba(get_grid_points(grid)), dtype=float)
+    return LookupTableModel(estimator=estimator, grid=grid, proba=proba)
@@ -0,0 +1,157 @@
+from bisect import bisect_left
+import threading
+import time
+from typing import Dict, List, Tuple
+
+LATENCY_BUCKETS_S = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, float('inf')
+]
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class CounterChild:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f'{name}{labels} {self.value}']
+
+
+class GaugeChild(CounterChild):
+    def dec(self, amount: float = 1.0):
+        with self.lock:
+            self.value -= amount
+
+
+class HistogramChild:
+    def __init__(self, buckets: List[float]):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = list(), 0
+        for bucket, count in zip(self.buckets, counts):
+            cumulative += count
+            bound = '+Inf' if bucket == float('inf') else repr(bucket)
+            bucket_labels = f'{labels[:-1]},le="{bound}"}}' if labels else f'{{le="{bound}"}}'
+            samples.append(f'{name}_bucket{bucket_labels} {cumulative}')
+        samples.append(f'{name}_sum{labels} {total}')
+        samples.append(f'{name}_count{labels} {cumulative}')
+        return samples
+
+
+class StageTimer:
+    """
+    Times the consecutive stages of a request with one clock reading per
+    stage: lap observes the seconds since the previous lap (or since the
+    timer was created) in the histogram of the stage.
+    """
+    __slots__ = ('histograms', 'last')
+
+    def __init__(self, histograms: Dict[str, HistogramChild]):
+        self.histograms = histograms
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.histograms[stage].observe(now - self.last)
+        self.last = now
+
+
+class Metric:
+    """
+    A metric with a value (a child) for every combination of the values of
+    its labels. The children are created on their first use; the ones used
+    on every request can be looked up once with labels and kept.
+    """
+    kind = None
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.children = dict()
+
+    def make_child(self):
+        raise NotImplementedError
+
+    def labels(self, *label_values: str):
+        child = self.children.get(label_values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(label_values, self.make_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            children = sorted(self.children.items())
+        for label_values, child in children:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, label_values))
+            lines.extend(child.samples(self.name, f'{{{labels}}}' if labels else ''))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def make_child(self) -> CounterChild:
+        return CounterChild()
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def make_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: List[float] = LATENCY_BUCKETS_S
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+
+    def make_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process, rendered in the Prometheus text format. Every
+    gunicorn worker has its own registry.
+    """
+
+    def __init__(self):
+        self.metrics = list()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
@@ -0,0 +1,137 @@
+from concurrent.futures import Future
+import numpy as np
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+QUEUE_DELAY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, float('inf')]
+
+
+class BatchedModel:
+    """
+    A model whose predictions go through a MicroBatcher. It is bound to one
+    model, so its predictions, classes_ and artifact_version_ always come
+    from that same model, even if another one is served in the meantime.
+    """
+
+    def __init__(self, batcher: 'MicroBatcher', model):
+        self.batcher = batcher
+        self.model = model
+
+    @property
+    def artifact_version_(self):
+        return getattr(self.model, 'artifact_version_', id(self.model))
+
+    @property
+    def classes_(self) -> np.array:
+        return self.model.classes_
+
+    def predict(self, features: np.array) -> np.array:
+        return self.batcher.submit(self.model, features).result()
+
+    def predict_proba(self, features: np.array) -> np.array:
+        return self.batcher.submit(self.model, features, method='predict_proba').result()
+
+
+class MicroBatcher:
+    """
+    Dynamic batching in front of a model. Every call to submit (usually
+    one listing from one request thread) is put in a queue, and a background
+    thread takes up to max_batch_size queued rows, waiting at most
+    max_wait_ms for them since the first one arrived, stacks them and calls
+    the model once. Each caller gets back its own rows of the prediction.
+    Every row is queued with the model that must predict it, and the rows
+    of a batch are grouped by model and method, one call each, so a reload
+    in the middle of a batch never mixes two models. bind(model) gives an
+    object that can be used in place of the model.
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.lock = threading.Lock()
+        self.pid = None
+        self.batch_sizes = dict()
+        self.queue_delay_buckets = [0] * len(QUEUE_DELAY_BUCKETS_MS)
+        self.queue_delay_sum_ms = 0.0
+
+    def bind(self, model) -> BatchedModel:
+        return BatchedModel(self, model)
+
+    def start(self):
+        """
+        Starts the batching thread of the current process. It is called on
+        the first prediction, since threads don't survive the fork of the
+        API workers.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue()
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, model, features: np.array, method: str = 'predict') -> Future:
+        if self.pid != os.getpid():
+            self.start()
+        future = Future()
+        self.queue.put((np.asarray(features, dtype=float).reshape(1, -1), time.perf_counter(), future, (model, method)))
+        return future
+
+    def collect_batch(self) -> List:
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            self.record_batch(batch)
+            groups = dict()
+            for item in batch:
+                model, method = item[3]
+                groups.setdefault((id(model), method), (model, method, list()))[2].append(item)
+            for model, method, items in groups.values():
+                self.run_method(model, method, items)
+
+    def run_method(self, model, method: str, batch: List):
+        try:
+            predictions = getattr(model, method)(np.vstack([features for features, _, _, _ in batch]))
+        except Exception as error:
+            for _, _, future, _ in batch:
+                future.set_exception(error)
+            return
+        for row, (_, _, future, _) in enumerate(batch):
+            future.set_result(predictions[row:row + 1])
+
+    def record_batch(self, batch: List):
+        dispatched_at = time.perf_counter()
+        with self.lock:
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for _, queued_at, _, _ in batch:
+                delay_ms = (dispatched_at - queued_at) * 1000
+                self.queue_delay_sum_ms += delay_ms
+                self.queue_delay_buckets[np.searchsorted(QUEUE_DELAY_BUCKETS_MS, delay_ms)] += 1
+
+    def stats(self) -> Dict:
+        with self.lock:
+            requests = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'batches': sum(self.batch_sizes.values()),
+                'requests': requests,
+                'batch_size_distribution': dict(sorted(self.batch_sizes.items())),
+                'queue_delay_ms': {
+                    'mean': self.queue_delay_sum_ms / requests if requests else None,
+                    'buckets': dict(zip(map(str, QUEUE_DELAY_BUCKETS_MS), self.queue_delay_buckets))
+                }
+            }
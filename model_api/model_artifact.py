@@ -0,0 +1,130 @@
+import copy
+import numpy as np
+import os
+import pickle
+import shutil
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree._tree import Tree
+import time
+from typing import Dict
+
+ARRAYS_TO_SAVE = ['nodes', 'values', 'offsets', 'max_depths']
+SKELETON_FILE = 'skeleton.pkl'
+
+
+def get_forest_arrays(model: RandomForestClassifier) -> Dict[str, np.array]:
+    """
+    Concatenates the node arrays of all the trees of a fitted forest (see
+    save_forest_arrays for the meaning of every array).
+    """
+    states = [estimator.tree_.__getstate__() for estimator in model.estimators_]
+    return {
+        'nodes': np.concatenate([state['nodes'] for state in states]),
+        'values': np.concatenate([state['values'] for state in states]),
+        'offsets': np.cumsum([0] + [state['node_count'] for state in states]),
+        'max_depths': np.array([state['max_depth'] for state in states])
+    }
+
+
+def save_forest_arrays(model: RandomForestClassifier, path: str):
+    """
+    Saves a fitted forest as a directory of raw NumPy buffers instead of a
+    single pickle:
+    - nodes.npy: the nodes of all the trees one after the other (the
+      structured array of sklearn, children indexes are local to each tree).
+    - values.npy: the values (class counts or fractions) of those nodes.
+    - offsets.npy: where the nodes of every tree start (one more than trees).
+    - max_depths.npy: the depth of every tree.
+    - skeleton.pkl: the forest and its trees without their node arrays, a
+      small pickle with the hyperparameters and fitted attributes.
+    The .npy files can be opened with np.load(mmap_mode='r'), so every
+    process that opens them shares the same page-cached copy. They are
+    written into a new directory next to path and then published at path
+    (see publish_artifact_directory), so files that are mapped are never
+    overwritten.
+    """
+    path = os.fspath(path)
+    version_path = f'{path}.{time.time_ns()}'
+    os.makedirs(version_path)
+    for name, array in get_forest_arrays(model).items():
+        np.save(os.path.join(version_path, f'{name}.npy'), np.ascontiguousarray(array))
+    skeleton = copy.copy(model)
+    skeleton.estimators_ = list()
+    for estimator in model.estimators_:
+        shell = copy.copy(estimator)
+        del shell.tree_
+        skeleton.estimators_.append(shell)
+    with open(os.path.join(version_path, SKELETON_FILE), 'wb') as file:
+        pickle.dump(skeleton, file)
+    publish_artifact_directory(version_path, path)
+
+
+def publish_artifact_directory(version_path: str, path: str):
+    """
+    Points path to the directory version_path with a symlink, replaced
+    atomically like the pickle of sink_model, and removes the directory it
+    pointed to before. Truncating a .npy file that a process has mapped
+    crashes that process (SIGBUS) when it reads the lost pages, but
+    removing it doesn't: the mapped data lives until it is unmapped. A
+    directory saved before the symlinks were used is moved aside first.
+    """
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if previous is None and os.path.isdir(path):
+        previous = f'{path}.{os.getpid()}.old'
+        os.rename(path, previous)
+    temporary_link = f'{path}.{os.getpid()}.tmp'
+    os.symlink(os.path.basename(version_path), temporary_link)
+    os.replace(temporary_link, path)
+    if previous is not None and os.path.isdir(previous):
+        shutil.rmtree(previous)
+
+
+def load_forest_arrays(path: str, mmap_mode: str = 'r') -> Dict[str, np.array]:
+    """
+    Opens the node buffers saved by save_forest_arrays. With the default
+    mmap_mode nothing is read until it's used, so it takes milliseconds.
+    """
+    return {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in ARRAYS_TO_SAVE
+    }
+
+
+def load_forest_skeleton(path: str) -> RandomForestClassifier:
+    with open(os.path.join(path, SKELETON_FILE), 'rb') as file:
+        return pickle.load(file)
+
+
+def load_forest_artifact(path: str) -> RandomForestClassifier:
+    """
+    Rebuilds the sklearn forest saved by save_forest_arrays. The trees are
+    filled from the buffers with a memory copy, with no unpickling of the
+    nodes. The forest is tagged with the version of the artifact, like the
+    ones loaded by load_model.
+    """
+    #  Resolved once, so the buffers and the skeleton come from the same save
+    path = os.path.realpath(path)
+    arrays = load_forest_arrays(path)
+    model = load_forest_skeleton(path)
+    offsets = arrays['offsets']
+    for number, estimator in enumerate(model.estimators_):
+        start, stop = offsets[number], offsets[number + 1]
+        tree = Tree(
+            estimator.n_features_in_,
+            np.atleast_1d(estimator.n_classes_).astype(np.intp),
+            estimator.n_outputs_
+        )
+        tree.__setstate__({
+            'max_depth': int(arrays['max_depths'][number]),
+            'node_count': int(stop - start),
+            'nodes': arrays['nodes'][start:stop],
+            'values': arrays['values'][start:stop]
+        })
+        estimator.tree_ = tree
+    model.artifact_version_ = get_forest_artifact_version(path)
+    return model
+
+
+def get_forest_artifact_version(path: str) -> str:
+    stat = os.stat(os.path.join(path, SKELETON_FILE))
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
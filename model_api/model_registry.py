@@ -0,0 +1,162 @@
+import numpy as np
+import os
+import threading
+import time
+from sklearn.base import BaseEstimator
+from typing import Callable, Dict, Iterable, Optional
+
+from api_utils import get_artifact_version, get_model_version
+from model_artifact import get_forest_artifact_version
+
+
+class ModelValidationError(Exception):
+    """
+    A loaded model failed the check against the validation sample, so it
+    was not swapped in.
+    """
+
+
+def get_path_version(path: str) -> str:
+    """
+    Version of the artifact at path (a pickle, or a directory written by
+    save_forest_arrays), the same that the loaders give to the model.
+    """
+    return get_forest_artifact_version(path) if os.path.isdir(path) else get_artifact_version(path)
+
+
+class ModelRegistry:
+    """
+    Holds the model served by the API and replaces it without stopping the
+    traffic. reload loads the artifact at path with load in a background
+    thread, warms the new model up and validates it by predicting
+    validation_features (one label in labels per row), and only then swaps
+    it in with a single assignment. get always returns a complete model,
+    the old one until the swap, so requests never wait for a load. A model
+    that fails to load or to validate is discarded and the old one is kept.
+    With watch_interval, a background thread checks the version of the
+    artifact every watch_interval seconds and reloads it when it changes.
+    on_reload(outcome, previous, model) is called after every reload, with
+    outcome 'swapped' or 'failed'.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        load: Callable,
+        validation_features: np.array,
+        labels: Iterable,
+        watch_interval: Optional[float] = None,
+        on_reload: Optional[Callable] = None
+    ):
+        self.path = path
+        self.load = load
+        self.validation_features = np.asarray(validation_features, dtype=float)
+        self.labels = np.array(list(labels))
+        self.watch_interval = watch_interval
+        self.on_reload = on_reload
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loading = False
+        self.counters = {'reloads': 0, 'failed_reloads': 0}
+        self.last_error = None
+        #  The first model is loaded in the foreground: the API can't serve without it.
+        #  artifact_version is the version of the last artifact loaded (or that failed to)
+        self.artifact_version = get_path_version(path)
+        self.model = self.load_and_validate()
+        self.loaded_at = time.time()
+
+    def get(self) -> BaseEstimator:
+        if self.watch_interval is not None and self.pid != os.getpid():
+            self.start_watcher()
+        return self.model
+
+    @property
+    def version(self):
+        return get_model_version(self.model)
+
+    def load_and_validate(self) -> BaseEstimator:
+        model = self.load(self.path)
+        predictions = np.asarray(model.predict(self.validation_features))
+        if predictions.shape != (len(self.validation_features),):
+            raise ModelValidationError(
+                f'The model returned {predictions.shape} predictions for {len(self.validation_features)} rows'
+            )
+        unknown = np.setdiff1d(predictions, self.labels)
+        if len(unknown) > 0:
+            raise ModelValidationError(f'The model predicted unknown labels {unknown.tolist()}')
+        return model
+
+    def reload(self, wait: bool = False) -> bool:
+        """
+        Starts loading the artifact in the background (wait=True waits for
+        it to finish). Returns False if a reload is already running.
+        """
+        with self.lock:
+            if self.loading:
+                return False
+            self.loading = True
+        thread = threading.Thread(target=self.run_reload, daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def run_reload(self):
+        previous, version = self.model, self.artifact_version
+        try:
+            version = get_path_version(self.path)
+            model = self.load_and_validate()
+        except Exception as error:
+            with self.lock:
+                #  A failed artifact is not retried by the watcher until it changes again
+                self.artifact_version = version
+                self.counters['failed_reloads'] += 1
+                self.last_error = f'{type(error).__name__}: {error}'
+                self.loading = False
+            if self.on_reload is not None:
+                self.on_reload('failed', previous, None)
+            return
+        with self.lock:
+            self.model = model
+            self.artifact_version = version
+            self.loaded_at = time.time()
+            self.counters['reloads'] += 1
+            self.last_error = None
+            self.loading = False
+        if self.on_reload is not None:
+            self.on_reload('swapped', previous, model)
+
+    def start_watcher(self):
+        """
+        Starts the watching thread of the current process. Like the batching
+        thread of MicroBatcher, it is started on first use, since threads
+        don't survive the fork of the API workers.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(target=self.watch, daemon=True).start()
+
+    def watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                version = get_path_version(self.path)
+            except OSError:
+                #  The artifact is being replaced, it is checked again on the next round
+                continue
+            if version != self.artifact_version:
+                self.reload(wait=True)
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {
+                'version': self.version,
+                'path': self.path,
+                'loaded_at': self.loaded_at,
+                'loading': self.loading,
+                'watch_interval': self.watch_interval,
+                **self.counters,
+                'last_error': self.last_error
+            }
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache for model predictions, keyed on the processed
+    features. It holds at most maxsize entries (the least recently used one
+    is evicted first) and, if ttl is given, an entry expires ttl seconds
+    after it was computed. Every entry belongs to a model version: when the
+    cache is used with a different version (a new artifact was loaded), all
+    the entries are dropped.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get_or_compute(self, key: Hashable, compute: Callable, version: Hashable = None):
+        """
+        Returns the value cached for key or, if there isn't any, computes it
+        with compute() and caches it. The computation runs outside the lock,
+        so a slow model doesn't block the hits of other threads.
+        """
+        with self.lock:
+            if version != self.version:
+                self.invalidate_unlocked(version=version)
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and entry[1] <= self.clock():
+                del self.entries[key]
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry[0]
+            self.counters['misses'] += 1
+        value = compute()
+        with self.lock:
+            if version == self.version and self.maxsize > 0:
+                expires_at = None if self.ttl is None else self.clock() + self.ttl
+                self.entries[key] = (value, expires_at)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+                    self.counters['evictions'] += 1
+        return value
+
+    def invalidate(self, version: Hashable = None):
+        with self.lock:
+            self.invalidate_unlocked(version=version)
+
+    def invalidate_unlocked(self, version: Hashable = None):
+        if self.entries:
+            self.counters['invalidations'] += 1
+        self.entries.clear()
+        self.version = version
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {**self.counters, 'size': len(self.entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
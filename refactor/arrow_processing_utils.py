@@ -0,0 +1,146 @@
+from functools import reduce
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, List
+
+from refactor.processing_utils import (
+    AMENITIES_SEPARATOR, AMENITIES_TO_GET, NUMBER_PATTERN, PREPRO_OUTPUT_SCHEMA, RELEVANT_FEATURES,
+    apply_processing_output_schema as apply_pandas_output_schema
+)
+from refactor.step_cache import step_version
+
+#  Position of every row in the source, the index of the pandas backend
+INDEX_FEATURE = '__index_level_0__'
+
+
+def set_column(table: pa.Table, feature: str, values: pa.ChunkedArray) -> pa.Table:
+    if feature in table.column_names:
+        return table.set_column(table.column_names.index(feature), feature, values)
+    return table.append_column(feature, values)
+
+
+@step_version(1)
+def get_only_relevant_features(table: pa.Table, relevant_columns: List[str] = RELEVANT_FEATURES) -> pa.Table:
+    """
+    Keeps relevant_columns, and the position of every row in INDEX_FEATURE so
+    the output gets the same index as with the pandas backend.
+    """
+    output = table.select(relevant_columns)
+    return output.append_column(INDEX_FEATURE, pa.array(np.arange(table.num_rows)))
+
+
+@step_version(1)
+def drop_nans(table: pa.Table) -> pa.Table:
+    keep = reduce(pc.and_, [pc.invert(pc.is_null(column, nan_is_null=True)) for column in table.columns])
+    return table.filter(keep)
+
+
+def extract_first_number(strings: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Arrow version of parse_price_column: the first number of every string,
+    or null if the string has no numbers.
+    """
+    matches = pc.extract_regex(strings, pattern=f'(?P<number>{NUMBER_PATTERN})')
+    return pc.cast(pc.struct_field(matches, [0]), pa.float64())
+
+
+@step_version(1)
+def parse_property_price(price_feature: str, table: pa.Table) -> pa.Table:
+    return set_column(table, price_feature, extract_first_number(table[price_feature]))
+
+
+@step_version(1)
+def parse_num_of_bathrooms(
+        bathrooms_as_str_feature: str,
+        bathrooms_as_float_feature: str,
+        table: pa.Table
+) -> pa.Table:
+    """
+    Arrow version of parse_num_of_bathrooms_vectorized. A string with more
+    than one number raises a ValueError.
+    """
+    bathrooms = table[bathrooms_as_str_feature]
+    ambiguous = pc.greater(pc.count_substring_regex(bathrooms, pattern=NUMBER_PATTERN), 1)
+    if pc.any(ambiguous).as_py():
+        raise ValueError(f'The string "{bathrooms.filter(ambiguous)[0]}" may contain ambiguous information about the number of bathrooms')
+    return set_column(table, bathrooms_as_float_feature, extract_first_number(bathrooms))
+
+
+@step_version(1)
+def remove_records_below_threshold_price(
+    price_feature: str,
+    price_threshold: int,
+    table: pa.Table,
+) -> pa.Table:
+    return table.filter(pc.greater_equal(table[price_feature], price_threshold))
+
+
+@step_version(1)
+def create_categorical_price_labels(
+        price_feature: str,
+        bins: List[int],
+        labels: List[int],
+        table: pa.Table,
+) -> pa.Table:
+    """
+    Arrow version of create_categorical_price_labels. Like pd.cut, a price
+    gets labels[i] when bins[i] < price <= bins[i + 1], and null out of the
+    bins.
+    """
+    prices = table[price_feature]
+    bins_below = reduce(pc.add, [pc.cast(pc.greater(prices, edge), pa.int64()) for edge in bins[:-1]])
+    in_bins = pc.and_(pc.greater(prices, bins[0]), pc.less_equal(prices, bins[-1]))
+    codes = pc.if_else(in_bins, pc.subtract(bins_below, 1), pa.scalar(None, pa.int64()))
+    return set_column(table, 'category', pc.take(pa.array(labels), codes))
+
+
+def parse_amenities_column(amenities: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Arrow version of parse_amenities_column: the amenities of every field,
+    lowercased and joined with AMENITIES_SEPARATOR.
+    """
+    if amenities.null_count > 0:
+        raise ValueError('The amenities_feature must contain str or list values')
+    if pa.types.is_list(amenities.type):
+        return pc.utf8_lower(pc.binary_join(amenities, AMENITIES_SEPARATOR))
+    parsed = pc.utf8_trim(amenities, characters='][')
+    parsed = pc.replace_substring(parsed, pattern='"', replacement='')
+    parsed = pc.replace_substring(parsed, pattern=', ', replacement=AMENITIES_SEPARATOR)
+    return pc.utf8_lower(parsed)
+
+
+@step_version(1)
+def get_amenities_flags(
+        amenities_feature: str,
+        table: pa.Table,
+        amenities_to_get: Dict[str, str] = AMENITIES_TO_GET
+) -> pa.Table:
+    amenities = parse_amenities_column(table[amenities_feature])
+    for amenity, amenity_identifier in amenities_to_get.items():
+        table = set_column(table, amenity, pc.match_substring(amenities, amenity_identifier.lower()))
+    return table.drop([amenities_feature])
+
+
+@step_version(1)
+def map_categorical_features(features_to_map: Dict[str, Dict], table: pa.Table) -> pa.Table:
+    """
+    Maps every feature of features_to_map with its mapping; values that are
+    not in the mapping become null.
+    """
+    for feature, mapping in features_to_map.items():
+        positions = pc.index_in(table[feature], value_set=pa.array(list(mapping.keys())))
+        table = set_column(table, feature, pc.take(pa.array(list(mapping.values())), positions))
+    return table
+
+
+@step_version(1)
+def apply_processing_output_schema(table: pa.Table, schema: Dict = PREPRO_OUTPUT_SCHEMA) -> pd.DataFrame:
+    """
+    Last step of the Arrow backend: converts table to pandas, with the index
+    of INDEX_FEATURE, and applies schema like the pandas backend does.
+    """
+    df = table.to_pandas().set_index(INDEX_FEATURE)
+    df.index.name = None
+    return apply_pandas_output_schema(df, schema)
@@ -1,40 +1,173 @@
+import argparse
 from functools import partial
-import numpy as np
+from typing import Callable, List
 
-from pipeline_utils import sink_parquet, source_csv, seq_steps_pipeline, run_pipeline
+import arrow_processing_utils
+from pipeline_utils import (
+    sink_parquet, source_csv, source_csv_table, seq_steps_pipeline, run_pipeline, ColumnStep,
+    source_csv_chunks, sink_parquet_chunks, run_pipeline_streaming, run_pipeline_parallel,
+    sink_json, run_pipeline_incremental, SelectColumns
+)
 from processing_utils import (
-    get_only_relevant_features, drop_nans, parse_num_of_bathrooms, get_amenties_available,
+    drop_nans, parse_num_of_bathrooms_vectorized, get_amenities_flags,
     remove_records_below_threshold_price, create_categorical_price_labels,
-    apply_processing_output_schema, parse_property_price, map_categorical_features
+    apply_processing_output_schema, parse_property_price_vectorized, map_categorical_features,
+    RELEVANT_FEATURES, RELEVANT_FEATURES_DTYPES, OUTPUT_SCHEMAS, PRICE_THRESHOLD, PRICE_BINS, PRICE_LABELS
 )
+from profiling import PipelineProfiler
+from step_cache import StepCache, cached_seq_steps_pipeline, get_pipeline_identity, CACHE_MAX_BYTES
+from step_ownership import enable_copy_on_write
 
 PATH_TO_RAW = './data/raw/listings.csv'
 PATH_TO_SAVE = './data/processed/processed_diego.parquet'
+PATH_TO_TIMINGS = './data/processed/processing_timings.json'
+PATH_TO_MANIFEST = './data/processed/processed_diego_manifest.parquet'
+PATH_TO_PROFILE = './models/training_evaluation/profile_processing_diego.json'
 AMENITIES_FEATURE = 'amenities'
 BATHROOMS_STR = 'bathrooms_text'
 BATHROOMS_FLOAT = 'bathrooms'
 PRICE_FEATURE = 'price'
-PRICE_THRESHOLD = 10
-PRICE_BINS = [10, 90, 180, 400, np.inf]
-PRICE_LABELS = [0, 1, 2, 3]
+CHUNKSIZE = 50_000
 FEATURES_MAPPINGS = {
     'room_type': {"Shared room": 1, "Private room": 2, "Entire home/apt": 3, "Hotel room": 4},
     'neighbourhood_group_cleansed': {"Bronx": 1, "Queens": 2, "Staten Island": 3, "Brooklyn": 4, "Manhattan": 5}
 }
 CALLABLES_TO_APPLY = [
-    get_only_relevant_features,
-    partial(parse_num_of_bathrooms, BATHROOMS_STR, BATHROOMS_FLOAT),
-    partial(parse_property_price, PRICE_FEATURE),
+    SelectColumns(RELEVANT_FEATURES),
+    ColumnStep(
+        partial(parse_num_of_bathrooms_vectorized, BATHROOMS_STR, BATHROOMS_FLOAT),
+        input_features=[BATHROOMS_STR],
+        output_features=[BATHROOMS_FLOAT]
+    ),
+    partial(parse_property_price_vectorized, PRICE_FEATURE),
     partial(remove_records_below_threshold_price, PRICE_FEATURE, PRICE_THRESHOLD),
     partial(create_categorical_price_labels, PRICE_FEATURE, PRICE_BINS, PRICE_LABELS),
-    partial(get_amenties_available, AMENITIES_FEATURE),
-    partial(parse_num_of_bathrooms, BATHROOMS_STR, BATHROOMS_FLOAT),
+    partial(get_amenities_flags, AMENITIES_FEATURE),
     partial(map_categorical_features, FEATURES_MAPPINGS),
     drop_nans,
     apply_processing_output_schema
 ]
-run_pipeline(
-    source=partial(source_csv, PATH_TO_RAW),
-    sink=partial(sink_parquet, PATH_TO_SAVE),
-    pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY)
-)
+#  The same steps on Arrow tables, for the arrow backend
+ARROW_CALLABLES_TO_APPLY = [
+    arrow_processing_utils.get_only_relevant_features,
+    partial(arrow_processing_utils.parse_num_of_bathrooms, BATHROOMS_STR, BATHROOMS_FLOAT),
+    partial(arrow_processing_utils.parse_property_price, PRICE_FEATURE),
+    partial(arrow_processing_utils.remove_records_below_threshold_price, PRICE_FEATURE, PRICE_THRESHOLD),
+    partial(arrow_processing_utils.create_categorical_price_labels, PRICE_FEATURE, PRICE_BINS, PRICE_LABELS),
+    partial(arrow_processing_utils.get_amenities_flags, AMENITIES_FEATURE),
+    partial(arrow_processing_utils.map_categorical_features, FEATURES_MAPPINGS),
+    arrow_processing_utils.drop_nans,
+    arrow_processing_utils.apply_processing_output_schema
+]
+BACKENDS = ['pandas', 'arrow']
+
+
+def get_callables_to_apply(schema: str = 'default', backend: str = 'pandas') -> List[Callable]:
+    """
+    The steps of backend, with the output schema of OUTPUT_SCHEMAS named
+    schema.
+    """
+    if backend == 'arrow':
+        output_step = partial(arrow_processing_utils.apply_processing_output_schema, schema=OUTPUT_SCHEMAS[schema])
+        return [*ARROW_CALLABLES_TO_APPLY[:-1], output_step]
+    return [*CALLABLES_TO_APPLY[:-1], partial(apply_processing_output_schema, schema=OUTPUT_SCHEMAS[schema])]
+
+
+def main(
+    mode: str,
+    chunksize: int,
+    workers: int,
+    cache_dir: str = None,
+    cache_max_bytes: int = CACHE_MAX_BYTES,
+    profiler: PipelineProfiler = None,
+    schema: str = 'default',
+    backend: str = 'pandas'
+):
+    callables_to_apply = get_callables_to_apply(schema, backend)
+    if backend == 'arrow':
+        #  The Arrow steps only run on the whole table
+        return run_pipeline(
+            source=partial(source_csv_table, PATH_TO_RAW, columns=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES),
+            sink=partial(sink_parquet, PATH_TO_SAVE),
+            pipeline_steps=partial(seq_steps_pipeline, callables_to_apply)
+        )
+    if profiler is not None:
+        pipeline_steps = partial(profiler.run_steps, callables_to_apply)
+    elif cache_dir is None:
+        pipeline_steps = partial(seq_steps_pipeline, callables_to_apply)
+    else:
+        pipeline_steps = partial(
+            cached_seq_steps_pipeline,
+            StepCache(cache_dir=cache_dir, max_bytes=cache_max_bytes),
+            callables_to_apply
+        )
+    if mode == 'parallel':
+        return run_pipeline_parallel(
+            source=partial(source_csv, PATH_TO_RAW, dtype=RELEVANT_FEATURES_DTYPES),
+            sink=partial(sink_parquet, PATH_TO_SAVE),
+            pipeline_steps=pipeline_steps,
+            n_workers=workers,
+            sink_timings=partial(sink_json, PATH_TO_TIMINGS)
+        )
+    if mode == 'incremental':
+        return run_pipeline_incremental(
+            source=partial(source_csv, PATH_TO_RAW, dtype=RELEVANT_FEATURES_DTYPES),
+            sink=partial(sink_parquet, PATH_TO_SAVE),
+            pipeline_steps=pipeline_steps,
+            path_to_processed=PATH_TO_SAVE,
+            path_to_manifest=PATH_TO_MANIFEST,
+            features_to_hash=RELEVANT_FEATURES,
+            pipeline_identity=get_pipeline_identity(callables_to_apply, OUTPUT_SCHEMAS[schema])
+        )
+    if mode == 'streaming':
+        return run_pipeline_streaming(
+            source=partial(source_csv_chunks, PATH_TO_RAW, chunksize=chunksize, dtype=RELEVANT_FEATURES_DTYPES),
+            sink=partial(sink_parquet_chunks, PATH_TO_SAVE),
+            pipeline_steps=pipeline_steps
+        )
+    return run_pipeline(
+        source=partial(source_csv, PATH_TO_RAW, dtype=RELEVANT_FEATURES_DTYPES),
+        sink=partial(sink_parquet, PATH_TO_SAVE),
+        pipeline_steps=pipeline_steps
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Processes the raw airbnb listings.')
+    parser.add_argument('--mode', choices=['serial', 'streaming', 'parallel', 'incremental'], default='serial')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    parser.add_argument('--workers', type=int, default=None, help='Processes of the parallel mode (all the cores by default)')
+    parser.add_argument('--cache-dir', default=None, help='Caches the output of every step in this directory')
+    parser.add_argument('--cache-max-bytes', type=int, default=CACHE_MAX_BYTES)
+    parser.add_argument('--profile', action='store_true', help=f'Records every step in {PATH_TO_PROFILE}')
+    parser.add_argument('--profile-step', default=None, help='Step to profile in depth, by function name')
+    parser.add_argument('--profile-mode', choices=['cprofile', 'tracemalloc'], default='cprofile')
+    parser.add_argument('--profile-path', default=None, help='Where to dump the profile of --profile-step')
+    parser.add_argument('--deep-memory', action='store_true', help='Counts the strings in the frame memory')
+    parser.add_argument(
+        '--schema', choices=list(OUTPUT_SCHEMAS), default='default',
+        help='Output schema; compact uses small integers, booleans and categoricals'
+    )
+    parser.add_argument(
+        '--backend', choices=BACKENDS, default='pandas',
+        help='arrow runs the steps on Arrow tables with pyarrow.compute kernels'
+    )
+    args = parser.parse_args()
+    if args.backend == 'arrow' and (args.mode != 'serial' or args.profile or args.cache_dir is not None):
+        parser.error('--backend arrow only works with the serial mode, without --profile or --cache-dir')
+    if args.profile and (args.mode == 'parallel' or args.cache_dir is not None):
+        parser.error('--profile does not work with the parallel mode or with --cache-dir')
+    profiler = PipelineProfiler(
+        profile_step=args.profile_step,
+        profile_mode=args.profile_mode,
+        profile_path=args.profile_path,
+        deep_memory=args.deep_memory
+    ) if args.profile else None
+    enable_copy_on_write()
+    main(
+        mode=args.mode, chunksize=args.chunksize, workers=args.workers,
+        cache_dir=args.cache_dir, cache_max_bytes=args.cache_max_bytes, profiler=profiler,
+        schema=args.schema, backend=args.backend
+    )
+    if profiler is not None:
+        sink_json(PATH_TO_PROFILE, profiler.report())
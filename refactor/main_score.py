@@ -0,0 +1,42 @@
+import argparse
+from functools import partial
+import json
+import os
+
+from pipeline_utils import source_parquet_chunks, source_model, sink_parquet_chunks, score_model_pipeline
+from main_train_model import MODEL_SPECS, PATH_TO_PROC, PATH_TO_MODEL
+
+PATH_TO_SCORES = './data/scored/scored_diego.parquet'
+ID_FEATURE = 'id'
+CHUNKSIZE = 100_000
+
+
+def main(path_to_listings: str, path_to_model: str, path_to_scores: str, chunksize: int, n_jobs: int):
+    model = source_model(path_to_model)
+    model.n_jobs = n_jobs
+    os.makedirs(os.path.dirname(os.path.abspath(path_to_scores)), exist_ok=True)
+    return score_model_pipeline(
+        source=partial(
+            source_parquet_chunks, path_to_listings, chunksize=chunksize,
+            columns=[ID_FEATURE, *MODEL_SPECS['features']]
+        ),
+        sink=partial(sink_parquet_chunks, path_to_scores, index=False),
+        model=model,
+        features=MODEL_SPECS['features'],
+        id_feature=ID_FEATURE
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scores every listing of a processed Parquet file.')
+    parser.add_argument('--listings', default=PATH_TO_PROC)
+    parser.add_argument('--model', default=PATH_TO_MODEL)
+    parser.add_argument('--output', default=PATH_TO_SCORES)
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Threads of every predict_proba (all the cores by default)')
+    args = parser.parse_args()
+    report = main(
+        path_to_listings=args.listings, path_to_model=args.model, path_to_scores=args.output,
+        chunksize=args.chunksize, n_jobs=args.n_jobs
+    )
+    print(json.dumps(report, indent=2))
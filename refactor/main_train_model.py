@@ -1,11 +1,16 @@
+import argparse
 from functools import partial
 from sklearn.ensemble import RandomForestClassifier
 
-from pipeline_utils import source_parquet, sink_model, train_model_pipeline, sink_json
+from pipeline_utils import source_parquet, sink_model, train_model_pipeline, sink_json, search_model_pipeline
+from processing_utils import PRICE_THRESHOLD
+from profiling import PipelineProfiler
 
 PATH_TO_PROC = './data/processed/processed_diego.parquet'
 PATH_TO_MODEL = './models/model_diego.pkl'
 PATH_TO_METRICS = './models/training_evaluation/metrics_diego.json'
+PATH_TO_PROFILE = './models/training_evaluation/profile_training_diego.json'
+PATH_TO_LEADERBOARD = './models/training_evaluation/leaderboard_diego.json'
 MODEL_SPECS = {
     'estimator': RandomForestClassifier,
     'estimator_params': {
@@ -23,9 +28,47 @@ MODEL_SPECS = {
         'random_state': 1
     }
 }
-train_model_pipeline(
-    source=partial(source_parquet, PATH_TO_PROC),
-    sink_model=partial(sink_model, PATH_TO_MODEL),
-    sink_eval=partial(sink_json, PATH_TO_METRICS),
-    model_specs=MODEL_SPECS
-)
+#  Candidates of the search mode, on top of MODEL_SPECS['estimator_params']
+SEARCH_SPECS = {
+    'space': {
+        'n_estimators': [100, 300, 500],
+        'max_depth': [None, 10, 20],
+        'min_samples_leaf': [1, 5]
+    },
+    'n_folds': 5,
+    'scoring': 'accuracy',
+    'random_state': 0
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains the airbnb price category model.')
+    parser.add_argument('--profile-step', default=None, help='Phase to profile in depth: load, split, fit, predict or evaluate')
+    parser.add_argument('--profile-mode', choices=['cprofile', 'tracemalloc'], default='cprofile')
+    parser.add_argument('--profile-path', default=None, help='Where to dump the profile of --profile-step')
+    parser.add_argument('--search', choices=['grid', 'random'], default=None, help='Searches SEARCH_SPECS')
+    parser.add_argument('--candidates', type=int, default=10, help='Candidates of the random search')
+    parser.add_argument('--folds', type=int, default=SEARCH_SPECS['n_folds'])
+    parser.add_argument('--workers', type=int, default=None, help='Processes of the search (all the cores by default)')
+    args = parser.parse_args()
+    if args.search is not None:
+        search_model_pipeline(
+            source=partial(source_parquet, PATH_TO_PROC, filters=[('price', '>=', PRICE_THRESHOLD)]),
+            sink_model=partial(sink_model, PATH_TO_MODEL),
+            sink_eval=partial(sink_json, PATH_TO_METRICS),
+            sink_leaderboard=partial(sink_json, PATH_TO_LEADERBOARD),
+            model_specs=MODEL_SPECS,
+            search_specs={**SEARCH_SPECS, 'mode': args.search, 'n_candidates': args.candidates, 'n_folds': args.folds},
+            n_workers=args.workers
+        )
+    else:
+        train_model_pipeline(
+            source=partial(source_parquet, PATH_TO_PROC, filters=[('price', '>=', PRICE_THRESHOLD)]),
+            sink_model=partial(sink_model, PATH_TO_MODEL),
+            sink_eval=partial(sink_json, PATH_TO_METRICS),
+            model_specs=MODEL_SPECS,
+            profiler=PipelineProfiler(
+                profile_step=args.profile_step, profile_mode=args.profile_mode, profile_path=args.profile_path
+            ),
+            sink_profile=partial(sink_json, PATH_TO_PROFILE)
+        )
@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+import numpy as np
+import os
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+SEARCH_METRICS = {
+    'accuracy': accuracy_score,
+    'f1_macro': partial(f1_score, average='macro')
+}
+#  The arrays attached by every worker of the pool, by name
+SHARED_ARRAYS = dict()
+
+
+def get_candidates(
+    space: Dict[str, List],
+    mode: str = 'grid',
+    n_candidates: Optional[int] = None,
+    random_state: int = 0
+) -> List[Dict]:
+    """
+    Returns the estimator_params to try: every combination of the values of
+    space (mode 'grid'), or n_candidates of them drawn at random (mode
+    'random', where a value can also be a scipy distribution).
+    """
+    if mode == 'grid':
+        return list(ParameterGrid(space))
+    if mode == 'random':
+        return list(ParameterSampler(space, n_iter=n_candidates, random_state=random_state))
+    raise ValueError(f'Unknown search mode {mode}')
+
+
+def share_array(array: np.array) -> Tuple[shared_memory.SharedMemory, Tuple]:
+    """
+    Copies array into a new shared memory block. Returns the block (to be
+    closed and unlinked by the caller) and what a worker needs to attach it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_shared_arrays(specs: Dict[str, Tuple]):
+    """
+    Initializer of the workers: maps the shared blocks of specs as arrays,
+    so the data is not pickled for every task.
+    """
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        SHARED_ARRAYS[name] = (block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+
+
+def fit_and_score_fold(
+    estimator: Callable,
+    estimator_params: Dict,
+    train_index: np.array,
+    test_index: np.array,
+    metrics: Dict = SEARCH_METRICS
+) -> Dict:
+    x, y = SHARED_ARRAYS['x'][1], SHARED_ARRAYS['y'][1]
+    start = time.perf_counter()
+    model = estimator(**estimator_params).fit(x[train_index], y[train_index])
+    fit_seconds = time.perf_counter() - start
+    y_pred = model.predict(x[test_index])
+    scores = {metric: float(scorer(y[test_index], y_pred)) for metric, scorer in metrics.items()}
+    return {**scores, 'fit_seconds': fit_seconds}
+
+
+def get_search_workers(n_tasks: int, n_workers: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Returns the processes of the pool and the n_jobs of every fit, so the
+    threads of all the fits running at once don't exceed the cores.
+    """
+    n_cores = os.cpu_count()
+    n_workers = max(1, min(n_workers or n_cores, n_tasks))
+    return n_workers, max(1, n_cores // n_workers)
+
+
+def cross_validate_candidates(
+    estimator: Callable,
+    candidates: List[Dict],
+    x: np.array,
+    y: np.array,
+    estimator_params: Optional[Dict] = None,
+    n_folds: int = 5,
+    scoring: str = 'accuracy',
+    n_workers: Optional[int] = None,
+    random_state: int = 0
+) -> List[Dict]:
+    """
+    Runs a stratified k-fold cross-validation of every candidate (its
+    params on top of estimator_params). All the (candidate, fold) fits are
+    spread over a pool of processes that read x and y from shared memory.
+    Returns the leaderboard: one row per candidate with the mean and std of
+    every metric and of the fit time, best first by scoring.
+    """
+    folds = list(StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state).split(x, y))
+    n_workers, n_jobs = get_search_workers(len(candidates) * n_folds, n_workers)
+    blocks, specs = dict(), dict()
+    for name, array in [('x', x), ('y', y)]:
+        blocks[name], specs[name] = share_array(np.ascontiguousarray(array))
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=attach_shared_arrays, initargs=(specs,)
+        ) as executor:
+            futures = [
+                [
+                    executor.submit(
+                        fit_and_score_fold, estimator, {**(estimator_params or {}), **params, 'n_jobs': n_jobs},
+                        train_index, test_index
+                    )
+                    for train_index, test_index in folds
+                ]
+                for params in candidates
+            ]
+            results = [[future.result() for future in candidate_futures] for candidate_futures in futures]
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+    leaderboard = list()
+    for params, fold_results in zip(candidates, results):
+        scores = pd.DataFrame(fold_results)
+        row = {'params': {
+            name: value.item() if isinstance(value, np.generic) else value for name, value in params.items()
+        }}
+        for column in scores.columns:
+            row[f'mean_{column}'] = float(scores[column].mean())
+            row[f'std_{column}'] = float(scores[column].std(ddof=0))
+        leaderboard.append(row)
+    leaderboard.sort(key=lambda row: row[f'mean_{scoring}'], reverse=True)
+    for rank, row in enumerate(leaderboard, start=1):
+        row['rank'] = rank
+    return leaderboard
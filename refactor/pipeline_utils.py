@@ -1,27 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import inspect
 import json
+import numpy as np
+import os
 import pandas as pd
+from pandas.api.types import union_categoricals
 import pickle
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 from sklearn.base import BaseEstimator
 from sklearn.model_selection import train_test_split
-from typing import Callable, Dict, List
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from model_api.lookup_table import set_feature_grid
+from model_api.model_artifact import save_forest_arrays
 from refactor.model_utils import (
     get_model_features, get_model_target, fit_model, evaluate_model
 )
+from refactor.model_search import get_candidates, cross_validate_candidates
+from refactor.profiling import PipelineProfiler, run_phase
+from refactor.step_cache import get_step_identity
+from refactor.step_ownership import COPY, copy_frame, get_inplace_kernel, get_step_ownership, run_owned_step
 
 
-def source_csv(path: str) -> pd.DataFrame:
-    return pd.read_csv(path)
+#  Key of the identity of the pipeline in the metadata of the incremental manifest
+MANIFEST_IDENTITY_KEY = b'pipeline_identity'
+#  Key of the ColumnStep fingerprints in the attrs of a frame
+FINGERPRINTS_ATTR = 'column_step_fingerprints'
 
 
-def source_parquet(path: str) -> pd.DataFrame:
-    return pd.read_parquet(path)
+def get_arrow_type(dtype: str) -> pa.DataType:
+    return pa.string() if dtype == 'object' else pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def get_pandas_like_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Schema that makes pyarrow tables convert to pandas like pd.read_csv
+    does: dates stay strings and empty columns become float NaNs.
+    """
+    fields = list()
+    for field in schema:
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.float64())
+        elif pa.types.is_date(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def source_csv_table(
+    path: str,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, str]] = None
+) -> pa.Table:
+    """
+    Reads a CSV file as an Arrow table with the multithreaded pyarrow
+    reader. Only the given columns (all by default) are converted, in that
+    order and with the given dtypes. Quoted values can have newlines, like
+    the descriptions of the listings.
+    """
+    return pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(use_threads=True),
+        parse_options=pv.ParseOptions(newlines_in_values=True),
+        convert_options=pv.ConvertOptions(
+            include_columns=columns or [],
+            column_types={column: get_arrow_type(column_dtype) for column, column_dtype in (dtype or {}).items()},
+            strings_can_be_null=True,
+            timestamp_parsers=[]
+        )
+    )
+
+
+def source_csv(
+    path: str,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    source_csv_table converted to pandas, with the same frame as
+    pd.read_csv.
+    """
+    table = source_csv_table(path, columns=columns, dtype=dtype)
+    return table.cast(get_pandas_like_schema(table.schema)).to_pandas()
+
+
+def source_csv_chunks(
+    path: str,
+    chunksize: int = 50_000,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming version of source_csv: yields the file in chunks of
+    chunksize rows, reading only the given columns with the given dtypes.
+    """
+    yield from pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=dtype)
+
+
+def source_parquet(
+    path: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Tuple]] = None
+) -> pd.DataFrame:
+    """
+    Reads only the given columns of a Parquet file. The filters (like
+    [('price', '>=', 10)], see pyarrow.parquet.read_table) are pushed into
+    the read, so row groups that can't match are skipped.
+    """
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+
+def source_parquet_chunks(
+    path: str,
+    chunksize: int = 100_000,
+    columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming version of source_parquet: yields the file in chunks of at
+    most chunksize rows, reading its row groups one after the other and only
+    the given columns.
+    """
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def source_model(path: str) -> BaseEstimator:
+    with open(path, 'rb') as file:
+        return pickle.load(file)
 
 
 def sink_parquet(path: str, df: pd.DataFrame):
     df.to_parquet(path)
 
 
+def sink_parquet_chunks(path: str, chunks: Iterable[pd.DataFrame], index: bool = True):
+    """
+    Streaming version of sink_parquet: every non-empty chunk is appended to
+    the file as a new row group, so only one chunk is in memory at a time.
+    The schema of the file is the schema of the first chunk written. The
+    index of the chunks is kept, like sink_parquet does, unless index is
+    False. It is always stored as a column, so that a chunk with a
+    RangeIndex doesn't change the schema.
+    """
+    writer, chunk = None, None
+    try:
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=index)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None and chunk is not None:
+        chunk.to_parquet(path, index=index)
+
+
 def sink_json(path: str, payload: Dict):
     with open(path, 'w') as file:
         json.dump(payload, file)
@@ -32,8 +172,160 @@ def sink_return(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def sink_model(path_to_save: str, model: BaseEstimator):
-    with open(path_to_save, 'wb') as file:
+    """
+    Writes the pickle next to path_to_save and moves it into place, so an
+    API watching the path never loads a half-written model.
+    """
+    temporary_path = f'{path_to_save}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
         pickle.dump(model, file)
+    os.replace(temporary_path, path_to_save)
+
+
+def sink_model_arrays(path_to_save: str, model: BaseEstimator):
+    """
+    Alternative to sink_model that saves a forest as memory-mappable NumPy
+    buffers (see model_api.model_artifact), faster to load than a pickle.
+    """
+    save_forest_arrays(model, path_to_save)
+
+
+class ColumnFingerprints(dict):
+    """
+    Fingerprints of the ColumnSteps applied to a frame, by step key. They
+    are kept in the attrs of the frame, so they travel with it through the
+    pandas operations and to the next pipeline that gets it. They are never
+    changed, only replaced, so copies share them, and they are compared by
+    identity: pandas compares the attrs of the frames it concatenates.
+    """
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+    def __deepcopy__(self, memo: Dict) -> 'ColumnFingerprints':
+        return self
+
+
+def get_column_fingerprints(df) -> Dict[str, pd.Series]:
+    return getattr(df, 'attrs', dict()).get(FINGERPRINTS_ATTR, ColumnFingerprints())
+
+
+class ColumnStep:
+    """
+    Wraps a pipeline step that computes output_features from
+    input_features. With these declarations, seq_steps_pipeline can skip the
+    step when it was already applied and neither its inputs nor its outputs
+    have changed since then (rows removed in between don't count as a change).
+    The fingerprint of every run is stored with the output frame (see
+    ColumnFingerprints), so a frame that already went through the step is
+    not recomputed by a later pipeline either.
+    """
+
+    def __init__(self, step: Callable, input_features: List[str], output_features: List[str]):
+        self.step = step
+        self.input_features = input_features
+        self.output_features = output_features
+        self.key = get_step_identity(self)
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.step(df)
+
+    @property
+    def ownership(self) -> str:
+        return get_step_ownership(self.step)
+
+    @property
+    def inplace_kernel(self) -> Optional[Callable]:
+        return get_inplace_kernel(self.step)
+
+    def fingerprint(self, df: pd.DataFrame) -> pd.Series:
+        return pd.util.hash_pandas_object(df[self.input_features + self.output_features], index=True)
+
+    def is_up_to_date(self, df: pd.DataFrame, fingerprint: Optional[pd.Series]) -> bool:
+        if fingerprint is None or not set(self.input_features + self.output_features).issubset(df.columns):
+            return False
+        if not fingerprint.index.is_unique or not df.index.isin(fingerprint.index).all():
+            return False
+        current = self.fingerprint(df)
+        return bool((fingerprint.loc[current.index].to_numpy() == current.to_numpy()).all())
+
+
+class SelectColumns:
+    """
+    Step that keeps only features. As the first step of a pipeline, it tells
+    the runners which columns to read from the source (see
+    get_pipeline_columns). Selecting a list of columns copies them.
+    """
+    ownership = COPY
+
+    def __init__(self, features: List[str]):
+        self.features = list(features)
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df.loc[:, self.features]
+
+    def __repr__(self) -> str:
+        return f'SelectColumns({self.features!r})'
+
+
+def get_pipeline_columns(pipeline_steps: Callable) -> Optional[List[str]]:
+    """
+    Returns the columns read by pipeline_steps, or None when they are
+    unknown. They are taken from its columns attribute, if it has one, or
+    else from the SelectColumns that starts the callables_to_apply of a
+    partial over a step runner (seq_steps_pipeline, cached_seq_steps_pipeline
+    or PipelineProfiler.run_steps).
+    """
+    columns = getattr(pipeline_steps, 'columns', None)
+    if columns is not None:
+        return list(columns)
+    if not isinstance(pipeline_steps, partial):
+        return None
+    try:
+        arguments = inspect.signature(pipeline_steps.func).bind_partial(
+            *pipeline_steps.args, **pipeline_steps.keywords
+        ).arguments
+    except (TypeError, ValueError):
+        return None
+    steps = arguments.get('callables_to_apply')
+    if steps and isinstance(steps[0], SelectColumns):
+        return steps[0].features
+    return None
+
+
+def accepts_columns(source: Callable) -> bool:
+    try:
+        parameters = inspect.signature(source).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(
+        parameter.name == 'columns' or parameter.kind == inspect.Parameter.VAR_KEYWORD
+        for parameter in parameters
+    )
+
+
+def read_columns(source: Callable, columns: Optional[List[str]]):
+    """
+    Calls source, asking only for columns when it is not None. A source
+    that does not take a columns argument is read whole and the columns
+    are selected afterwards (from every chunk of a chunked source).
+    """
+    if columns is None:
+        return source()
+    if accepts_columns(source):
+        return source(columns=columns)
+    output = source()
+    if isinstance(output, pd.DataFrame):
+        return output.loc[:, columns]
+    return (chunk.loc[:, columns] for chunk in output)
+
+
+def read_source(source: Callable, pipeline_steps: Callable):
+    """
+    Calls source, asking only for the columns that pipeline_steps reads when
+    they are known.
+    """
+    return read_columns(source, get_pipeline_columns(pipeline_steps))
 
 
 def seq_steps_pipeline(
@@ -44,41 +336,301 @@ def seq_steps_pipeline(
     To create a pipeline callable that runs sequential steps. As this
     function applies the callables in callables_to_apply following the
     list order, the user must be careful when you define that order.
+    A ColumnStep is skipped if its output is already up to date, also when
+    it was computed by an earlier pipeline (see ColumnStep). The frame
+    is copied at most once, before the first step that writes into its
+    input, and only if no step before it already returned a copy (see
+    refactor.step_ownership), so df is never changed.
     """
-    outcome = df.copy()
+    outcome, owned = df, False
     for callable in callables_to_apply:
-        outcome = callable(outcome)
-    return outcome
+        if not isinstance(callable, ColumnStep):
+            outcome, owned = run_owned_step(callable, outcome, owned)
+            continue
+        fingerprints = get_column_fingerprints(outcome)
+        if callable.is_up_to_date(outcome, fingerprints.get(callable.key)):
+            continue
+        outcome, owned = run_owned_step(callable, outcome, owned)
+        if owned:
+            outcome.attrs[FINGERPRINTS_ATTR] = ColumnFingerprints(
+                {**get_column_fingerprints(outcome), callable.key: callable.fingerprint(outcome)}
+            )
+    return outcome if owned else copy_frame(outcome)
+
+
+def get_model_columns(model_specs: Dict) -> List[str]:
+    return [*model_specs['features'], model_specs['target']]
 
 
 def train_model_pipeline(
     source: Callable,
     sink_model: Callable,
     sink_eval: Callable,
-    model_specs: Dict
+    model_specs: Dict,
+    profiler: Optional[PipelineProfiler] = None,
+    sink_profile: Optional[Callable] = None
 ):
-    processed = source()
+    """
+    Trains and evaluates the model of model_specs. Only its features and
+    target are read from the source. The observed grid of the features is
+    saved with the model, for the lookup engine of the API. With a
+    profiler, the load, split, fit, predict and evaluate phases are
+    recorded, and its report is sent to sink_profile.
+    """
+    processed = run_phase(profiler, 'load', read_columns, source, get_model_columns(model_specs))
     features = get_model_features(df=processed, features=model_specs['features'])
     target = get_model_target(df=processed, target=model_specs['target'])
-    X_train, X_test, y_train, y_test = train_test_split(
+    X_train, X_test, y_train, y_test = run_phase(
+        profiler, 'split', train_test_split,
         features, target,
         **model_specs['train_test_split_params']
     )
-    model = fit_model(
+    model = run_phase(
+        profiler, 'fit', fit_model,
         estimator=model_specs['estimator'],
         estimator_args=model_specs['estimator_params'],
         x=X_train,
         y=y_train
     )
-    metrics_eval = evaluate_model(
-        y_true=y_test,
-        y_pred=model.predict(X_test),
-        y_pred_proba=model.predict_proba(X_test)
-    )
+    set_feature_grid(model, features)
+    y_pred = run_phase(profiler, 'predict', model.predict, X_test)
+    metrics_eval = run_phase(profiler, 'evaluate', evaluate_model, y_true=y_test, y_pred=y_pred)
+    if profiler is not None and sink_profile is not None:
+        sink_profile(profiler.report())
     return sink_model(model), sink_eval(metrics_eval)
 
 
+def search_model_pipeline(
+    source: Callable,
+    sink_model: Callable,
+    sink_eval: Callable,
+    sink_leaderboard: Callable,
+    model_specs: Dict,
+    search_specs: Dict,
+    n_workers: Optional[int] = None
+):
+    """
+    Search mode of train_model_pipeline. The candidates of search_specs
+    (see get_candidates) are cross-validated on the train split, on top of
+    the estimator_params of model_specs, and the leaderboard goes to
+    sink_leaderboard. The best candidate is then fitted on the whole train
+    split and evaluated on the test split, like in train_model_pipeline.
+    """
+    processed = read_columns(source, get_model_columns(model_specs))
+    features = get_model_features(df=processed, features=model_specs['features'])
+    target = get_model_target(df=processed, target=model_specs['target'])
+    X_train, X_test, y_train, y_test = train_test_split(
+        features, target,
+        **model_specs['train_test_split_params']
+    )
+    leaderboard = cross_validate_candidates(
+        estimator=model_specs['estimator'],
+        candidates=get_candidates(
+            search_specs['space'],
+            mode=search_specs.get('mode', 'grid'),
+            n_candidates=search_specs.get('n_candidates'),
+            random_state=search_specs.get('random_state', 0)
+        ),
+        x=X_train.to_numpy(dtype=float),
+        y=y_train.to_numpy(),
+        estimator_params=model_specs['estimator_params'],
+        n_folds=search_specs.get('n_folds', 5),
+        scoring=search_specs.get('scoring', 'accuracy'),
+        n_workers=n_workers,
+        random_state=search_specs.get('random_state', 0)
+    )
+    model = fit_model(
+        estimator=model_specs['estimator'],
+        estimator_args={**model_specs['estimator_params'], **leaderboard[0]['params']},
+        x=X_train,
+        y=y_train
+    )
+    set_feature_grid(model, features)
+    metrics_eval = evaluate_model(y_true=y_test, y_pred=model.predict(X_test))
+    return sink_model(model), sink_eval(metrics_eval), sink_leaderboard(leaderboard)
+
+
+def score_chunk(model: BaseEstimator, features: List[str], id_feature: str, chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the id, the predicted category and the probability of every
+    class (proba_<class> columns) of the listings of chunk.
+    """
+    proba = model.predict_proba(chunk[features])
+    output = pd.DataFrame(proba, columns=[f'proba_{label}' for label in model.classes_])
+    output.insert(0, id_feature, chunk[id_feature].to_numpy())
+    output.insert(1, 'category', model.classes_.take(np.argmax(proba, axis=1)))
+    return output
+
+
+def score_model_pipeline(
+    source: Callable,
+    sink: Callable,
+    model: BaseEstimator,
+    features: List[str],
+    id_feature: str = 'id'
+) -> Dict:
+    """
+    Bulk scoring of listings. The source must yield chunks (like
+    source_parquet_chunks) and the sink must consume an iterable of chunks
+    (like sink_parquet_chunks), so only one chunk is in memory at a time.
+    Every chunk is scored with a single predict_proba call, which uses the
+    n_jobs threads of the model. Returns the rows scored, the seconds and the
+    rows per second.
+    """
+    report = {'rows': 0}
+
+    def score_chunks() -> Iterator[pd.DataFrame]:
+        for chunk in source():
+            report['rows'] += len(chunk)
+            yield score_chunk(model, features, id_feature, chunk)
+
+    start = time.perf_counter()
+    sink(score_chunks())
+    report['seconds'] = time.perf_counter() - start
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] > 0 else None
+    return report
+
+
 def run_pipeline(sink: Callable, source: Callable, pipeline_steps: Callable):
-    input = source()
+    input = read_source(source, pipeline_steps)
     pipeline_outcome = pipeline_steps(input)
     return sink(pipeline_outcome)
+
+
+def run_pipeline_streaming(sink: Callable, source: Callable, pipeline_steps: Callable):
+    """
+    Streaming version of run_pipeline. The source must yield chunks (like
+    source_csv_chunks) and the sink must consume an iterable of chunks (like
+    sink_parquet_chunks). Every chunk goes through pipeline_steps on its own,
+    so the memory needed is bounded by the chunk size and not by the size
+    of the source. The steps must work row by row for the outcome to match
+    the one of run_pipeline.
+    """
+    return sink(pipeline_steps(chunk) for chunk in read_source(source, pipeline_steps))
+
+
+def split_in_shards(df: pd.DataFrame, n_shards: int) -> List[pd.DataFrame]:
+    """
+    Splits df in n_shards consecutive blocks of rows (of almost the same
+    size), keeping the original order and index.
+    """
+    bounds = np.linspace(0, len(df), num=max(n_shards, 1) + 1, dtype=int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def concat_frames(frames: List[Optional[pd.DataFrame]]) -> pd.DataFrame:
+    """
+    pd.concat of the frames that are not None. The categorical columns get
+    the union of the categories of every frame, so they stay categorical
+    (pd.concat turns them into objects when the categories differ).
+    """
+    frames = [frame for frame in frames if frame is not None]
+    for column, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = union_categoricals([frame[column] for frame in frames]).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames)
+
+
+def run_timed(pipeline_steps: Callable, df: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+    start = time.perf_counter()
+    outcome = pipeline_steps(df)
+    return outcome, time.perf_counter() - start
+
+
+def run_pipeline_parallel(
+    sink: Callable,
+    source: Callable,
+    pipeline_steps: Callable,
+    n_workers: Optional[int] = None,
+    n_shards: Optional[int] = None,
+    sink_timings: Optional[Callable] = None
+):
+    """
+    Parallel version of run_pipeline. The source is split in n_shards
+    shards (n_workers by default) that go through pipeline_steps in a pool
+    of n_workers processes (all the cores by default). The outcomes are
+    concatenated in the shard order, so the rows keep the order of the
+    serial run. The steps must work row by row for the outcome to match the
+    one of run_pipeline, and pipeline_steps must be picklable.
+    If sink_timings is given, it receives the rows and seconds of each shard.
+    """
+    n_workers = n_workers or os.cpu_count()
+    shards = split_in_shards(read_source(source, pipeline_steps), n_shards=n_shards or n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(run_timed, pipeline_steps, shard) for shard in shards]
+        results = [future.result() for future in futures]
+    if sink_timings is not None:
+        sink_timings([
+            {'shard': shard_number, 'rows_in': len(shard), 'rows_out': len(outcome), 'seconds': seconds}
+            for shard_number, (shard, (outcome, seconds)) in enumerate(zip(shards, results))
+        ])
+    return sink(concat_frames([outcome for outcome, _ in results]))
+
+
+def hash_listings(df: pd.DataFrame, id_feature: str, features_to_hash: List[str]) -> pd.DataFrame:
+    """
+    Returns one row per listing with its id and a hash of the values of
+    features_to_hash, so two snapshots of a listing can be compared.
+    """
+    return pd.DataFrame({
+        id_feature: df[id_feature].to_numpy(),
+        'hash': pd.util.hash_pandas_object(df[features_to_hash], index=False).to_numpy()
+    })
+
+
+def write_manifest(path: str, hashes: pd.DataFrame, pipeline_identity: str):
+    table = pa.Table.from_pandas(hashes, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), MANIFEST_IDENTITY_KEY: pipeline_identity.encode()}
+    pq.write_table(table.replace_schema_metadata(metadata), path)
+
+
+def read_manifest_identity(path: str) -> Optional[str]:
+    identity = (pq.read_schema(path).metadata or {}).get(MANIFEST_IDENTITY_KEY)
+    return identity.decode() if identity is not None else None
+
+
+def run_pipeline_incremental(
+    sink: Callable,
+    source: Callable,
+    pipeline_steps: Callable,
+    path_to_processed: str,
+    path_to_manifest: str,
+    id_feature: str = 'id',
+    features_to_hash: Optional[List[str]] = None,
+    pipeline_identity: Optional[str] = None
+):
+    """
+    Incremental version of run_pipeline. A manifest next to the processed
+    output keeps the hash of every listing of the last run (see
+    hash_listings) and the identity of the pipeline that processed them
+    (pipeline_identity, see get_pipeline_identity, or the identity of
+    pipeline_steps by default). Only the new listings and the ones whose
+    hash changed go through pipeline_steps, and their outcome replaces their
+    old rows in the processed output. Listings that are no longer in the
+    source are dropped. Without a manifest or a processed output, or when
+    the pipeline changed, everything is processed. The steps must work row
+    by row for the outcome to match the one of run_pipeline. The manifest is
+    only updated after the sink succeeds.
+    """
+    raw = read_source(source, pipeline_steps)
+    hashes = hash_listings(raw, id_feature=id_feature, features_to_hash=features_to_hash or list(raw.columns))
+    pipeline_identity = pipeline_identity or get_step_identity(pipeline_steps)
+    if (
+        os.path.exists(path_to_manifest) and os.path.exists(path_to_processed)
+        and read_manifest_identity(path_to_manifest) == pipeline_identity
+    ):
+        manifest = pd.read_parquet(path_to_manifest)
+        previous = pd.read_parquet(path_to_processed)
+    else:
+        manifest = hashes.iloc[0:0]
+        previous = None
+    known = hashes.merge(manifest, on=[id_feature, 'hash'], how='left', indicator=True)
+    changed = (known['_merge'] != 'both').to_numpy()
+    to_replace = set(raw[id_feature][changed]) | (set(manifest[id_feature]) - set(raw[id_feature]))
+    outcome = pipeline_steps(raw[changed]) if changed.any() or previous is None else None
+    if previous is not None:
+        outcome = concat_frames([previous[~previous[id_feature].isin(to_replace)], outcome])
+    sink_outcome = sink(outcome)
+    write_manifest(path_to_manifest, hashes, pipeline_identity)
+    return sink_outcome
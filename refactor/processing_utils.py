@@ -3,6 +3,9 @@ import pandas as pd
 import re
 from typing import Dict, List
 
+from refactor.step_cache import step_version
+from refactor.step_ownership import step_ownership, inplace_kernel, COPY
+
 
 AC_STRING = 'air conditioning'
 BREAKFAST_STRING = 'breakfast'
@@ -12,6 +15,18 @@ INTERNET_STRING = 'internet'
 KITCHEN_STRING = 'kitchen'
 TV_STRING = 'tv'
 WIFI_STRING = 'wifi'
+AMENITIES_TO_GET = {
+    'air_conditioning': AC_STRING,
+    'breakfast': BREAKFAST_STRING,
+    'elevator': ELEVATOR_STRING,
+    'heating': HEATING_STRING,
+    'internet': INTERNET_STRING,
+    'kitchen': KITCHEN_STRING,
+    'tv': TV_STRING,
+    'wifi': WIFI_STRING
+}
+AMENITIES_SEPARATOR = '\x1f'
+NUMBER_PATTERN = r'\d+(?:\.\d+)?'
 PREPRO_OUTPUT_SCHEMA = {
     'id': int,
     'neighbourhood_group_cleansed': str,
@@ -34,34 +49,92 @@ PREPRO_OUTPUT_SCHEMA = {
     'elevator': int,
     'breakfast': int
 }
+#  Output schema that takes less memory and disk. The neighbourhood and room
+#  type already hold the codes of their mappings, so they are stored as small
+#  integers; the flags are booleans. The coordinates keep their precision.
+PREPRO_OUTPUT_SCHEMA_COMPACT = {
+    'id': 'int64',
+    'neighbourhood_group_cleansed': 'int8',
+    'property_type': 'category',
+    'room_type': 'int8',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'accommodates': 'int16',
+    'bathrooms': 'float32',
+    'bedrooms': 'int16',
+    'beds': 'int16',
+    'price': 'int32',
+    'category': 'int8',
+    'tv': 'bool',
+    'internet': 'bool',
+    'air_conditioning': 'bool',
+    'kitchen': 'bool',
+    'heating': 'bool',
+    'wifi': 'bool',
+    'elevator': 'bool',
+    'breakfast': 'bool'
+}
+OUTPUT_SCHEMAS = {
+    'default': PREPRO_OUTPUT_SCHEMA,
+    'compact': PREPRO_OUTPUT_SCHEMA_COMPACT
+}
 RELEVANT_FEATURES = [
     'id', 'neighbourhood_group_cleansed', 'property_type', 'room_type',
     'latitude', 'longitude', 'accommodates', 'bathrooms_text', 'bedrooms',
     'beds', 'amenities', 'price'
 ]
+RELEVANT_FEATURES_DTYPES = {
+    'id': 'int64',
+    'neighbourhood_group_cleansed': 'object',
+    'property_type': 'object',
+    'room_type': 'object',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'accommodates': 'int64',
+    'bathrooms_text': 'object',
+    'bedrooms': 'float64',
+    'beds': 'float64',
+    'amenities': 'object',
+    'price': 'object'
+}
+PRICE_THRESHOLD = 10
+PRICE_BINS = [10, 90, 180, 400, np.inf]
+PRICE_LABELS = [0, 1, 2, 3]
 
 
+@step_ownership(COPY)
+@step_version(1)
 def get_only_relevant_features(
         df: pd.DataFrame,
         relevant_columns: List[str] = RELEVANT_FEATURES
 ) -> pd.DataFrame:
-    output = df[relevant_columns]
+    #  Unlike df[relevant_columns], loc doesn't mark the copy as a possible
+    #  view of df, so the next steps can write into it without warnings
+    output = df.loc[:, relevant_columns]
     return output
 
 
+@step_ownership(COPY)
+@step_version(1)
 def drop_nans(df: pd.DataFrame) -> pd.DataFrame:
     output = df.dropna(axis=0)
     return output
 
 
-def parse_property_price(price_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+def _parse_property_price(price_feature: str, df: pd.DataFrame) -> pd.DataFrame:
     output = df
     output[price_feature] = output.apply(get_price_from_string, args=[price_feature], axis=1)
     return output
 
 
+@inplace_kernel(_parse_property_price)
+@step_version(1)
+def parse_property_price(price_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+    return _parse_property_price(price_feature, df.copy())
+
+
 def get_price_from_string(row: pd.DataFrame, price_feature: str) -> float:
-    property_price = re.findall(r'\d+(?:\.\d+)?', row[price_feature])
+    property_price = re.findall(NUMBER_PATTERN, row[price_feature])
     if len(property_price) == 0:
         return np.NaN
     else:
@@ -72,7 +145,7 @@ def get_num_of_bathrooms_from_string(row: pd.DataFrame, bathrooms_as_str_feature
     if pd.isna(row[bathrooms_as_str_feature]):
         return np.NaN
     else:
-        bathroom_number = re.findall(r'\d+(?:\.\d+)?', row[bathrooms_as_str_feature])
+        bathroom_number = re.findall(NUMBER_PATTERN, row[bathrooms_as_str_feature])
     if len(bathroom_number) == 0:
         return np.NaN
     elif len(bathroom_number) == 1:
@@ -81,12 +154,12 @@ def get_num_of_bathrooms_from_string(row: pd.DataFrame, bathrooms_as_str_feature
         raise ValueError(f'The string "{row[bathrooms_as_str_feature]}" may contain ambiguous information about the number of bathrooms')
 
 
-def parse_num_of_bathrooms(
+def _parse_num_of_bathrooms(
         bathrooms_as_str_feature: str,
         bathrooms_as_float_feature: str,
         df: pd.DataFrame
 ) -> pd.DataFrame:
-    output = df.copy()
+    output = df
     output[bathrooms_as_float_feature] = output.apply(
         get_num_of_bathrooms_from_string,
         args=[bathrooms_as_str_feature],
@@ -95,15 +168,82 @@ def parse_num_of_bathrooms(
     return output
 
 
+@inplace_kernel(_parse_num_of_bathrooms)
+@step_version(1)
+def parse_num_of_bathrooms(
+        bathrooms_as_str_feature: str,
+        bathrooms_as_float_feature: str,
+        df: pd.DataFrame
+) -> pd.DataFrame:
+    return _parse_num_of_bathrooms(bathrooms_as_str_feature, bathrooms_as_float_feature, df.copy())
+
+
+def parse_price_column(prices: pd.Series) -> pd.Series:
+    """
+    Column-wise version of get_price_from_string: takes the first number
+    of every string, or NaN if the string has no numbers.
+    """
+    return prices.str.extract(f'({NUMBER_PATTERN})', expand=False).astype(float)
+
+
+def parse_bathrooms_column(bathrooms_as_str: pd.Series) -> pd.Series:
+    """
+    Column-wise version of get_num_of_bathrooms_from_string. Null values
+    and strings without numbers become NaN, and a string with more than one
+    number raises a ValueError.
+    """
+    bathrooms = bathrooms_as_str.astype(object)
+    numbers_found = bathrooms.str.count(NUMBER_PATTERN).fillna(0)
+    ambiguous = numbers_found > 1
+    if ambiguous.any():
+        raise ValueError(f'The string "{bathrooms[ambiguous].iloc[0]}" may contain ambiguous information about the number of bathrooms')
+    return pd.to_numeric(bathrooms.str.extract(f'({NUMBER_PATTERN})', expand=False), errors='coerce')
+
+
+def _parse_property_price_vectorized(price_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+    output = df
+    output[price_feature] = parse_price_column(output[price_feature])
+    return output
+
+
+@inplace_kernel(_parse_property_price_vectorized)
+@step_version(1)
+def parse_property_price_vectorized(price_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+    return _parse_property_price_vectorized(price_feature, df.copy())
+
+
+def _parse_num_of_bathrooms_vectorized(
+        bathrooms_as_str_feature: str,
+        bathrooms_as_float_feature: str,
+        df: pd.DataFrame
+) -> pd.DataFrame:
+    output = df
+    output[bathrooms_as_float_feature] = parse_bathrooms_column(output[bathrooms_as_str_feature])
+    return output
+
+
+@inplace_kernel(_parse_num_of_bathrooms_vectorized)
+@step_version(1)
+def parse_num_of_bathrooms_vectorized(
+        bathrooms_as_str_feature: str,
+        bathrooms_as_float_feature: str,
+        df: pd.DataFrame
+) -> pd.DataFrame:
+    return _parse_num_of_bathrooms_vectorized(bathrooms_as_str_feature, bathrooms_as_float_feature, df.copy())
+
+
+@step_ownership(COPY)
+@step_version(1)
 def remove_records_below_threshold_price(
     price_feature: str,
     price_threshold: int,
     df: pd.DataFrame,
 ) -> pd.DataFrame:
-    return df[df[price_feature] >= price_threshold]
+    #  Like in get_only_relevant_features, take doesn't mark the copy
+    return df.take(np.flatnonzero(df[price_feature] >= price_threshold))
 
 
-def create_categorical_price_labels(
+def _create_categorical_price_labels(
         price_feature: str,
         bins: List[int],
         labels: List[int],
@@ -118,6 +258,17 @@ def create_categorical_price_labels(
     return df_with_price_category
 
 
+@inplace_kernel(_create_categorical_price_labels)
+@step_version(1)
+def create_categorical_price_labels(
+        price_feature: str,
+        bins: List[int],
+        labels: List[int],
+        df: pd.DataFrame,
+) -> pd.DataFrame:
+    return _create_categorical_price_labels(price_feature, bins, labels, df.copy())
+
+
 def has_amenity(row: pd.DataFrame, amenities_feature: str, amenity_identifier: str) -> bool:
     amenities_as_list = parse_amenity_field(row=row, amenities_feature=amenities_feature)
     amenities_lowercase = [amenity.lower() for amenity in amenities_as_list]
@@ -165,7 +316,7 @@ def has_wifi(row: pd.DataFrame, amenities_feature: str) -> bool:
     return has_amenity(row=row, amenities_feature=amenities_feature, amenity_identifier=WIFI_STRING)
 
 
-def get_amenties_available(amenities_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+def _get_amenties_available(amenities_feature: str, df: pd.DataFrame) -> pd.DataFrame:
     df_with_amenities = df
     amenities_to_get = {
         'air_conditioning': has_air_conditioning,
@@ -182,16 +333,85 @@ def get_amenties_available(amenities_feature: str, df: pd.DataFrame) -> pd.DataF
     return df_with_amenities.drop(columns=[amenities_feature])
 
 
+@inplace_kernel(_get_amenties_available)
+@step_version(1)
+def get_amenties_available(amenities_feature: str, df: pd.DataFrame) -> pd.DataFrame:
+    return _get_amenties_available(amenities_feature, df.copy())
+
+
+def parse_amenities_value(amenities) -> str:
+    if isinstance(amenities, str):
+        return amenities.strip('][').replace('"', '').replace(', ', AMENITIES_SEPARATOR).lower()
+    if isinstance(amenities, list):
+        return AMENITIES_SEPARATOR.join(amenities).lower()
+    raise ValueError('The amenities_feature must contain str or list values')
+
+
+def parse_amenities_column(amenities: pd.Series) -> pd.Series:
+    """
+    Column-wise version of parse_amenity_field. Each amenities field is
+    parsed and lowercased once, and its amenities are joined with
+    AMENITIES_SEPARATOR (a character that can't appear in an amenity), so
+    looking for a substring in the joined string is the same as looking for
+    it in every amenity of the list. Every field is parsed in a single pass,
+    so only one new string per listing is allocated.
+    """
+    return pd.Series([parse_amenities_value(value) for value in amenities], index=amenities.index, dtype=object)
+
+
+def _get_amenities_flags(
+        amenities_feature: str,
+        df: pd.DataFrame,
+        amenities_to_get: Dict[str, str] = AMENITIES_TO_GET
+) -> pd.DataFrame:
+    #  The frame belongs to the runner, so the amenities column is deleted
+    #  instead of dropped into a new frame
+    df_with_amenities = df
+    amenities = parse_amenities_column(df_with_amenities[amenities_feature])
+    for amenity, amenity_identifier in amenities_to_get.items():
+        df_with_amenities[amenity] = amenities.str.contains(amenity_identifier.lower(), regex=False)
+    del df_with_amenities[amenities_feature]
+    return df_with_amenities
+
+
+@inplace_kernel(_get_amenities_flags)
+@step_version(1)
+def get_amenities_flags(
+        amenities_feature: str,
+        df: pd.DataFrame,
+        amenities_to_get: Dict[str, str] = AMENITIES_TO_GET
+) -> pd.DataFrame:
+    """
+    Vectorized version of get_amenties_available. It returns the same
+    output, but the amenities column is parsed only once and every flag is
+    computed with a vectorized substring search. The flags to create are
+    given by amenities_to_get, that maps each output column to the
+    identifier of its amenity.
+    """
+    return _get_amenities_flags(amenities_feature, df.copy(), amenities_to_get=amenities_to_get)
+
+
+@step_ownership(COPY)
+@step_version(1)
 def apply_processing_output_schema(df: pd.DataFrame, schema: Dict = PREPRO_OUTPUT_SCHEMA) -> pd.DataFrame:
-    output = df.astype(schema)
-    return output[schema.keys()]
+    output = df.loc[:, list(schema)]
+    return output.astype(schema, copy=False)
 
 
-def map_categorical_features(
+def _map_categorical_features(
     features_to_map: Dict[str, Dict],
     df: pd.DataFrame
 ) -> pd.DataFrame:
-    output = df.copy()
+    output = df
     for feature, mapping in features_to_map.items():
-        output[feature] = df[feature].map(mapping)
+        output[feature] = output[feature].map(mapping)
     return output
+
+
+@inplace_kernel(_map_categorical_features)
+@step_version(1)
+def map_categorical_features(
+    features_to_map: Dict[str, Dict],
+    df: pd.DataFrame
+) -> pd.DataFrame:
+    return _map_categorical_features(features_to_map, df.copy())
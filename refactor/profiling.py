@@ -0,0 +1,117 @@
+import cProfile
+from functools import partial
+import pandas as pd
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from refactor.step_ownership import copy_frame, run_owned_step
+
+
+def get_step_name(step: Callable) -> str:
+    """
+    Readable name of a pipeline step: the name of its function, also for
+    partials and ColumnSteps.
+    """
+    if isinstance(step, partial):
+        return get_step_name(step.func)
+    if hasattr(step, 'step'):
+        return get_step_name(step.step)
+    return getattr(step, '__name__', type(step).__name__)
+
+
+def get_frame_memory(df, deep: bool = False) -> Optional[int]:
+    if isinstance(df, pd.DataFrame):
+        return int(df.memory_usage(index=True, deep=deep).sum())
+    return None
+
+
+class PipelineProfiler:
+    """
+    Records the wall time, CPU time, rows and frame memory of every step of
+    a processing pipeline (run_steps) or every phase of a training pipeline
+    (run_phase). The records add up over calls, so a profiler can be used
+    for the chunks of the streaming mode. The frame memory is the shallow
+    one by default (deep_memory counts the Python strings too, at a cost),
+    so it's cheap enough to leave on. The step or phase called profile_step
+    can also be profiled in depth: with profile_mode 'cprofile' its cProfile
+    stats are dumped to profile_path, and with 'tracemalloc' its allocation
+    snapshot is dumped there and its peak memory is added to its record.
+    """
+
+    def __init__(
+        self,
+        profile_step: Optional[str] = None,
+        profile_mode: str = 'cprofile',
+        profile_path: Optional[str] = None,
+        deep_memory: bool = False
+    ):
+        self.profile_step = profile_step
+        self.profile_mode = profile_mode
+        self.profile_path = profile_path
+        self.deep_memory = deep_memory
+        self.records = list()
+
+    def call(self, name: str, callable: Callable, *args, **kwargs):
+        record = {'name': name}
+        if args and isinstance(args[-1], pd.DataFrame):
+            record['rows_in'] = len(args[-1])
+            record['memory_in_bytes'] = get_frame_memory(args[-1], deep=self.deep_memory)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if name == self.profile_step and self.profile_mode == 'cprofile':
+            profiler = cProfile.Profile()
+            outcome = profiler.runcall(callable, *args, **kwargs)
+            profiler.dump_stats(self.profile_path or f'{name}.prof')
+        elif name == self.profile_step and self.profile_mode == 'tracemalloc':
+            tracemalloc.start()
+            outcome = callable(*args, **kwargs)
+            record['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.take_snapshot().dump(self.profile_path or f'{name}.tracemalloc')
+            tracemalloc.stop()
+        else:
+            outcome = callable(*args, **kwargs)
+        record['wall_seconds'] = time.perf_counter() - wall_start
+        record['cpu_seconds'] = time.process_time() - cpu_start
+        if isinstance(outcome, pd.DataFrame):
+            record['rows_out'] = len(outcome)
+            record['memory_out_bytes'] = get_frame_memory(outcome, deep=self.deep_memory)
+        self.records.append(record)
+        return outcome
+
+    def run_phase(self, name: str, callable: Callable, *args, **kwargs):
+        return self.call(name, callable, *args, **kwargs)
+
+    def run_steps(self, callables_to_apply: List[Callable], df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Profiled version of seq_steps_pipeline (without its skipping of
+        up-to-date ColumnSteps, every step is run and recorded). The frame
+        is copied like in seq_steps_pipeline.
+        """
+        outcome, owned = df, False
+        for callable in callables_to_apply:
+            outcome, owned = run_owned_step(
+                callable, outcome, owned, run=lambda step, step_df: self.call(get_step_name(callable), step, step_df)
+            )
+        return outcome if owned else copy_frame(outcome)
+
+    def report(self) -> Dict:
+        """
+        Returns the records, and their totals by step or phase name.
+        """
+        totals = dict()
+        for record in self.records:
+            total = totals.setdefault(record['name'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            total['calls'] += 1
+            total['wall_seconds'] += record['wall_seconds']
+            total['cpu_seconds'] += record['cpu_seconds']
+        return {'records': self.records, 'totals': totals}
+
+
+def run_phase(profiler: Optional[PipelineProfiler], name: str, callable: Callable, *args, **kwargs):
+    """
+    Runs callable as the phase name of profiler or, without a profiler, just
+    runs it.
+    """
+    if profiler is None:
+        return callable(*args, **kwargs)
+    return profiler.run_phase(name, callable, *args, **kwargs)
@@ -0,0 +1,229 @@
+import argparse
+from functools import partial
+import hashlib
+import os
+import pandas as pd
+from types import CodeType, FunctionType
+from typing import Callable, Dict, List, Optional, Set
+
+from refactor.step_ownership import copy_frame, run_owned_step
+
+CACHE_DIR = './data/cache/steps'
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+#  Module constants read by a step that are part of its identity
+IDENTITY_CONSTANT_TYPES = (str, bytes, int, float, bool, tuple, list, dict, frozenset, type(None))
+
+
+class StepCache:
+    """
+    Local cache of pipeline step outputs, stored as one Parquet file per
+    key in cache_dir. When the files add up to more than max_bytes, the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path_of(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self.path_of(key))
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        if not self.contains(key):
+            return None
+        os.utime(self.path_of(key))
+        return pd.read_parquet(self.path_of(key))
+
+    def put(self, key: str, df: pd.DataFrame):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = f'{self.path_of(key)}.{os.getpid()}.tmp'
+        df.to_parquet(temporary_path)
+        os.replace(temporary_path, self.path_of(key))
+        self.evict()
+
+    def list(self) -> List[Dict]:
+        """
+        Returns the entries of the cache, the most recently used first.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return list()
+        entries = list()
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.parquet'):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entries.append({
+                    'key': file_name[:-len('.parquet')],
+                    'bytes': stat.st_size,
+                    'last_used': stat.st_mtime
+                })
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def evict(self):
+        total_bytes = 0
+        for entry in self.list():
+            total_bytes += entry['bytes']
+            if total_bytes > self.max_bytes:
+                os.remove(self.path_of(entry['key']))
+
+    def clear(self):
+        for entry in self.list():
+            os.remove(self.path_of(entry['key']))
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """
+    Content hash of a frame: its columns, dtypes, index and values.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([(column, str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def step_version(version) -> Callable:
+    """
+    Decorator that gives a step a version, part of its identity. Bump it
+    when the step changes in a way its code doesn't show, like a new version
+    of a library or of a helper from another package.
+    """
+    def declare(step: Callable) -> Callable:
+        step.cache_version = version
+        return step
+    return declare
+
+
+def update_code_digest(digest, code: CodeType) -> Set[str]:
+    """
+    Adds the bytecode, the names (globals, attributes and methods) and the
+    constants of code, and of the functions and comprehensions nested in it,
+    to digest. Returns all the names used.
+    """
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= update_code_digest(digest, const)
+        else:
+            digest.update(repr(const).encode())
+    return names
+
+
+def get_function_hash(function: FunctionType, seen: Optional[Set] = None) -> str:
+    """
+    Hash of the code of function and of what it reads from its module: the
+    values of the constants, and the hash of the helpers defined next to it
+    (in the same directory), followed recursively.
+    """
+    seen = {function} if seen is None else seen | {function}
+    digest = hashlib.sha256()
+    names = update_code_digest(digest, function.__code__)
+    directory = os.path.dirname(function.__code__.co_filename)
+    for name in sorted(names):
+        value = function.__globals__.get(name)
+        if isinstance(value, FunctionType) and value not in seen:
+            if os.path.dirname(value.__code__.co_filename) == directory:
+                digest.update(f'{name}:{get_function_hash(value, seen)}'.encode())
+        elif isinstance(value, IDENTITY_CONSTANT_TYPES):
+            digest.update(f'{name}={get_value_identity(value)}'.encode())
+    return digest.hexdigest()
+
+
+def get_value_identity(value) -> str:
+    """
+    repr of value, with the steps inside it (for example, a list of steps
+    bound to a runner) replaced by their identity, since their repr has
+    memory addresses that change from one run to the next.
+    """
+    if isinstance(value, (list, tuple)):
+        return f'{type(value).__name__}({", ".join(map(get_value_identity, value))})'
+    if isinstance(value, dict):
+        return f'dict({", ".join(f"{key!r}: {get_value_identity(item)}" for key, item in value.items())})'
+    if callable(value) and not isinstance(value, type):
+        return get_step_identity(value)
+    return repr(value)
+
+
+def get_step_identity(step: Callable) -> str:
+    """
+    Identifies a step by its function (name, code, the helpers and constants
+    it reads, default arguments and step_version) and, for partials and
+    ColumnSteps, by the arguments bound to it. A change in the code of the
+    function or of its helpers changes its identity.
+    """
+    if hasattr(step, 'input_features') and hasattr(step, 'output_features'):
+        return f'ColumnStep({get_step_identity(step.step)}, {step.input_features!r}, {step.output_features!r})'
+    if isinstance(step, partial):
+        return (
+            f'partial({get_step_identity(step.func)}, {get_value_identity(step.args)}, '
+            f'{get_value_identity(sorted(step.keywords.items()))})'
+        )
+    code = getattr(step, '__code__', None)
+    if code is None:
+        return repr(step)
+    return (
+        f'{step.__module__}.{step.__qualname__}:{get_function_hash(step)}:'
+        f'{getattr(step, "__defaults__", None)!r}:{getattr(step, "cache_version", None)!r}'
+    )
+
+
+def get_pipeline_identity(callables_to_apply: List[Callable], output_schema: Optional[Dict] = None) -> str:
+    """
+    Hash of the identities of the steps of a pipeline and of its output
+    schema: if it changes, outputs of the pipeline made before are stale.
+    """
+    identities = [get_step_identity(callable) for callable in callables_to_apply]
+    return hashlib.sha256(f'{identities!r}:{get_value_identity(output_schema)}'.encode()).hexdigest()
+
+
+def get_step_keys(callables_to_apply: List[Callable], df: pd.DataFrame) -> List[str]:
+    """
+    Returns the cache key of the output of every step: the hash of the key
+    of its input (the hash of df for the first step) and its identity.
+    """
+    keys, key = list(), hash_frame(df)
+    for callable in callables_to_apply:
+        key = hashlib.sha256(f'{key}:{get_step_identity(callable)}'.encode()).hexdigest()
+        keys.append(key)
+    return keys
+
+
+def cached_seq_steps_pipeline(
+        cache: StepCache,
+        callables_to_apply: List[Callable],
+        df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Version of seq_steps_pipeline that memoizes the output of every step in
+    cache. The output of the last step of the longest run of cached steps
+    from the start is loaded, and only the steps after it are run (and
+    cached).
+    """
+    keys = get_step_keys(callables_to_apply, df)
+    cached_steps = 0
+    while cached_steps < len(keys) and cache.contains(keys[cached_steps]):
+        cached_steps += 1
+    outcome = cache.get(keys[cached_steps - 1]) if cached_steps > 0 else None
+    owned = outcome is not None
+    if outcome is None:
+        outcome, cached_steps = df, 0
+    for callable, key in zip(callables_to_apply[cached_steps:], keys[cached_steps:]):
+        outcome, owned = run_owned_step(callable, outcome, owned)
+        cache.put(key, outcome)
+    return outcome if owned else copy_frame(outcome)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lists or clears the cache of pipeline steps.')
+    parser.add_argument('action', choices=['list', 'clear'])
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+    cache = StepCache(cache_dir=args.cache_dir)
+    if args.action == 'clear':
+        cache.clear()
+    else:
+        for entry in cache.list():
+            print(f"{entry['key']}  {entry['bytes']:>12}  {pd.Timestamp(entry['last_used'], unit='s')}")
@@ -0,0 +1,96 @@
+from functools import partial
+import pandas as pd
+from typing import Callable, Optional, Tuple
+
+#  What a step does with the frame it gets. An undeclared step is taken as
+#  INPLACE, the only kind that is always safe to run.
+INPLACE = 'inplace'  # writes into the frame it gets (and returns it)
+VIEW = 'view'  # returns a frame that can share data with the one it gets
+COPY = 'copy'  # returns a frame with its own data
+#  pandas 1.5 has an experimental copy-on-write that misses many methods
+PANDAS_HAS_COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 2
+
+
+def step_ownership(ownership: str) -> Callable:
+    """
+    Decorator that declares the ownership (INPLACE, VIEW or COPY) of a
+    pipeline step.
+    """
+    def declare(step: Callable) -> Callable:
+        step.ownership = ownership
+        return step
+    return declare
+
+
+def inplace_kernel(kernel: Callable) -> Callable:
+    """
+    Decorator of a step that leaves the frame it gets alone, built on
+    kernel, the same step writing into its input. The step is declared
+    COPY, and the runners call kernel instead when the frame is already
+    theirs, so it isn't copied again.
+    """
+    def declare(step: Callable) -> Callable:
+        step.ownership = COPY
+        step.inplace_kernel = kernel
+        return step
+    return declare
+
+
+def get_step_ownership(step: Callable) -> str:
+    if isinstance(step, partial):
+        return get_step_ownership(step.func)
+    return getattr(step, 'ownership', INPLACE)
+
+
+def get_inplace_kernel(step: Callable) -> Optional[Callable]:
+    """
+    Returns the in-place kernel of step (see inplace_kernel), bound to the
+    same arguments if step is a partial, or None if it has none.
+    """
+    if isinstance(step, partial):
+        kernel = get_inplace_kernel(step.func)
+        return None if kernel is None else partial(kernel, *step.args, **step.keywords)
+    return getattr(step, 'inplace_kernel', None)
+
+
+def enable_copy_on_write():
+    """
+    Turns copy-on-write on when pandas supports it. Copies made by the
+    runners are then lazy: the data is only copied when a step writes into
+    it.
+    """
+    if PANDAS_HAS_COPY_ON_WRITE:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def copy_frame(df):
+    """
+    Copies df for the pipeline, so its steps don't change the frame of the
+    caller. Arrow tables are immutable and are not copied.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df
+    return df.copy(deep=not (PANDAS_HAS_COPY_ON_WRITE and pd.get_option('mode.copy_on_write')))
+
+
+def run_owned_step(
+    step: Callable,
+    df,
+    owned: bool,
+    run: Optional[Callable] = None
+) -> Tuple[object, bool]:
+    """
+    Runs step on df (with run(step, df) if given). df is only copied when
+    the step writes into its input and the pipeline doesn't own df yet, that
+    is, when no step before it returned its own data. When the pipeline owns
+    df, the in-place kernel of a step is run instead of the step. Returns
+    the outcome and whether the pipeline owns it.
+    """
+    ownership = get_step_ownership(step)
+    kernel = get_inplace_kernel(step) if owned else None
+    if kernel is not None:
+        step, ownership = kernel, INPLACE
+    if ownership == INPLACE and not owned:
+        df, owned = copy_frame(df), True
+    outcome = step(df) if run is None else run(step, df)
+    return outcome, owned or ownership == COPY
@@ -0,0 +1,60 @@
+from functools import partial
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from typing import Dict, List
+from refactor.pipeline_utils import ColumnStep
+from refactor.processing_utils import (
+    get_only_relevant_features, drop_nans, remove_records_below_threshold_price, create_categorical_price_labels,
+    apply_processing_output_schema, get_amenities_flags, parse_num_of_bathrooms_vectorized,
+    parse_property_price_vectorized, map_categorical_features
+)
+
+#  Inputs and pipelines shared by the test modules
+PATH_TO_RAW = './tests/test_data/raw_sample.csv'
+PATH_TO_PROC = './tests/test_data/processed_sample.parquet'
+AMENITIES_FEATURE = 'amenities'
+BATHROOMS_STR = 'bathrooms_text'
+BATHROOMS_FLOAT = 'bathrooms'
+PRICE_FEATURE = 'price'
+PRICE_THRESHOLD = 10
+PRICE_BINS = [10, 90, 180, 400, np.inf]
+PRICE_LABELS = [0, 1, 2, 3]
+FEATURES_MAPPINGS = {
+    'room_type': {"Shared room": 1, "Private room": 2, "Entire home/apt": 3, "Hotel room": 4},
+    'neighbourhood_group_cleansed': {"Bronx": 1, "Queens": 2, "Staten Island": 3, "Brooklyn": 4, "Manhattan": 5}
+}
+MODEL_SPECS = {
+    'estimator': RandomForestClassifier,
+    'estimator_params': {'n_estimators': 5, 'random_state': 0},
+    'features': ['neighbourhood_group_cleansed', 'room_type', 'accommodates', 'bathrooms', 'bedrooms'],
+    'target': 'category',
+    'train_test_split_params': {'test_size': 0.15, 'random_state': 1}
+}
+CALLABLES_TO_APPLY_VECTORIZED = [
+    get_only_relevant_features,
+    ColumnStep(
+        partial(parse_num_of_bathrooms_vectorized, BATHROOMS_STR, BATHROOMS_FLOAT),
+        input_features=[BATHROOMS_STR],
+        output_features=[BATHROOMS_FLOAT]
+    ),
+    partial(parse_property_price_vectorized, PRICE_FEATURE),
+    partial(remove_records_below_threshold_price, PRICE_FEATURE, PRICE_THRESHOLD),
+    partial(create_categorical_price_labels, PRICE_FEATURE, PRICE_BINS, PRICE_LABELS),
+    partial(get_amenities_flags, AMENITIES_FEATURE),
+    ColumnStep(
+        partial(parse_num_of_bathrooms_vectorized, BATHROOMS_STR, BATHROOMS_FLOAT),
+        input_features=[BATHROOMS_STR],
+        output_features=[BATHROOMS_FLOAT]
+    ),
+    drop_nans,
+    apply_processing_output_schema
+]
+
+
+def get_mapped_callables(schema: Dict) -> List:
+    return [
+        *CALLABLES_TO_APPLY_VECTORIZED[:-2],
+        partial(map_categorical_features, FEATURES_MAPPINGS),
+        drop_nans,
+        partial(apply_processing_output_schema, schema=schema)
+    ]
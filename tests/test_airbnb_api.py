@@ -0,0 +1,99 @@
+import importlib
+import numpy as np
+import os
+import pytest
+import sys
+import time
+from sklearn.ensemble import RandomForestClassifier
+
+from refactor.pipeline_utils import sink_model
+
+MODEL_API_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model_api')
+X = np.array([[5, 3, 2, 1, 1], [1, 1, 4, 2, 2], [4, 2, 1, 1, 1], [2, 3, 6, 2, 3]], dtype=float)
+LISTING = {
+    'id': 1, 'neighbourhood': 'Manhattan', 'room_type': 'Entire home/apt', 'accommodates': 3,
+    'bathrooms': 1, 'bedrooms': 1
+}
+ADMIN_HEADERS = {'X-Admin-Token': 'secret'}
+
+
+def write_model(path, labels):
+    sink_model(str(path), RandomForestClassifier(n_estimators=3, random_state=0).fit(X, labels))
+
+
+@pytest.fixture
+def load_api(tmp_path, monkeypatch):
+    #  airbnb_api reads its environment variables at import time, so every test imports a fresh one
+    def load_api(**environment):
+        write_model(tmp_path / 'model.pkl', [0, 1, 2, 3])
+        monkeypatch.setenv('ARTIFACT_PATH', str(tmp_path / 'model.pkl'))
+        monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+        for name, value in environment.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.syspath_prepend(MODEL_API_PATH)
+        sys.modules.pop('airbnb_api', None)
+        return importlib.import_module('airbnb_api')
+
+    yield load_api
+    sys.modules.pop('airbnb_api', None)
+
+
+@pytest.mark.parametrize('micro_batching', ['0', '1'])
+def test_predict_returns_model_version(load_api, micro_batching):
+    api = load_api(MICRO_BATCHING=micro_batching)
+    client = api.app.test_client()
+    version = str(api.MODEL_REGISTRY.version)
+    response = client.post('/predict/', data=LISTING)
+    assert response.status_code == 200
+    assert response.json['model_version'] == response.headers['X-Model-Version'] == version
+    response = client.get('/predict/', query_string={**LISTING, 'top_k': 2})
+    assert response.json['model_version'] == version
+    assert len(response.json['top_k']) == 2
+    response = client.post('/predict/batch', json=[LISTING, LISTING])
+    assert response.status_code == 200
+    assert response.headers['X-Model-Version'] == version
+
+
+def test_admin_routes_are_disabled_without_token(load_api, tmp_path):
+    api = load_api()
+    client = api.app.test_client()
+    version = api.MODEL_REGISTRY.version
+    time.sleep(0.01)
+    write_model(tmp_path / 'model.pkl', [3, 3, 3, 3])
+    for headers in [{}, {'X-Admin-Token': ''}]:
+        assert client.post('/admin/reload', query_string={'wait': 1}, headers=headers).status_code == 403
+        assert client.get('/admin/model', headers=headers).status_code == 403
+    assert api.MODEL_REGISTRY.version == version
+
+
+def test_admin_reload(load_api, tmp_path):
+    api = load_api(ADMIN_TOKEN='secret')
+    client = api.app.test_client()
+    first_version = client.post('/predict/', data=LISTING).headers['X-Model-Version']
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/admin/model').status_code == 403
+    time.sleep(0.01)
+    write_model(tmp_path / 'model.pkl', [3, 3, 3, 3])
+    response = client.post('/admin/reload', query_string={'wait': 1}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json['reloads'] == 1
+    response = client.post('/predict/', data=LISTING)
+    assert response.json['price_category'] == 'lux'
+    assert response.json['model_version'] == response.headers['X-Model-Version'] != first_version
+    (tmp_path / 'model.pkl').write_bytes(b'not a model')
+    response = client.post('/admin/reload', query_string={'wait': 1}, headers=ADMIN_HEADERS)
+    assert response.status_code == 422
+    assert client.get('/admin/model', headers=ADMIN_HEADERS).json['failed_reloads'] == 1
+    assert client.post('/predict/', data=LISTING).headers['X-Model-Version'] == response.json['version']
+
+
+def test_predict_batch_rejects_what_predict_rejects(load_api):
+    api = load_api()
+    client = api.app.test_client()
+    listing = {**LISTING, 'accommodates': -5}
+    response = client.post('/predict/', data=listing)
+    assert response.status_code == 400
+    response = client.post('/predict/batch', json=[LISTING, listing])
+    assert response.status_code == 200
+    assert 'price_category' in response.json[0]
+    assert response.json[1] == {'id': 1, 'error': 'The feature accommodates must be between 0 and 100, got -5'}
@@ -4,7 +4,10 @@ from sklearn.base import BaseEstimator
 
 from model_api.api_utils import (
     get_model_features, map_values, make_model_prediction,
-    make_predictions_airbnb
+    make_predictions_airbnb, parse_batch_payload, get_model_features_batch,
+    process_features_airbnb_batch, make_predictions_airbnb_batch,
+    build_batch_response, process_features_airbnb, get_error_type, FeatureSchema, FeatureError, OutOfRangeFeatureError,
+    parse_response_mode, postprocess_probabilities, make_probabilities_airbnb, make_probabilities_airbnb_batch
 )
 
 EXAMPLE_ALL = {
@@ -35,6 +38,9 @@ EXAMPLE_NONE = {
     "latitude": 40.71383,
     "longitude": -73.9658
 }
+FEATURES_TO_GET = [
+    'neighbourhood', 'room_type', 'accommodates', 'bathrooms', 'bedrooms'
+]
 MAPPING = {
     'dog': 0,
     'cat': 1,
@@ -47,6 +53,18 @@ class MockEstimator(BaseEstimator):
         return np.array([1]) if np.array_equal(instance, np.array([1, 0, 1])) else np.array([0])
 
 
+class MockBatchEstimator(BaseEstimator):
+    def predict(instance: np.array) -> np.array:
+        return np.asarray(instance)[:, 2].astype(int) % 4
+
+
+class MockProbaEstimator(BaseEstimator):
+    classes_ = np.array([0, 1, 2, 3])
+
+    def predict_proba(instance: np.array) -> np.array:
+        return np.eye(4)[np.asarray(instance)[:, 2].astype(int) % 4] * 0.7 + 0.075
+
+
 def test_get_model_features_ok():
     actual = {
         "id": 1001,
@@ -85,6 +103,24 @@ def test_map_values_value_not_in_mapping():
         map_values(value_to_map=example, mapping=MAPPING)
 
 
+def test_get_error_type():
+    errors = list()
+    for features, request in [
+        (['id', 'beds', 'random'], EXAMPLE_ALL), (['id', 'beds'], EXAMPLE_NONE)
+    ]:
+        with pytest.raises(Exception) as error:
+            get_model_features(request=request, model_features=features)
+        errors.append(error.value)
+    with pytest.raises(KeyError) as error:
+        map_values(value_to_map='horse', mapping=MAPPING)
+    errors.append(error.value)
+    errors.append(ValueError('could not convert string to float'))
+    errors.append(ZeroDivisionError())
+    assert [get_error_type(error) for error in errors] == [
+        'missing_feature', 'null_value', 'unmapped_category', 'invalid_value', 'internal'
+    ]
+
+
 def test_make_model_prediction_label_1():
     example = np.array([1, 0, 1])
     actual = make_model_prediction(model=MockEstimator, features=example)
@@ -104,3 +140,183 @@ def test_make_predictions_airbnb():
     actual = make_predictions_airbnb(model=MockEstimator, features=example)
     expected = 'low'
     assert actual == expected
+
+
+def test_parse_batch_payload_json_array():
+    actual = parse_batch_payload('[{"id": 1}, {"id": 2}]', content_type='application/json')
+    expected = [{'id': 1}, {'id': 2}]
+    assert actual == expected
+
+
+def test_parse_batch_payload_ndjson():
+    actual = parse_batch_payload('{"id": 1}\n\n{"id": 2}\n', content_type='application/x-ndjson; charset=utf-8')
+    expected = [{'id': 1}, {'id': 2}]
+    assert actual == expected
+
+
+def test_parse_batch_payload_not_a_list():
+    with pytest.raises(
+        ValueError, match='The batch payload must be a JSON array of listings'
+    ):
+        parse_batch_payload('{"id": 1}', content_type='application/json')
+
+
+def test_get_model_features_batch():
+    records = [EXAMPLE_ALL, {'id': 1002}, EXAMPLE_NONE, 'not a listing']
+    positions, features, errors = get_model_features_batch(records, model_features=['id', 'beds'])
+    assert positions == [0]
+    assert features == [{'id': 1001, 'beds': 2}]
+    assert errors == {
+        1: 'The feature beds is not available in the payload sent',
+        2: 'The feature beds has null values',
+        3: 'Each listing of the batch must be a JSON object'
+    }
+
+
+def test_process_features_airbnb_batch_matches_single():
+    listings = [
+        {key: EXAMPLE_ALL[key] for key in FEATURES_TO_GET},
+        {**{key: EXAMPLE_ALL[key] for key in FEATURES_TO_GET}, 'neighbourhood': 'Bronx', 'accommodates': '2'}
+    ]
+    actual, rows, errors = process_features_airbnb_batch(listings, model_features=FEATURES_TO_GET)
+    expected = np.vstack([process_features_airbnb(dict(listing)) for listing in listings])
+    assert np.array_equal(actual, expected)
+    assert rows.tolist() == [0, 1]
+    assert errors == dict()
+
+
+def test_process_features_airbnb_batch_errors():
+    valid = {key: EXAMPLE_ALL[key] for key in FEATURES_TO_GET}
+    listings = [
+        {**valid, 'neighbourhood': 'Narnia'}, valid, {**valid, 'bedrooms': 'many'},
+        {**valid, 'accommodates': -5}, {**valid, 'bathrooms': '51'}
+    ]
+    actual, rows, errors = process_features_airbnb_batch(listings, model_features=FEATURES_TO_GET)
+    assert actual.shape == (1, 5)
+    assert rows.tolist() == [1]
+    assert errors == {
+        0: 'Narnia wasn`t found in the mapping dict',
+        2: 'The feature bedrooms must be numeric, got many',
+        3: 'The feature accommodates must be between 0 and 100, got -5',
+        4: 'The feature bathrooms must be between 0 and 50, got 51'
+    }
+    for position in [3, 4]:
+        with pytest.raises(OutOfRangeFeatureError) as error:
+            FeatureSchema(FEATURES_TO_GET).parse(listings[position])
+        assert error.value.args[0] == errors[position]
+
+
+def test_make_predictions_airbnb_batch():
+    example = np.array([[1, 0, 0], [1, 0, 2], [1, 0, 7]])
+    actual = make_predictions_airbnb_batch(model=MockBatchEstimator, features=example)
+    expected = ['low', 'high', 'lux']
+    assert actual == expected
+
+
+def test_make_predictions_airbnb_batch_empty():
+    actual = make_predictions_airbnb_batch(model=MockBatchEstimator, features=np.empty((0, 3)))
+    assert actual == []
+
+
+def test_parse_response_mode():
+    assert parse_response_mode({}) == (False, None)
+    assert parse_response_mode({'probabilities': '1'}) == (True, None)
+    assert parse_response_mode({'top_k': '2'}) == (False, 2)
+    with pytest.raises(FeatureError, match='top_k must be an integer'):
+        parse_response_mode({'top_k': 'two'})
+    with pytest.raises(FeatureError, match='top_k must be between 1 and 4'):
+        parse_response_mode({'top_k': '5'})
+
+
+def test_postprocess_probabilities():
+    probabilities = np.array([[0.1, 0.2, 0.6, 0.1], [0.4, 0.4, 0.1, 0.1]])
+    actual = postprocess_probabilities(probabilities, classes=np.array([0, 1, 2, 3]), top_k=2)
+    expected = [
+        {
+            'price_category': 'high',
+            'probabilities': {'low': 0.1, 'mid': 0.2, 'high': 0.6, 'lux': 0.1},
+            'top_k': [{'price_category': 'high', 'probability': 0.6}, {'price_category': 'mid', 'probability': 0.2}]
+        },
+        {
+            'price_category': 'low',
+            'probabilities': {'low': 0.4, 'mid': 0.4, 'high': 0.1, 'lux': 0.1},
+            'top_k': [{'price_category': 'low', 'probability': 0.4}, {'price_category': 'mid', 'probability': 0.4}]
+        }
+    ]
+    assert actual == expected
+
+
+def test_postprocess_probabilities_follows_classes():
+    probabilities = np.array([[0.7, 0.3]])
+    actual = postprocess_probabilities(probabilities, classes=np.array([3, 1]), with_probabilities=False, top_k=1)
+    assert actual == [{'price_category': 'lux', 'top_k': [{'price_category': 'lux', 'probability': 0.7}]}]
+
+
+def test_make_probabilities_airbnb_matches_batch():
+    example = np.array([[1, 0, 0], [1, 0, 2], [1, 0, 7]])
+    actual = [make_probabilities_airbnb(model=MockProbaEstimator, features=row, top_k=3) for row in example[:, None]]
+    expected = make_probabilities_airbnb_batch(model=MockProbaEstimator, features=example, top_k=3)
+    assert actual == expected
+    assert [output['price_category'] for output in actual] == ['low', 'high', 'lux']
+    assert make_probabilities_airbnb_batch(model=MockProbaEstimator, features=np.empty((0, 3))) == []
+
+
+def test_build_batch_response_keeps_input_order():
+    records = [{'id': 1}, 'not a listing', {'id': 3}]
+    actual = build_batch_response(
+        records=records,
+        positions=[2, 0],
+        predictions=['mid', 'low'],
+        errors={1: 'Each listing of the batch must be a JSON object'}
+    )
+    expected = [
+        {'id': 1, 'price_category': 'low'},
+        {'id': None, 'error': 'Each listing of the batch must be a JSON object'},
+        {'id': 3, 'price_category': 'mid'}
+    ]
+    assert actual == expected
+
+
+def test_build_batch_response_with_probabilities():
+    actual = build_batch_response(
+        records=[{'id': 1}],
+        positions=[0],
+        predictions=[{'price_category': 'mid', 'top_k': [{'price_category': 'mid', 'probability': 0.5}]}],
+        errors={}
+    )
+    assert actual == [{'id': 1, 'price_category': 'mid', 'top_k': [{'price_category': 'mid', 'probability': 0.5}]}]
+
+
+def test_feature_schema_matches_process_features_airbnb():
+    schema = FeatureSchema(FEATURES_TO_GET)
+    values = {feature: str(value) for feature, value in EXAMPLE_ALL.items()}
+    expected = process_features_airbnb(features=get_model_features(request=values, model_features=FEATURES_TO_GET))
+    assert np.array_equal(schema.parse(values), expected)
+
+
+def test_feature_schema_errors():
+    schema = FeatureSchema(FEATURES_TO_GET)
+    valid = {feature: EXAMPLE_ALL[feature] for feature in FEATURES_TO_GET}
+    cases = [
+        ({feature: value for feature, value in valid.items() if feature != 'bedrooms'}, 'missing_feature', 'bedrooms'),
+        ({**valid, 'bathrooms': None}, 'null_value', 'bathrooms'),
+        ({**valid, 'bathrooms': 'nan'}, 'null_value', 'bathrooms'),
+        ({**valid, 'room_type': 'Castle'}, 'unmapped_category', 'room_type'),
+        ({**valid, 'room_type': ['Hotel room']}, 'unmapped_category', 'room_type'),
+        ({**valid, 'accommodates': 'four'}, 'invalid_value', 'accommodates'),
+        ({**valid, 'accommodates': '-1'}, 'out_of_range', 'accommodates')
+    ]
+    for values, error_type, feature in cases:
+        with pytest.raises(FeatureError) as error:
+            schema.parse(values)
+        assert error.value.to_dict()['type'] == error_type
+        assert error.value.to_dict()['feature'] == feature
+        assert get_error_type(error.value) == error_type
+
+
+def test_feature_schema_reuses_its_row():
+    schema = FeatureSchema(FEATURES_TO_GET)
+    values = {feature: EXAMPLE_ALL[feature] for feature in FEATURES_TO_GET}
+    first = schema.parse(values)
+    second = schema.parse({**values, 'bedrooms': 3})
+    assert first is second and second[0, -1] == 3
@@ -0,0 +1,81 @@
+from functools import partial
+import pandas as pd
+import pyarrow as pa
+import pytest
+from refactor import arrow_processing_utils
+from refactor.pipeline_utils import source_csv, source_csv_table, seq_steps_pipeline, run_pipeline, sink_parquet
+from refactor.processing_utils import (
+    parse_price_column, parse_amenities_column, RELEVANT_FEATURES, RELEVANT_FEATURES_DTYPES,
+    PREPRO_OUTPUT_SCHEMA, PREPRO_OUTPUT_SCHEMA_COMPACT
+)
+from tests.pipeline_specs import (
+    PATH_TO_RAW, AMENITIES_FEATURE, BATHROOMS_STR, BATHROOMS_FLOAT, PRICE_FEATURE, PRICE_THRESHOLD, PRICE_BINS,
+    PRICE_LABELS, FEATURES_MAPPINGS, get_mapped_callables
+)
+
+ARROW_CALLABLES_TO_APPLY = [
+    arrow_processing_utils.get_only_relevant_features,
+    partial(arrow_processing_utils.parse_num_of_bathrooms, BATHROOMS_STR, BATHROOMS_FLOAT),
+    partial(arrow_processing_utils.parse_property_price, PRICE_FEATURE),
+    partial(arrow_processing_utils.remove_records_below_threshold_price, PRICE_FEATURE, PRICE_THRESHOLD),
+    partial(arrow_processing_utils.create_categorical_price_labels, PRICE_FEATURE, PRICE_BINS, PRICE_LABELS),
+    partial(arrow_processing_utils.get_amenities_flags, AMENITIES_FEATURE),
+    partial(arrow_processing_utils.map_categorical_features, FEATURES_MAPPINGS),
+    arrow_processing_utils.drop_nans,
+    arrow_processing_utils.apply_processing_output_schema
+]
+
+
+@pytest.mark.parametrize('schema', [PREPRO_OUTPUT_SCHEMA, PREPRO_OUTPUT_SCHEMA_COMPACT])
+def test_backends_write_the_same_output(tmp_path, schema):
+    pandas_callables = get_mapped_callables(schema)
+    arrow_callables = [
+        *ARROW_CALLABLES_TO_APPLY[:-1], partial(arrow_processing_utils.apply_processing_output_schema, schema=schema)
+    ]
+    run_pipeline(
+        sink=partial(sink_parquet, tmp_path / 'pandas.parquet'),
+        source=partial(source_csv, PATH_TO_RAW, dtype=RELEVANT_FEATURES_DTYPES),
+        pipeline_steps=partial(seq_steps_pipeline, pandas_callables)
+    )
+    run_pipeline(
+        sink=partial(sink_parquet, tmp_path / 'arrow.parquet'),
+        source=partial(source_csv_table, PATH_TO_RAW, columns=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES),
+        pipeline_steps=partial(seq_steps_pipeline, arrow_callables)
+    )
+    expected = pd.read_parquet(tmp_path / 'pandas.parquet')
+    assert len(expected) > 0
+    assert expected.equals(pd.read_parquet(tmp_path / 'arrow.parquet'))
+    assert (tmp_path / 'pandas.parquet').read_bytes() == (tmp_path / 'arrow.parquet').read_bytes()
+
+
+def test_extract_first_number():
+    prices = pd.Series(['$1,200.00', '$85.50', 'free', None], dtype=object)
+    actual = arrow_processing_utils.extract_first_number(pa.chunked_array([pa.array(prices)]))
+    assert actual.to_pandas().equals(parse_price_column(prices))
+
+
+def test_parse_num_of_bathrooms_ambiguous():
+    table = pa.table({BATHROOMS_STR: ['1 bath', '1 bath and 2 half-baths']})
+    with pytest.raises(ValueError, match='ambiguous'):
+        arrow_processing_utils.parse_num_of_bathrooms(BATHROOMS_STR, BATHROOMS_FLOAT, table)
+
+
+def test_create_categorical_price_labels_bounds():
+    prices = [5.0, 10.0, 10.5, 90.0, 90.5, 400.0, 10_000.0, None]
+    table = pa.table({PRICE_FEATURE: pa.array(prices, type=pa.float64())})
+    actual = arrow_processing_utils.create_categorical_price_labels(PRICE_FEATURE, PRICE_BINS, PRICE_LABELS, table)
+    expected = pd.cut(pd.Series(prices, dtype=float), bins=PRICE_BINS, labels=PRICE_LABELS)
+    assert actual['category'].to_pylist() == [None if pd.isna(label) else label for label in expected]
+
+
+def test_amenities_column_as_lists():
+    amenities = [['Wifi', 'TV'], ['Air conditioning']]
+    actual = arrow_processing_utils.parse_amenities_column(pa.chunked_array([pa.array(amenities)]))
+    assert actual.to_pylist() == parse_amenities_column(pd.Series(amenities)).tolist()
+
+
+def test_map_categorical_features_unmapped_is_null():
+    table = pa.table({'room_type': ['Private room', 'Castle']})
+    actual = arrow_processing_utils.map_categorical_features({'room_type': FEATURES_MAPPINGS['room_type']}, table)
+    assert actual['room_type'].to_pylist() == [2, None]
+    assert arrow_processing_utils.drop_nans(actual).num_rows == 1
@@ -0,0 +1,43 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from model_api.flat_forest import compile_forest, load_flat_forest
+from refactor.pipeline_utils import source_parquet, sink_model_arrays
+
+FEATURES = ['neighbourhood_group_cleansed', 'room_type', 'accommodates', 'bathrooms', 'bedrooms']
+PROCESSED = source_parquet('./data/processed/processed_diego.parquet')
+X = PROCESSED[FEATURES].to_numpy(dtype=float)
+ESTIMATOR = RandomForestClassifier(
+    n_estimators=15, random_state=0, class_weight='balanced', min_samples_leaf=3
+).fit(X, PROCESSED['category'])
+EXAMPLES = np.vstack([
+    X[:300],
+    np.random.RandomState(0).uniform(low=-1, high=20, size=(200, 5))
+])
+
+
+def test_compile_forest_bit_for_bit():
+    engine = compile_forest(ESTIMATOR)
+    assert np.array_equal(engine.predict_proba(EXAMPLES), ESTIMATOR.predict_proba(EXAMPLES))
+    assert np.array_equal(engine.predict(EXAMPLES), ESTIMATOR.predict(EXAMPLES))
+
+
+def test_compile_forest_single_row():
+    engine = compile_forest(ESTIMATOR)
+    example = np.array([[4, 3, 4, 2, 1]], dtype=float)
+    assert engine.predict(example).shape == (1,)
+    assert np.array_equal(engine.predict_proba(example), ESTIMATOR.predict_proba(example))
+
+
+def test_compile_forest_apply_matches_sklearn():
+    engine = compile_forest(ESTIMATOR)
+    offsets = np.cumsum([0] + [estimator.tree_.node_count for estimator in ESTIMATOR.estimators_[:-1]])
+    assert np.array_equal(engine.apply(EXAMPLES), ESTIMATOR.apply(EXAMPLES) + offsets)
+
+
+def test_load_flat_forest(tmp_path):
+    sink_model_arrays(tmp_path / 'model', ESTIMATOR)
+    engine = load_flat_forest(tmp_path / 'model')
+    assert isinstance(engine.values, np.memmap)
+    assert np.array_equal(engine.predict_proba(EXAMPLES), ESTIMATOR.predict_proba(EXAMPLES))
+    assert isinstance(engine.artifact_version_, str)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from model_api.lookup_table import compile_lookup_table, get_feature_grid, get_observed_feature_grid
+from refactor.pipeline_utils import sink_return, source_parquet, train_model_pipeline
+
+FEATURES = ['neighbourhood_group_cleansed', 'room_type', 'accommodates', 'bathrooms', 'bedrooms']
+PROCESSED = source_parquet('./data/processed/processed_diego.parquet')
+X = PROCESSED[FEATURES].to_numpy(dtype=float)
+ESTIMATOR = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, PROCESSED['category'])
+
+
+@pytest.fixture(scope='module')
+def lookup_table():
+    return compile_lookup_table(ESTIMATOR, grid=get_observed_feature_grid(X))
+
+
+def test_get_observed_feature_grid():
+    example = np.array([[1, 2.5], [3, 2.5], [1, 0]])
+    actual = get_observed_feature_grid(example)
+    assert np.array_equal(actual[0], [1, 3])
+    assert np.array_equal(actual[1], [0, 2.5])
+
+
+def test_lookup_table_in_domain(lookup_table):
+    example = X[:500]
+    positions, in_domain = lookup_table.locate(example)
+    assert in_domain.all()
+    assert np.array_equal(lookup_table.predict(example), ESTIMATOR.predict(example))
+    assert np.array_equal(lookup_table.predict_proba(example), ESTIMATOR.predict_proba(example))
+
+
+def test_lookup_table_out_of_domain(lookup_table):
+    example = np.array([
+        [5, 3, 2, 1, 1],
+        [5, 3, 2, 1.25, 1],
+        [4, 2, 40, 1, 1],
+        [0, 3, 2, 1, 1]
+    ])
+    positions, in_domain = lookup_table.locate(example)
+    assert in_domain.tolist() == [True, False, False, False]
+    assert np.array_equal(lookup_table.predict(example), ESTIMATOR.predict(example))
+    assert np.array_equal(lookup_table.predict_proba(example), ESTIMATOR.predict_proba(example))
+
+
+def test_lookup_table_single_row(lookup_table):
+    example = np.array([4, 3, 4, 2, 1], dtype=float).reshape(1, -1)
+    assert lookup_table.predict(example).shape == (1,)
+    assert lookup_table.predict(example)[0] == ESTIMATOR.predict(example)[0]
+
+
+def test_training_saves_feature_grid():
+    model_specs = {
+        'estimator': RandomForestClassifier,
+        'estimator_params': {'n_estimators': 3, 'random_state': 0},
+        'features': FEATURES,
+        'target': 'category',
+        'train_test_split_params': {'test_size': 0.15, 'random_state': 1}
+    }
+    model, _ = train_model_pipeline(
+        source=lambda columns: PROCESSED[columns],
+        sink_model=sink_return,
+        sink_eval=sink_return,
+        model_specs=model_specs
+    )
+    grid = get_feature_grid(model)
+    assert all(np.array_equal(actual, expected) for actual, expected in zip(grid, get_observed_feature_grid(X)))
+    assert compile_lookup_table(model, grid=grid).locate(X)[1].all()
+
+
+def test_get_feature_grid_default():
+    with pytest.raises(ValueError, match='no feature grid'):
+        get_feature_grid(object())
+    with pytest.warns(UserWarning, match='default grid'):
+        assert get_feature_grid(object(), default=[[1, 2]]) == [[1, 2]]
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from model_api.metrics import Counter, Gauge, Histogram, MetricsRegistry, StageTimer
+
+
+def test_metrics_render_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.register(Counter('requests_total', 'Requests served', ('endpoint', 'status')))
+    in_flight = registry.register(Gauge('requests_in_flight', 'Requests being served'))
+    requests.labels('/predict/', '200').inc()
+    requests.labels('/predict/', '200').inc()
+    requests.labels('/predict/', '500').inc()
+    in_flight.labels().inc(3)
+    in_flight.labels().dec()
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests served',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="/predict/",status="200"} 2.0',
+        'requests_total{endpoint="/predict/",status="500"} 1.0',
+        '# HELP requests_in_flight Requests being served',
+        '# TYPE requests_in_flight gauge',
+        'requests_in_flight 2.0'
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.register(Histogram('latency_seconds', 'Latency', ('stage',), buckets=[0.1, 1, float('inf')]))
+    for value in [0.05, 0.1, 0.5, 2]:
+        latency.labels('fit').observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{stage="fit",le="0.1"} 2',
+        'latency_seconds_bucket{stage="fit",le="1"} 3',
+        'latency_seconds_bucket{stage="fit",le="+Inf"} 4',
+        'latency_seconds_sum{stage="fit"} 2.65',
+        'latency_seconds_count{stage="fit"} 4'
+    ]
+
+
+def test_counter_is_thread_safe():
+    counter = Counter('requests_total', 'Requests served')
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: [counter.labels().inc() for _ in range(1000)], range(8)))
+    assert counter.labels().value == 8000
+
+
+def test_stage_timer_observes_every_stage():
+    latency = Histogram('stage_seconds', 'Latency', ('stage',))
+    stages = {stage: latency.labels(stage) for stage in ['features', 'prediction']}
+    timer = StageTimer(stages)
+    timer.lap('features')
+    timer.lap('prediction')
+    assert [sum(stage.counts) for stage in stages.values()] == [1, 1]
+    assert all(stage.sum >= 0 for stage in stages.values())
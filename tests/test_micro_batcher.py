@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import threading
+
+from model_api.api_utils import make_predictions_airbnb
+from model_api.micro_batcher import MicroBatcher
+
+
+class SlowSumEstimator:
+    def __init__(self):
+        self.artifact_version_ = 'v1'
+        self.batch_sizes = list()
+        self.lock = threading.Lock()
+
+    def predict(self, features: np.array) -> np.array:
+        with self.lock:
+            self.batch_sizes.append(len(features))
+        return features.sum(axis=1).astype(int) % 4
+
+    def predict_proba(self, features: np.array) -> np.array:
+        with self.lock:
+            self.batch_sizes.append(len(features))
+        return np.eye(4)[features.sum(axis=1).astype(int) % 4]
+
+
+class FailingEstimator:
+    def predict(self, features: np.array) -> np.array:
+        raise RuntimeError('broken model')
+
+
+def test_micro_batcher_returns_each_caller_its_prediction():
+    model = SlowSumEstimator()
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=20)
+    rows = [np.array([[value, 0, 0, 0, 0]], dtype=float) for value in range(40)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        actual = list(executor.map(lambda row: int(batcher.bind(model).predict(row)[0]), rows))
+    assert actual == [value % 4 for value in range(40)]
+    assert max(model.batch_sizes) <= 8
+    assert len(model.batch_sizes) < 40
+    stats = batcher.stats()
+    assert stats['requests'] == 40
+    assert sum(stats['batch_size_distribution'].values()) == stats['batches'] == len(model.batch_sizes)
+    assert sum(stats['queue_delay_ms']['buckets'].values()) == 40
+
+
+def test_micro_batcher_propagates_model_errors():
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match='broken model'):
+        batcher.bind(FailingEstimator()).predict(np.zeros((1, 5)))
+
+
+def test_micro_batcher_as_model():
+    model = SlowSumEstimator()
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=1)
+    bound = batcher.bind(model)
+    actual = make_predictions_airbnb(model=bound, features=np.array([[1, 0, 0, 0, 1]]))
+    assert actual == 'high'
+    assert bound.artifact_version_ == 'v1'
+
+
+def test_micro_batcher_groups_rows_by_method():
+    model = SlowSumEstimator()
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=20)
+    rows = [np.array([[value, 0, 0, 0, 0]], dtype=float) for value in range(16)]
+
+    def predict(value: int):
+        if value % 2:
+            return int(np.argmax(batcher.bind(model).predict_proba(rows[value])[0]))
+        return int(batcher.bind(model).predict(rows[value])[0])
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        actual = list(executor.map(predict, range(16)))
+    assert actual == [value % 4 for value in range(16)]
+    assert sum(model.batch_sizes) == 16
+
+
+def test_micro_batcher_groups_rows_by_model():
+    old, new = SlowSumEstimator(), SlowSumEstimator()
+    new.artifact_version_ = 'v2'
+    new.predict = lambda features: np.full(len(features), 9)
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=20)
+    row = np.array([[1, 0, 0, 0, 0]], dtype=float)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        actual = list(executor.map(
+            lambda model: (model.artifact_version_, int(model.predict(row)[0])),
+            [batcher.bind(old if value % 2 else new) for value in range(8)]
+        ))
+    assert actual == [('v1', 1) if value % 2 else ('v2', 9) for value in range(8)]
+    assert sum(old.batch_sizes) == 4
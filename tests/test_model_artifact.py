@@ -0,0 +1,45 @@
+import numpy as np
+import os
+from sklearn.ensemble import RandomForestClassifier
+
+from model_api.model_artifact import load_forest_arrays, load_forest_artifact
+from refactor.pipeline_utils import source_parquet, sink_model_arrays
+
+FEATURES = ['neighbourhood_group_cleansed', 'room_type', 'accommodates', 'bathrooms', 'bedrooms']
+PROCESSED = source_parquet('./data/processed/processed_diego.parquet')
+X = PROCESSED[FEATURES].to_numpy(dtype=float)
+ESTIMATOR = RandomForestClassifier(n_estimators=7, random_state=0).fit(X, PROCESSED['category'])
+
+
+def test_load_forest_arrays_is_memory_mapped(tmp_path):
+    sink_model_arrays(tmp_path / 'model', ESTIMATOR)
+    arrays = load_forest_arrays(tmp_path / 'model')
+    assert all(isinstance(array, np.memmap) for array in arrays.values())
+    assert len(arrays['offsets']) == len(ESTIMATOR.estimators_) + 1
+    assert arrays['offsets'][-1] == len(arrays['nodes']) == sum(
+        estimator.tree_.node_count for estimator in ESTIMATOR.estimators_
+    )
+
+
+def test_load_forest_artifact_matches_estimator(tmp_path):
+    sink_model_arrays(tmp_path / 'model', ESTIMATOR)
+    actual = load_forest_artifact(tmp_path / 'model')
+    assert np.array_equal(actual.predict(X[:1000]), ESTIMATOR.predict(X[:1000]))
+    assert np.array_equal(actual.predict_proba(X[:1000]), ESTIMATOR.predict_proba(X[:1000]))
+    assert actual.get_params() == ESTIMATOR.get_params()
+    assert isinstance(actual.artifact_version_, str)
+
+
+def test_sink_model_arrays_over_mapped_artifact(tmp_path):
+    path = tmp_path / 'model'
+    sink_model_arrays(path, ESTIMATOR)
+    mapped = load_forest_arrays(path)
+    expected = {name: np.array(array) for name, array in mapped.items()}
+    other = RandomForestClassifier(n_estimators=3, random_state=1).fit(X[:500], PROCESSED['category'][:500])
+    sink_model_arrays(path, other)
+    #  Reading the old buffers would crash the process if they had been truncated
+    assert all(np.array_equal(mapped[name], expected[name]) for name in expected)
+    actual = load_forest_artifact(path)
+    assert len(actual.estimators_) == 3
+    assert np.array_equal(actual.predict(X[:1000]), other.predict(X[:1000]))
+    assert sorted(child.name for child in tmp_path.iterdir() if child.is_dir()) == ['model', os.readlink(path)]
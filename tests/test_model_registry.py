@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import threading
+import time
+from sklearn.ensemble import RandomForestClassifier
+
+from model_api.api_utils import AIRBNB_OUTPUT_MAPPING, load_model
+from model_api.model_registry import ModelRegistry, ModelValidationError
+from refactor.pipeline_utils import sink_model
+
+VALIDATION_FEATURES = np.array([[5, 3, 2, 1, 1], [1, 1, 4, 2, 2], [4, 2, 1, 1, 1]], dtype=float)
+X = np.array([[5, 3, 2, 1, 1], [1, 1, 4, 2, 2], [4, 2, 1, 1, 1], [2, 3, 6, 2, 3]], dtype=float)
+
+
+def fit_model(labels) -> RandomForestClassifier:
+    return RandomForestClassifier(n_estimators=3, random_state=0).fit(X, labels)
+
+
+def make_registry(path, **kwargs) -> ModelRegistry:
+    return ModelRegistry(
+        path=str(path),
+        load=lambda path: load_model(path=path),
+        validation_features=VALIDATION_FEATURES,
+        labels=AIRBNB_OUTPUT_MAPPING,
+        **kwargs
+    )
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_model_registry_reload_swaps_model(tmp_path):
+    path = tmp_path / 'model.pkl'
+    sink_model(str(path), fit_model([0, 1, 2, 3]))
+    outcomes = list()
+    registry = make_registry(path, on_reload=lambda outcome, previous, model: outcomes.append(outcome))
+    first = registry.get()
+    time.sleep(0.01)
+    sink_model(str(path), fit_model([3, 3, 3, 3]))
+    assert registry.reload(wait=True)
+    assert registry.get() is not first
+    assert (registry.get().predict(VALIDATION_FEATURES) == 3).all()
+    assert registry.version != first.artifact_version_
+    assert outcomes == ['swapped']
+    assert registry.status()['reloads'] == 1
+
+
+def test_model_registry_keeps_model_on_failed_validation(tmp_path):
+    path = tmp_path / 'model.pkl'
+    sink_model(str(path), fit_model([0, 1, 2, 3]))
+    registry = make_registry(path)
+    first = registry.get()
+    sink_model(str(path), fit_model([0, 1, 7, 7]))
+    registry.reload(wait=True)
+    assert registry.get() is first
+    status = registry.status()
+    assert status['failed_reloads'] == 1
+    assert status['last_error'].startswith('ModelValidationError')
+    with pytest.raises(ModelValidationError):
+        make_registry(path)
+
+
+def test_model_registry_get_does_not_wait_for_reload(tmp_path):
+    path = tmp_path / 'model.pkl'
+    sink_model(str(path), fit_model([0, 1, 2, 3]))
+    release = threading.Event()
+
+    def slow_load(path: str):
+        release.wait(5)
+        return load_model(path=path)
+
+    registry = make_registry(path)
+    first = registry.get()
+    registry.load = slow_load
+    assert registry.reload()
+    assert not registry.reload()
+    started = time.perf_counter()
+    assert registry.get() is first
+    assert time.perf_counter() - started < 0.1
+    assert registry.status()['loading']
+    release.set()
+    wait_for(lambda: not registry.status()['loading'])
+    assert registry.get() is not first
+
+
+def test_model_registry_watches_artifact(tmp_path):
+    path = tmp_path / 'model.pkl'
+    sink_model(str(path), fit_model([0, 1, 2, 3]))
+    registry = make_registry(path, watch_interval=0.02)
+    first = registry.get()
+    time.sleep(0.05)
+    assert registry.get() is first
+    sink_model(str(path), fit_model([2, 2, 2, 2]))
+    wait_for(lambda: registry.get() is not first)
+    assert (registry.get().predict(VALIDATION_FEATURES) == 2).all()
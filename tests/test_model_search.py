@@ -0,0 +1,58 @@
+from functools import partial
+import json
+import numpy as np
+from scipy.stats import randint
+from sklearn.ensemble import RandomForestClassifier
+from refactor.model_search import get_candidates, get_search_workers, cross_validate_candidates
+from refactor.pipeline_utils import source_parquet, sink_return, search_model_pipeline
+from tests.pipeline_specs import MODEL_SPECS
+
+SEARCH_SPECS = {
+    'space': {'n_estimators': [3, 6], 'max_depth': [2, None]},
+    'n_folds': 2,
+    'scoring': 'accuracy'
+}
+
+
+def test_get_candidates():
+    assert len(get_candidates(SEARCH_SPECS['space'], mode='grid')) == 4
+    candidates = get_candidates({'n_estimators': randint(5, 50)}, mode='random', n_candidates=3, random_state=0)
+    assert candidates == get_candidates({'n_estimators': randint(5, 50)}, mode='random', n_candidates=3, random_state=0)
+    assert len(candidates) == 3 and all(5 <= candidate['n_estimators'] < 50 for candidate in candidates)
+
+
+def test_get_search_workers_does_not_oversubscribe(monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 8)
+    assert get_search_workers(n_tasks=20) == (8, 1)
+    assert get_search_workers(n_tasks=2) == (2, 4)
+    assert get_search_workers(n_tasks=20, n_workers=3) == (3, 2)
+
+
+def test_cross_validate_candidates():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(200, 3))
+    y = (x[:, 0] > 0).astype(int)
+    leaderboard = cross_validate_candidates(
+        RandomForestClassifier, [{'max_depth': 1}, {'max_depth': None}], x, y,
+        estimator_params={'n_estimators': 5, 'random_state': 0}, n_folds=3, n_workers=2
+    )
+    assert [row['rank'] for row in leaderboard] == [1, 2]
+    assert leaderboard[0]['mean_accuracy'] >= leaderboard[1]['mean_accuracy']
+    assert {'mean_f1_macro', 'std_accuracy', 'mean_fit_seconds'} <= set(leaderboard[0])
+    assert json.dumps(leaderboard)
+
+
+def test_search_model_pipeline():
+    model, metrics, leaderboard = search_model_pipeline(
+        source=partial(source_parquet, './data/processed/processed_diego.parquet'),
+        sink_model=sink_return,
+        sink_eval=sink_return,
+        sink_leaderboard=sink_return,
+        model_specs=MODEL_SPECS,
+        search_specs=SEARCH_SPECS,
+        n_workers=2
+    )
+    assert len(leaderboard) == 4
+    assert model.get_params()['n_estimators'] == leaderboard[0]['params']['n_estimators']
+    assert model.get_params()['max_depth'] == leaderboard[0]['params']['max_depth']
+    assert 'accuracy' in metrics
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from model_api.api_utils import make_predictions_airbnb, make_probabilities_airbnb
+from model_api.prediction_cache import PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingEstimator:
+    def __init__(self, version: str):
+        self.artifact_version_ = version
+        self.calls = 0
+
+    classes_ = np.array([0, 1, 2, 3])
+
+    def predict(self, features: np.array) -> np.array:
+        self.calls += 1
+        return np.array([2])
+
+    def predict_proba(self, features: np.array) -> np.array:
+        self.calls += 1
+        return np.array([[0.1, 0.2, 0.6, 0.1]])
+
+
+def test_prediction_cache_hit_and_miss():
+    cache = PredictionCache(maxsize=2)
+    assert cache.get_or_compute('a', lambda: 1) == 1
+    assert cache.get_or_compute('a', lambda: 2) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+
+
+def test_prediction_cache_lru_eviction():
+    cache = PredictionCache(maxsize=2)
+    cache.get_or_compute('a', lambda: 1)
+    cache.get_or_compute('b', lambda: 2)
+    cache.get_or_compute('a', lambda: 1)
+    cache.get_or_compute('c', lambda: 3)
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_prediction_cache_ttl():
+    clock = FakeClock()
+    cache = PredictionCache(maxsize=2, ttl=10, clock=clock)
+    cache.get_or_compute('a', lambda: 1)
+    clock.now = 9
+    assert cache.get_or_compute('a', lambda: 2) == 1
+    clock.now = 10
+    assert cache.get_or_compute('a', lambda: 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_prediction_cache_invalidated_by_new_version():
+    cache = PredictionCache(maxsize=2)
+    cache.get_or_compute('a', lambda: 1, version='v1')
+    assert cache.get_or_compute('a', lambda: 2, version='v2') == 2
+    assert cache.get_or_compute('a', lambda: 3, version='v2') == 2
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_prediction_cache_disabled():
+    cache = PredictionCache(maxsize=0)
+    assert cache.get_or_compute('a', lambda: 1) == 1
+    assert cache.get_or_compute('a', lambda: 2) == 2
+    assert cache.stats()['size'] == 0
+
+
+def test_prediction_cache_thread_safe():
+    cache = PredictionCache(maxsize=8)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda key: cache.get_or_compute(key % 16, lambda: key % 16), range(2000)))
+    stats = cache.stats()
+    assert results == [key % 16 for key in range(2000)]
+    assert stats['hits'] + stats['misses'] == 2000
+    assert stats['size'] <= 8
+
+
+def test_make_predictions_airbnb_with_cache():
+    cache = PredictionCache(maxsize=4)
+    model = CountingEstimator(version='v1')
+    features = np.array([[5, 3, 2, 1, 1]], dtype=float)
+    first = make_predictions_airbnb(model=model, features=features, cache=cache)
+    second = make_predictions_airbnb(model=model, features=features, cache=cache)
+    assert first == second == 'high'
+    assert model.calls == 1
+    reloaded = CountingEstimator(version='v2')
+    make_predictions_airbnb(model=reloaded, features=features, cache=cache)
+    assert reloaded.calls == 1
+
+
+def test_make_probabilities_airbnb_with_cache():
+    cache = PredictionCache(maxsize=4)
+    model = CountingEstimator(version='v1')
+    features = np.array([[5, 3, 2, 1, 1]], dtype=float)
+    assert make_predictions_airbnb(model=model, features=features, cache=cache) == 'high'
+    first = make_probabilities_airbnb(model=model, features=features, top_k=1, cache=cache)
+    second = make_probabilities_airbnb(model=model, features=features, with_probabilities=False, cache=cache)
+    assert model.calls == 2
+    assert first['price_category'] == second['price_category'] == 'high'
+    assert first['top_k'] == [{'price_category': 'high', 'probability': 0.6}]
+    assert 'probabilities' not in second
+    assert make_predictions_airbnb(model=model, features=features, cache=cache) == 'high'
+    assert model.calls == 2
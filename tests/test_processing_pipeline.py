@@ -1,22 +1,25 @@
 from functools import partial
-import numpy as np
 import pandas as pd
-from refactor.pipeline_utils import source_csv, sink_return, seq_steps_pipeline, run_pipeline
+import pyarrow.parquet as pq
+from typing import Dict
+from refactor.pipeline_utils import (
+    source_csv, sink_return, seq_steps_pipeline, run_pipeline, ColumnStep,
+    source_csv_chunks, sink_parquet_chunks, run_pipeline_streaming, run_pipeline_parallel,
+    split_in_shards, run_pipeline_incremental, sink_parquet, source_parquet, SelectColumns,
+    get_pipeline_columns, concat_frames, read_columns, FINGERPRINTS_ATTR
+)
+from refactor.step_cache import cached_seq_steps_pipeline, get_pipeline_identity
 from refactor.processing_utils import (
     get_only_relevant_features, drop_nans, parse_num_of_bathrooms, get_amenties_available,
     remove_records_below_threshold_price, create_categorical_price_labels,
-    apply_processing_output_schema, parse_property_price
+    apply_processing_output_schema, parse_property_price, get_amenities_flags,
+    RELEVANT_FEATURES, RELEVANT_FEATURES_DTYPES, PREPRO_OUTPUT_SCHEMA, PREPRO_OUTPUT_SCHEMA_COMPACT
+)
+from tests.pipeline_specs import (
+    PATH_TO_RAW, PATH_TO_PROC, AMENITIES_FEATURE, BATHROOMS_STR, BATHROOMS_FLOAT, PRICE_FEATURE, PRICE_THRESHOLD,
+    PRICE_BINS, PRICE_LABELS, CALLABLES_TO_APPLY_VECTORIZED, get_mapped_callables
 )
 
-PATH_TO_RAW = './tests/test_data/raw_sample.csv'
-PATH_TO_PROC = './tests/test_data/processed_sample.parquet'
-AMENITIES_FEATURE = 'amenities'
-BATHROOMS_STR = 'bathrooms_text'
-BATHROOMS_FLOAT = 'bathrooms'
-PRICE_FEATURE = 'price'
-PRICE_THRESHOLD = 10
-PRICE_BINS = [10, 90, 180, 400, np.inf]
-PRICE_LABELS = [0, 1, 2, 3]
 CALLABLES_TO_APPLY = [
     get_only_relevant_features,
     partial(parse_num_of_bathrooms, BATHROOMS_STR, BATHROOMS_FLOAT),
@@ -43,3 +46,294 @@ def test_processing_pipeline():
     assert len(expected.columns) == len(actual.columns)
     assert all(expected.columns == actual.columns)
     assert expected.equals(actual)
+
+
+def test_processing_pipeline_vectorized_amenities():
+    callables_to_apply = [
+        *CALLABLES_TO_APPLY[:5],
+        partial(get_amenities_flags, AMENITIES_FEATURE),
+        *CALLABLES_TO_APPLY[6:]
+    ]
+    actual = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, callables_to_apply)
+    )
+    expected = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY)
+    )
+    assert expected.equals(actual)
+
+
+def test_processing_pipeline_vectorized():
+    actual = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED)
+    )
+    expected = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY)
+    )
+    assert expected.equals(actual)
+
+
+def test_seq_steps_pipeline_skips_up_to_date_column_step():
+    calls = list()
+
+    def double(df: pd.DataFrame) -> pd.DataFrame:
+        calls.append(len(df))
+        output = df.copy()
+        output['doubled'] = output['value'] * 2
+        return output
+
+    step = ColumnStep(double, input_features=['value'], output_features=['doubled'])
+    example = pd.DataFrame({'value': [1, 2, 3, 4]})
+    actual = seq_steps_pipeline(
+        [step, lambda df: df[df['value'] > 1], step, lambda df: df.assign(value=df['value'] + 1), step],
+        example
+    )
+    expected = pd.DataFrame({'value': [3, 4, 5], 'doubled': [6, 8, 10]}, index=[1, 2, 3])
+    assert expected.equals(actual)
+    assert calls == [4, 3]
+
+
+def test_seq_steps_pipeline_skips_column_step_of_earlier_pipeline():
+    calls = list()
+
+    def double(df: pd.DataFrame) -> pd.DataFrame:
+        calls.append(len(df))
+        output = df.copy()
+        output['doubled'] = output['value'] * 2
+        return output
+
+    step = ColumnStep(double, input_features=['value'], output_features=['doubled'])
+    example = pd.DataFrame({'value': [1, 2, 3, 4]})
+    first = seq_steps_pipeline([step], example)
+    assert FINGERPRINTS_ATTR not in example.attrs
+    second = seq_steps_pipeline([lambda df: df.take([1, 2, 3]), step], first)
+    assert first.take([1, 2, 3]).equals(second)
+    assert calls == [4]
+    changed = first.copy()
+    changed.loc[0, 'value'] = 10
+    assert seq_steps_pipeline([step], changed)['doubled'].tolist() == [20, 4, 6, 8]
+    assert seq_steps_pipeline([step], example.assign(doubled=[2, 4, 6, 8]))['doubled'].tolist() == [2, 4, 6, 8]
+    assert calls == [4, 4, 4]
+
+
+def test_processing_pipeline_streaming(tmp_path):
+    path_to_save = tmp_path / 'processed.parquet'
+    run_pipeline_streaming(
+        sink=partial(sink_parquet_chunks, path_to_save),
+        source=partial(
+            source_csv_chunks, PATH_TO_RAW, chunksize=17,
+            columns=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES
+        ),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY)
+    )
+    run_pipeline(
+        sink=partial(sink_parquet, tmp_path / 'serial.parquet'),
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY)
+    )
+    actual = pd.read_parquet(path_to_save)
+    expected = pd.read_parquet(tmp_path / 'serial.parquet')
+    assert pq.ParquetFile(path_to_save).num_row_groups > 1
+    assert expected.index.equals(actual.index)
+    assert expected.equals(actual)
+
+
+def test_sink_parquet_chunks_skips_empty_chunks(tmp_path):
+    path_to_save = tmp_path / 'chunks.parquet'
+    chunks = [
+        pd.DataFrame({'id': [1, 2]}),
+        pd.DataFrame({'id': pd.Series([], dtype=int)}),
+        pd.DataFrame({'id': [3]}, index=[2])
+    ]
+    sink_parquet_chunks(path_to_save, chunks)
+    actual = pd.read_parquet(path_to_save)
+    expected = pd.DataFrame({'id': [1, 2, 3]})
+    assert expected.equals(actual)
+    assert actual.index.tolist() == [0, 1, 2]
+
+
+def test_split_in_shards():
+    example = pd.DataFrame({'value': range(10)}, index=range(10, 20))
+    actual = split_in_shards(example, n_shards=3)
+    assert [len(shard) for shard in actual] == [3, 3, 4]
+    assert pd.concat(actual).equals(example)
+
+
+def test_processing_pipeline_parallel():
+    timings = list()
+    actual = run_pipeline_parallel(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED),
+        n_workers=2,
+        n_shards=3,
+        sink_timings=timings.extend
+    )
+    expected = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED)
+    )
+    assert expected.equals(actual)
+    assert [timing['shard'] for timing in timings] == [0, 1, 2]
+    assert sum(timing['rows_out'] for timing in timings) == len(expected)
+
+
+def test_processing_pipeline_incremental(tmp_path):
+    path_to_processed = tmp_path / 'processed.parquet'
+    path_to_manifest = tmp_path / 'manifest.parquet'
+    processed_rows = list()
+
+    def pipeline_steps(df: pd.DataFrame) -> pd.DataFrame:
+        processed_rows.append(len(df))
+        return seq_steps_pipeline(CALLABLES_TO_APPLY_VECTORIZED, df)
+
+    def run_incremental(raw: pd.DataFrame):
+        run_pipeline_incremental(
+            sink=partial(sink_parquet, path_to_processed),
+            source=lambda: raw,
+            pipeline_steps=pipeline_steps,
+            path_to_processed=path_to_processed,
+            path_to_manifest=path_to_manifest,
+            features_to_hash=RELEVANT_FEATURES
+        )
+        return pd.read_parquet(path_to_processed).sort_values(by='id').reset_index(drop=True)
+
+    raw = pd.read_csv(PATH_TO_RAW)
+    first = run_incremental(raw)
+    snapshot = raw.drop(index=[3, 4]).copy()
+    snapshot.loc[10, 'price'] = '$999.00'
+    snapshot.loc[11, 'description'] = 'not a relevant feature'
+    new_listing = raw.loc[[12]].assign(id=1)
+    snapshot = pd.concat([snapshot, new_listing])
+    second = run_incremental(snapshot)
+    expected = seq_steps_pipeline(CALLABLES_TO_APPLY_VECTORIZED, snapshot).sort_values(by='id').reset_index(drop=True)
+    assert processed_rows == [len(raw), 2]
+    assert len(first) != len(second)
+    assert expected.equals(second)
+    assert run_incremental(snapshot).equals(second)
+    assert processed_rows == [len(raw), 2]
+
+
+def test_processing_pipeline_incremental_reprocesses_changed_pipeline(tmp_path):
+    path_to_processed = tmp_path / 'processed.parquet'
+    raw = pd.read_csv(PATH_TO_RAW)
+    processed_rows = list()
+
+    def run_incremental(schema: Dict) -> pd.DataFrame:
+        callables_to_apply = get_mapped_callables(schema)
+        run_pipeline_incremental(
+            sink=partial(sink_parquet, path_to_processed),
+            source=lambda: raw,
+            pipeline_steps=lambda df: processed_rows.append(len(df)) or seq_steps_pipeline(callables_to_apply, df),
+            path_to_processed=path_to_processed,
+            path_to_manifest=tmp_path / 'manifest.parquet',
+            features_to_hash=RELEVANT_FEATURES,
+            pipeline_identity=get_pipeline_identity(callables_to_apply, schema)
+        )
+        return pd.read_parquet(path_to_processed)
+
+    run_incremental(PREPRO_OUTPUT_SCHEMA)
+    run_incremental(PREPRO_OUTPUT_SCHEMA)
+    compact = run_incremental(PREPRO_OUTPUT_SCHEMA_COMPACT)
+    assert processed_rows == [len(raw), len(raw)]
+    assert compact.dtypes.equals(seq_steps_pipeline(get_mapped_callables(PREPRO_OUTPUT_SCHEMA_COMPACT), raw).dtypes)
+
+
+def test_source_csv_matches_pandas():
+    actual = source_csv(PATH_TO_RAW)
+    expected = pd.read_csv(PATH_TO_RAW)
+    assert expected.equals(actual)
+    actual = source_csv(PATH_TO_RAW, columns=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES)
+    expected = pd.read_csv(PATH_TO_RAW, usecols=RELEVANT_FEATURES, dtype=RELEVANT_FEATURES_DTYPES)
+    assert expected[RELEVANT_FEATURES].equals(actual)
+
+
+def test_projected_processing_pipeline():
+    requested = list()
+
+    def source(columns=None):
+        requested.append(columns)
+        return source_csv(PATH_TO_RAW, columns=columns, dtype=RELEVANT_FEATURES_DTYPES)
+
+    callables_to_apply = [SelectColumns(RELEVANT_FEATURES), *CALLABLES_TO_APPLY_VECTORIZED[1:]]
+    pipeline_steps = partial(seq_steps_pipeline, callables_to_apply)
+    assert get_pipeline_columns(pipeline_steps) == RELEVANT_FEATURES
+    assert get_pipeline_columns(partial(seq_steps_pipeline, callables_to_apply=callables_to_apply)) == RELEVANT_FEATURES
+    assert get_pipeline_columns(partial(cached_seq_steps_pipeline, None, callables_to_apply)) == RELEVANT_FEATURES
+    assert get_pipeline_columns(partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED)) is None
+    assert get_pipeline_columns(partial(concat_frames, [SelectColumns(['id'])])) is None
+    actual = run_pipeline(sink=sink_return, source=source, pipeline_steps=pipeline_steps)
+    expected = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED)
+    )
+    assert requested == [RELEVANT_FEATURES]
+    assert expected.equals(actual)
+
+
+def test_read_columns():
+    processed = source_parquet(PATH_TO_PROC)
+    columns = ['id', 'accommodates']
+    assert read_columns(lambda columns: processed[columns], columns).equals(processed[columns])
+    assert read_columns(lambda: processed, columns).equals(processed[columns])
+    assert read_columns(lambda: processed, None) is processed
+    chunks = read_columns(lambda: iter([processed.iloc[:10], processed.iloc[10:]]), columns)
+    assert pd.concat(chunks).equals(processed[columns])
+
+
+def test_source_parquet_pushdown():
+    actual = source_parquet(PATH_TO_PROC, columns=['id', 'accommodates'], filters=[('price', '>=', 100)])
+    expected = pd.read_parquet(PATH_TO_PROC).query('price >= 100')[['id', 'accommodates']].reset_index(drop=True)
+    assert len(actual) > 0
+    assert expected.equals(actual.reset_index(drop=True))
+
+
+def test_compact_output_schema(tmp_path):
+    default = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, get_mapped_callables(PREPRO_OUTPUT_SCHEMA))
+    )
+    compact = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, get_mapped_callables(PREPRO_OUTPUT_SCHEMA_COMPACT))
+    )
+    assert default.astype(PREPRO_OUTPUT_SCHEMA_COMPACT).equals(compact)
+    assert compact.astype(PREPRO_OUTPUT_SCHEMA).equals(default)
+    assert compact.memory_usage(deep=True).sum() < default.memory_usage(deep=True).sum() / 2
+    sink_parquet(tmp_path / 'compact.parquet', compact)
+    assert source_parquet(tmp_path / 'compact.parquet').equals(compact)
+
+
+def test_concat_frames_keeps_categoricals():
+    first = pd.DataFrame({'kind': pd.Categorical(['a', 'b']), 'value': [1, 2]})
+    second = pd.DataFrame({'kind': pd.Categorical(['c']), 'value': [3]}, index=[2])
+    actual = concat_frames([first, None, second])
+    assert isinstance(actual['kind'].dtype, pd.CategoricalDtype)
+    assert actual['kind'].tolist() == ['a', 'b', 'c']
+    assert actual['value'].tolist() == [1, 2, 3]
+
+
+def test_processing_pipeline_parallel_compact():
+    pipeline_steps = partial(seq_steps_pipeline, get_mapped_callables(PREPRO_OUTPUT_SCHEMA_COMPACT))
+    actual = run_pipeline_parallel(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=pipeline_steps,
+        n_workers=1,
+        n_shards=3
+    )
+    expected = run_pipeline(sink=sink_return, source=partial(source_csv, PATH_TO_RAW), pipeline_steps=pipeline_steps)
+    assert isinstance(actual['property_type'].dtype, pd.CategoricalDtype)
+    assert expected.astype({'property_type': str}).equals(actual.astype({'property_type': str}))
@@ -1,3 +1,4 @@
+from functools import partial
 import numpy as np
 import pandas as pd
 import pytest
@@ -7,7 +8,9 @@ from refactor.processing_utils import (
     has_amenity, has_air_conditioning, has_breakfast, has_heating, has_kitchen,
     has_internet, has_tv, has_wifi, get_amenties_available, get_price_from_string,
     parse_property_price, remove_records_below_threshold_price,
-    create_categorical_price_labels, map_categorical_features
+    create_categorical_price_labels, map_categorical_features, parse_amenities_column,
+    get_amenities_flags, parse_price_column, parse_bathrooms_column,
+    parse_property_price_vectorized, parse_num_of_bathrooms_vectorized
 )
 
 AMENITIES_EXAMPLE = pd.DataFrame({
@@ -45,6 +48,19 @@ def test_parse_property_price():
     assert expected.equals(actual)
 
 
+def test_parse_price_column():
+    actual = parse_price_column(pd.Series(['100', '200', '350.27', 'not a price']))
+    expected = pd.Series([100, 200, 350.27, np.NaN])
+    assert expected.equals(actual)
+
+
+def test_parse_property_price_vectorized():
+    example = pd.DataFrame({'price': ['$100.00', '$1,200.00', 'free']})
+    actual = parse_property_price_vectorized(price_feature='price', df=example)
+    expected = pd.DataFrame({'price': [100, 1, np.NaN]}, dtype=float)
+    assert expected.equals(actual)
+
+
 def test_get_num_of_bath_from_string():
     examples = pd.DataFrame({
         'bathroom_text': ['1 bath', '1.5 baths', '1 bath', '1 shared bath', '5 baths']
@@ -95,6 +111,38 @@ def test_parse_num_of_bath():
     assert example.equals(actual)
 
 
+def test_parse_bathrooms_column():
+    examples = pd.Series(['1 bath', '1.5 baths', None, np.NaN, pd.NA, 'Half-bath', '5 baths'])
+    actual = parse_bathrooms_column(examples)
+    expected = pd.Series([1, 1.5, np.NaN, np.NaN, np.NaN, np.NaN, 5])
+    assert expected.equals(actual)
+
+
+def test_parse_bathrooms_column_ambiguous():
+    example = pd.Series(['1 bath', 'it may be 1 or 2 bathrooms'])
+    with pytest.raises(
+        ValueError, match='The string "it may be 1 or 2 bathrooms" may contain ambiguous information about the number of bathrooms'
+    ):
+        parse_bathrooms_column(example)
+
+
+def test_parse_num_of_bath_vectorized():
+    example = pd.DataFrame({
+        'bathroom_text': ['1 bath', '1.5 baths', '1 bath', '1 shared bath', '5 baths']
+    })
+    actual = parse_num_of_bathrooms_vectorized(
+        bathrooms_as_float_feature='bathrooms',
+        bathrooms_as_str_feature='bathroom_text',
+        df=example
+    )
+    expected = parse_num_of_bathrooms(
+        bathrooms_as_float_feature='bathrooms',
+        bathrooms_as_str_feature='bathroom_text',
+        df=example
+    )
+    assert expected.equals(actual)
+
+
 def test_parse_amenity_field_list():
     example = pd.DataFrame({
         'amenities': [["some random", "string"], ["in a", "list"]]
@@ -182,6 +230,45 @@ def test_get_amenties_available():
     assert expected.equals(actual)
 
 
+def test_parse_amenities_column():
+    example = pd.Series(['["Cable TV", "Wifi"]', ["Some", "LIST"], '[]'])
+    actual = parse_amenities_column(example)
+    expected = pd.Series(['cable tv\x1fwifi', 'some\x1flist', ''])
+    assert expected.equals(actual)
+
+
+def test_parse_amenities_column_wrong_type():
+    with pytest.raises(
+        ValueError, match='The amenities_feature must contain str or list values'
+    ):
+        parse_amenities_column(pd.Series(['["Wifi"]', np.NaN]))
+
+
+def test_get_amenities_flags_matches_get_amenties_available():
+    example = pd.DataFrame({
+        'amenities': [
+            '["Kitchen", "Cable TV", "Washer", "Elevator", "Wifi", "Gym", "Heating", "Dryer", "Air conditioning"]',
+            '["Breakfast", "Ethernet connection", "Internet"]',
+            ["Pocket wifi", "TV with Netflix"],
+            '[]'
+        ]
+    })
+    actual = get_amenities_flags(df=example.copy(), amenities_feature='amenities')
+    expected = get_amenties_available(df=example.copy(), amenities_feature='amenities')
+    assert expected.equals(actual)
+
+
+def test_get_amenities_flags_custom_amenities():
+    example = pd.DataFrame({'amenities': ['["Kitchen", "Washer", "Wifi"]']})
+    actual = get_amenities_flags(
+        df=example,
+        amenities_feature='amenities',
+        amenities_to_get={'washer': 'WASHER', 'pool': 'pool'}
+    )
+    expected = pd.DataFrame({'washer': [True], 'pool': [False]})
+    assert expected.equals(actual)
+
+
 def test_remove_records_below_threshold_price():
     actual = remove_records_below_threshold_price(df=PRICING_EXAMPLE, price_feature='price', price_threshold=98)
     expected = pd.DataFrame({'price': [99]}, index=[4])
@@ -217,3 +304,19 @@ def test_map_categorical_features():
         'animal': [2, 0, 0, 1]
     })
     assert expected.equals(actual)
+
+
+@pytest.mark.parametrize('step, example', [
+    (partial(parse_property_price, 'price'), PRICES_AS_STRING),
+    (partial(parse_property_price_vectorized, 'price'), PRICES_AS_STRING),
+    (partial(parse_num_of_bathrooms, 'bathroom_text', 'bathrooms'), pd.DataFrame({'bathroom_text': ['1 bath']})),
+    (partial(parse_num_of_bathrooms_vectorized, 'bathroom_text', 'bathrooms'), pd.DataFrame({'bathroom_text': ['1 bath']})),
+    (partial(create_categorical_price_labels, 'price', [0, 50, 100], [0, 1]), PRICING_EXAMPLE),
+    (partial(get_amenties_available, 'amenities'), AMENITIES_EXAMPLE),
+    (partial(get_amenities_flags, 'amenities'), AMENITIES_EXAMPLE),
+    (partial(map_categorical_features, {'price': {12: 1}}), PRICING_EXAMPLE)
+])
+def test_steps_leave_input_unchanged(step, example):
+    expected = example.copy()
+    step(df=example)
+    assert expected.equals(example)
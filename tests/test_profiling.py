@@ -0,0 +1,77 @@
+from functools import partial
+import os
+import pstats
+from refactor.pipeline_utils import (
+    source_csv, source_parquet, sink_return, seq_steps_pipeline, run_pipeline, train_model_pipeline
+)
+from refactor.processing_utils import PREPRO_OUTPUT_SCHEMA_COMPACT
+from refactor.profiling import PipelineProfiler, get_step_name
+from tests.pipeline_specs import PATH_TO_RAW, CALLABLES_TO_APPLY_VECTORIZED, MODEL_SPECS
+
+
+def test_get_step_name():
+    assert [get_step_name(step) for step in CALLABLES_TO_APPLY_VECTORIZED[:3]] == [
+        'get_only_relevant_features', 'parse_num_of_bathrooms_vectorized', 'parse_property_price_vectorized'
+    ]
+
+
+def test_profiled_processing_pipeline(tmp_path):
+    profiler = PipelineProfiler(
+        profile_step='get_amenities_flags', profile_mode='cprofile', profile_path=str(tmp_path / 'amenities.prof')
+    )
+    actual = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(profiler.run_steps, CALLABLES_TO_APPLY_VECTORIZED)
+    )
+    expected = run_pipeline(
+        sink=sink_return,
+        source=partial(source_csv, PATH_TO_RAW),
+        pipeline_steps=partial(seq_steps_pipeline, CALLABLES_TO_APPLY_VECTORIZED)
+    )
+    assert expected.equals(actual)
+    report = profiler.report()
+    assert len(report['records']) == len(CALLABLES_TO_APPLY_VECTORIZED)
+    assert report['records'][-1]['rows_out'] == len(actual)
+    assert report['totals']['parse_num_of_bathrooms_vectorized']['calls'] == 2
+    for record in report['records']:
+        assert record['rows_out'] <= record['rows_in']
+        assert record['memory_in_bytes'] > 0 and record['memory_out_bytes'] > 0
+    assert pstats.Stats(str(tmp_path / 'amenities.prof')).total_calls > 0
+
+
+def test_profiled_training_pipeline(tmp_path):
+    profiler = PipelineProfiler(
+        profile_step='fit', profile_mode='tracemalloc', profile_path=str(tmp_path / 'fit.tracemalloc')
+    )
+    reports = list()
+    model, metrics = train_model_pipeline(
+        source=partial(source_parquet, './data/processed/processed_diego.parquet'),
+        sink_model=sink_return,
+        sink_eval=sink_return,
+        model_specs=MODEL_SPECS,
+        profiler=profiler,
+        sink_profile=reports.append
+    )
+    assert 'accuracy' in metrics
+    assert [record['name'] for record in reports[0]['records']] == ['load', 'split', 'fit', 'predict', 'evaluate']
+    assert reports[0]['records'][2]['tracemalloc_peak_bytes'] > 0
+    assert os.path.exists(tmp_path / 'fit.tracemalloc')
+
+
+def test_training_pipeline_compact_schema(tmp_path):
+    processed = source_parquet('./data/processed/processed_diego.parquet')
+    processed.astype(PREPRO_OUTPUT_SCHEMA_COMPACT).to_parquet(tmp_path / 'compact.parquet')
+    model, metrics = train_model_pipeline(
+        source=partial(source_parquet, './data/processed/processed_diego.parquet'),
+        sink_model=sink_return,
+        sink_eval=sink_return,
+        model_specs=MODEL_SPECS
+    )
+    compact_model, compact_metrics = train_model_pipeline(
+        source=partial(source_parquet, tmp_path / 'compact.parquet'),
+        sink_model=sink_return,
+        sink_eval=sink_return,
+        model_specs=MODEL_SPECS
+    )
+    assert compact_metrics == metrics
@@ -0,0 +1,36 @@
+from functools import partial
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from refactor.pipeline_utils import (
+    source_parquet, source_parquet_chunks, sink_parquet_chunks, score_model_pipeline
+)
+from tests.pipeline_specs import MODEL_SPECS
+
+PROCESSED = source_parquet('./data/processed/processed_diego.parquet').head(2000)
+
+
+def test_source_parquet_chunks(tmp_path):
+    PROCESSED.to_parquet(tmp_path / 'listings.parquet', row_group_size=700)
+    chunks = list(source_parquet_chunks(tmp_path / 'listings.parquet', chunksize=500, columns=['id', 'price']))
+    assert max(len(chunk) for chunk in chunks) <= 500
+    assert pd.concat(chunks, ignore_index=True).equals(PROCESSED[['id', 'price']].reset_index(drop=True))
+
+
+def test_score_model_pipeline(tmp_path):
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        PROCESSED[MODEL_SPECS['features']], PROCESSED[MODEL_SPECS['target']]
+    )
+    PROCESSED.to_parquet(tmp_path / 'listings.parquet', row_group_size=700)
+    report = score_model_pipeline(
+        source=partial(source_parquet_chunks, tmp_path / 'listings.parquet', chunksize=300),
+        sink=partial(sink_parquet_chunks, tmp_path / 'scores.parquet', index=False),
+        model=model,
+        features=MODEL_SPECS['features']
+    )
+    scores = pd.read_parquet(tmp_path / 'scores.parquet')
+    assert report['rows'] == len(PROCESSED) and report['rows_per_second'] > 0
+    assert list(scores.columns) == ['id', 'category', 'proba_0', 'proba_1', 'proba_2', 'proba_3']
+    assert np.array_equal(scores['id'], PROCESSED['id'])
+    assert np.allclose(scores.filter(like='proba_'), model.predict_proba(PROCESSED[MODEL_SPECS['features']]))
+    assert np.array_equal(scores['category'], model.predict(PROCESSED[MODEL_SPECS['features']]))
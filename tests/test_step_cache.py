@@ -0,0 +1,119 @@
+from functools import partial
+import os
+import pandas as pd
+
+from refactor.pipeline_utils import seq_steps_pipeline, source_csv
+from refactor.step_cache import (
+    StepCache, cached_seq_steps_pipeline, get_step_identity, get_step_keys, step_version
+)
+from tests.pipeline_specs import CALLABLES_TO_APPLY_VECTORIZED, PATH_TO_RAW
+
+RAW = source_csv(PATH_TO_RAW)
+
+
+class CountingStep:
+    def __init__(self, column: str):
+        self.column = column
+        self.calls = 0
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.calls += 1
+        return df.assign(**{self.column: self.calls})
+
+    def __repr__(self) -> str:
+        return f'CountingStep({self.column!r})'
+
+
+def test_cached_seq_steps_pipeline_matches_seq_steps_pipeline(tmp_path):
+    cache = StepCache(cache_dir=tmp_path)
+    expected = seq_steps_pipeline(CALLABLES_TO_APPLY_VECTORIZED, RAW)
+    first = cached_seq_steps_pipeline(cache, CALLABLES_TO_APPLY_VECTORIZED, RAW)
+    second = cached_seq_steps_pipeline(cache, CALLABLES_TO_APPLY_VECTORIZED, RAW)
+    assert expected.equals(first)
+    assert expected.equals(second)
+    assert len(cache.list()) == len(CALLABLES_TO_APPLY_VECTORIZED)
+
+
+def test_cached_seq_steps_pipeline_reruns_from_first_changed_step(tmp_path):
+    cache = StepCache(cache_dir=tmp_path)
+    first_step, second_step = CountingStep('a'), CountingStep('b')
+    example = pd.DataFrame({'value': [1, 2, 3]})
+    cached_seq_steps_pipeline(cache, [first_step, second_step], example)
+    cached_seq_steps_pipeline(cache, [first_step, second_step], example)
+    assert (first_step.calls, second_step.calls) == (1, 1)
+    other_step = CountingStep('c')
+    actual = cached_seq_steps_pipeline(cache, [first_step, other_step], example)
+    assert (first_step.calls, other_step.calls) == (1, 1)
+    assert actual.equals(example.assign(a=1, c=1))
+    cached_seq_steps_pipeline(cache, [first_step, second_step], example.assign(value=[1, 2, 4]))
+    assert (first_step.calls, second_step.calls) == (2, 2)
+
+
+def test_get_step_identity_depends_on_bound_arguments():
+    def step(factor: int, df: pd.DataFrame) -> pd.DataFrame:
+        return df * factor
+
+    assert get_step_identity(partial(step, 2)) == get_step_identity(partial(step, 2))
+    assert get_step_identity(partial(step, 2)) != get_step_identity(partial(step, 3))
+
+
+def test_get_step_identity_depends_on_names_nested_code_and_version():
+    assert get_step_identity(lambda df: df.dropna(axis=0)) != get_step_identity(lambda df: df.fillna(axis=0))
+    assert get_step_identity(lambda df: df.apply(lambda row: row.max(), axis=1)) != get_step_identity(
+        lambda df: df.apply(lambda row: row.min(), axis=1)
+    )
+
+    def step(df: pd.DataFrame) -> pd.DataFrame:
+        return df
+
+    identity = get_step_identity(step)
+    assert get_step_identity(step_version(2)(step)) != identity
+
+
+def helper(df: pd.DataFrame) -> pd.DataFrame:
+    return df.dropna()
+
+
+def changed_helper(df: pd.DataFrame) -> pd.DataFrame:
+    return df.ffill()
+
+
+def step_with_helper(df: pd.DataFrame) -> pd.DataFrame:
+    return helper(df)
+
+
+def test_get_step_identity_follows_helpers(monkeypatch):
+    identity = get_step_identity(step_with_helper)
+    assert get_step_identity(step_with_helper) == identity
+    monkeypatch.setitem(step_with_helper.__globals__, 'helper', changed_helper)
+    assert get_step_identity(step_with_helper) != identity
+
+
+def test_cached_seq_steps_pipeline_misses_on_changed_names(tmp_path):
+    cache = StepCache(cache_dir=tmp_path)
+    example = pd.DataFrame({'value': [1.0, None, 3.0]})
+    first = cached_seq_steps_pipeline(cache, [lambda df: df.dropna(axis=0)], example)
+    second = cached_seq_steps_pipeline(cache, [lambda df: df.fillna(axis=0, value=0)], example)
+    assert len(first) == 2
+    assert len(second) == 3
+
+
+def test_get_step_keys_chain_on_input():
+    example = pd.DataFrame({'value': [1, 2, 3]})
+    keys = get_step_keys([CountingStep('a'), CountingStep('b')], example)
+    assert keys == get_step_keys([CountingStep('a'), CountingStep('b')], example.copy())
+    assert keys[1] != get_step_keys([CountingStep('c'), CountingStep('b')], example)[1]
+
+
+def test_step_cache_lru_eviction(tmp_path):
+    cache = StepCache(cache_dir=tmp_path)
+    example = pd.DataFrame({'value': range(1000)})
+    for key in ['a', 'b', 'c']:
+        cache.put(key, example)
+        os.utime(cache.path_of(key), (0, {'a': 1, 'b': 2, 'c': 3}[key]))
+    cache.get('a')
+    cache.max_bytes = 2 * cache.list()[0]['bytes']
+    cache.evict()
+    assert sorted(entry['key'] for entry in cache.list()) == ['a', 'c']
+    cache.clear()
+    assert cache.list() == []
@@ -0,0 +1,92 @@
+from functools import partial
+import pandas as pd
+import tracemalloc
+from refactor.pipeline_utils import ColumnStep, SelectColumns, source_csv, seq_steps_pipeline
+from refactor.processing_utils import (
+    parse_property_price_vectorized, remove_records_below_threshold_price, PREPRO_OUTPUT_SCHEMA, RELEVANT_FEATURES
+)
+from refactor.step_ownership import (
+    step_ownership, inplace_kernel, get_inplace_kernel, get_step_ownership, INPLACE, VIEW, COPY
+)
+from tests.pipeline_specs import PATH_TO_RAW, CALLABLES_TO_APPLY_VECTORIZED, get_mapped_callables
+
+
+def test_get_step_ownership():
+    assert get_step_ownership(partial(parse_property_price_vectorized, 'price')) == COPY
+    assert get_step_ownership(partial(remove_records_below_threshold_price, 'price', 10)) == COPY
+    assert get_step_ownership(ColumnStep(partial(remove_records_below_threshold_price, 'price', 10), [], [])) == COPY
+    assert get_step_ownership(SelectColumns(['price'])) == COPY
+    assert get_step_ownership(lambda df: df) == INPLACE
+
+
+def test_seq_steps_pipeline_copies_only_when_needed():
+    example = pd.DataFrame({'value': [1, 2, 3]})
+    received = list()
+
+    def add_column(df: pd.DataFrame) -> pd.DataFrame:
+        received.append(df)
+        df['tripled'] = df['value'] * 3
+        return df
+
+    @step_ownership(COPY)
+    def assign_column(df: pd.DataFrame) -> pd.DataFrame:
+        received.append(df.assign(doubled=df['value'] * 2))
+        return received[-1]
+
+    @step_ownership(VIEW)
+    def identity(df: pd.DataFrame) -> pd.DataFrame:
+        return df
+
+    actual = seq_steps_pipeline([identity, add_column], example)
+    assert received[0] is not example
+    assert list(example.columns) == ['value']
+    assert actual['tripled'].tolist() == [3, 6, 9]
+    received.clear()
+    seq_steps_pipeline([assign_column, add_column], example)
+    assert received[1] is received[0]
+    assert list(example.columns) == ['value']
+    assert seq_steps_pipeline([identity], example) is not example
+
+
+def test_seq_steps_pipeline_runs_inplace_kernel_when_owned():
+    example = pd.DataFrame({'value': [1, 2, 3]})
+    calls = list()
+
+    def add_column_inplace(name: str, df: pd.DataFrame) -> pd.DataFrame:
+        calls.append('kernel')
+        df[name] = df['value'] * 3
+        return df
+
+    @inplace_kernel(add_column_inplace)
+    def add_column(name: str, df: pd.DataFrame) -> pd.DataFrame:
+        calls.append('step')
+        return add_column_inplace(name, df.copy())
+
+    step = partial(add_column, 'tripled')
+    assert get_step_ownership(step) == COPY
+    assert get_inplace_kernel(step).func is add_column_inplace
+    assert get_inplace_kernel(ColumnStep(step, ['value'], ['tripled'])).func is add_column_inplace
+    actual = seq_steps_pipeline([step, partial(add_column, 'other')], example)
+    assert calls == ['step', 'kernel', 'kernel']
+    assert list(example.columns) == ['value']
+    assert list(actual.columns) == ['value', 'tripled', 'other']
+
+
+def test_processing_pipeline_leaves_input_unchanged():
+    raw = source_csv(PATH_TO_RAW)
+    expected = raw.copy()
+    seq_steps_pipeline(CALLABLES_TO_APPLY_VECTORIZED, raw)
+    assert expected.equals(raw)
+
+
+def test_processing_pipeline_peak_memory():
+    raw = pd.concat([source_csv(PATH_TO_RAW, columns=RELEVANT_FEATURES)] * 50, ignore_index=True)
+    callables_to_apply = get_mapped_callables(PREPRO_OUTPUT_SCHEMA)
+    input_bytes = raw.memory_usage(index=True, deep=True).sum()
+    tracemalloc.start()
+    try:
+        seq_steps_pipeline(callables_to_apply, raw)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak_bytes < 1.5 * input_bytes